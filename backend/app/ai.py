@@ -1,8 +1,28 @@
-import os, httpx
+import os, json, time, asyncio, httpx
+from . import metrics
+from .cache import AI_CACHE_ENABLED, cache_key, response_cache
+from .cassettes import AI_CASSETTE_UPSTREAM, AI_REPLAY_MISS, MODES as CASSETTE_MODES, cassette_store
+from .ollama import OLLAMA_WARM_PREFIXES, ollama_models
+from .scheduler import BACKGROUND, INTERACTIVE, schedulers
 
+# "openai" or "ollama"; "record" calls AI_CASSETTE_UPSTREAM and saves every reply, "replay"
+# serves the saved replies without a model (see app/cassettes.py)
 AI_PROVIDER = os.getenv("AI_PROVIDER", "openai")
 OLLAMA_BASE = os.getenv("OLLAMA_BASE_URL", "http://host.docker.internal:11434")
+OPENAI_BASE = os.getenv("OPENAI_BASE_URL", "https://api.openai.com")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+
+# Connection pool tuning (shared by both providers)
+AI_HTTP_TIMEOUT = float(os.getenv("AI_HTTP_TIMEOUT", "120"))
+AI_HTTP_MAX_CONNECTIONS = int(os.getenv("AI_HTTP_MAX_CONNECTIONS", "20"))
+AI_HTTP_MAX_KEEPALIVE = int(os.getenv("AI_HTTP_MAX_KEEPALIVE", "10"))
+AI_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("AI_HTTP_KEEPALIVE_EXPIRY", "60"))
+AI_HTTP2 = os.getenv("AI_HTTP2", "1").lower() not in ("0", "false", "no")
+# Ask OpenAI for token usage on streamed replies (a final chunk without choices)
+OPENAI_STREAM_USAGE = os.getenv("OPENAI_STREAM_USAGE", "1").lower() not in ("0", "false", "no")
+# Share one upstream call between concurrent identical requests
+AI_SINGLE_FLIGHT = os.getenv("AI_SINGLE_FLIGHT", "1").lower() not in ("0", "false", "no")
 
 SYSTEM_SPEC = (
     "You are a pragmatic software architect. "
@@ -16,38 +36,346 @@ SYSTEM_SPEC = (
     "Use markdown headings. Keep it specific and actionable."
 )
 
-async def _chat_ollama(messages):
+# The static system prompt of each prompt family, by name, for OLLAMA_WARM_PREFIXES to
+# prime. Every request of a family starts with its module-level constant, so that
+# leading message is byte-identical and provider prompt caches can reuse it; keep
+# dynamic content out of it.
+SYSTEM_PROMPTS = {}
+
+# One long-lived client per provider, opened/closed by the app lifecycle
+_clients = {}
+_http2_enabled = {}
+_requests_sent = {"ollama": 0, "openai": 0}
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def _new_client(provider: str) -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=AI_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=AI_HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=AI_HTTP_KEEPALIVE_EXPIRY,
+    )
+    if provider == "ollama":
+        # Ollama speaks plain HTTP/1.1 only
+        _http2_enabled[provider] = False
+        return httpx.AsyncClient(base_url=OLLAMA_BASE, timeout=AI_HTTP_TIMEOUT, limits=limits)
+    # HTTP/2 needs the optional h2 package; negotiated via ALPN, so plain-http upstreams stay on 1.1
+    _http2_enabled[provider] = AI_HTTP2 and _http2_available()
+    return httpx.AsyncClient(
+        base_url=OPENAI_BASE,
+        timeout=AI_HTTP_TIMEOUT,
+        limits=limits,
+        http2=_http2_enabled[provider],
+        headers={"Authorization": f"Bearer {OPENAI_API_KEY}"},
+    )
+
+class _SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one task. Each caller awaits
+    the task through asyncio.shield, so a caller that disconnects only stops waiting;
+    the task is cancelled only once every caller has gone.
+    """
+
+    def __init__(self):
+        self._calls = {}  # key -> {"task": Task, "waiters": int}
+        self.stats = {"leaders": 0, "coalesced": 0, "abandoned": 0}
+
+    async def do(self, key: str, fn):
+        call = self._calls.get(key)
+        if call is None:
+            task = asyncio.ensure_future(fn())
+            call = self._calls[key] = {"task": task, "waiters": 0}
+            task.add_done_callback(lambda t, key=key: self._finish(key, t))
+            self.stats["leaders"] += 1
+        else:
+            self.stats["coalesced"] += 1
+
+        call["waiters"] += 1
+        try:
+            return await asyncio.shield(call["task"])
+        finally:
+            call["waiters"] -= 1
+            if call["waiters"] == 0 and not call["task"].done():
+                # Every caller went away; don't keep the model busy for nobody
+                self._calls.pop(key, None)
+                call["task"].cancel()
+                self.stats["abandoned"] += 1
+
+    def _finish(self, key: str, task):
+        call = self._calls.get(key)
+        if call is not None and call["task"] is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # mark as retrieved even if every waiter left
+
+    def snapshot(self) -> dict:
+        return {"enabled": AI_SINGLE_FLIGHT, "in_flight": len(self._calls), **self.stats}
+
+_flights = _SingleFlight()
+
+def _cassette_mode():
+    mode = AI_PROVIDER.lower()
+    return mode if mode in CASSETTE_MODES else None
+
+def _provider() -> str:
+    """The real provider; with record/replay, the upstream one (whose scheduler replays also queue on)"""
+    name = AI_CASSETTE_UPSTREAM if _cassette_mode() else AI_PROVIDER
+    return "ollama" if name.lower() == "ollama" else "openai"
+
+def _model(provider: str) -> str:
+    if provider == "ollama":
+        return os.getenv("OLLAMA_MODEL", "llama3.2:latest")
+    return OPENAI_MODEL
+
+def _get_client(provider: str) -> httpx.AsyncClient:
+    """Return the shared client for a provider, creating it lazily if the app didn't"""
+    client = _clients.get(provider)
+    if client is None or client.is_closed:
+        client = _new_client(provider)
+        _clients[provider] = client
+    return client
+
+async def start_clients():
+    """Open the pooled client for the configured provider (called on app startup)"""
+    if _cassette_mode() == "replay" and AI_REPLAY_MISS != "record":
+        return  # never talks to a model
+    client = _get_client(_provider())
+    if _provider() == "ollama":
+        # Load the model and prime the static prompt prefixes in the background
+        prefixes = [[{"role": "system", "content": SYSTEM_PROMPTS[name]}] for name in OLLAMA_WARM_PREFIXES if name in SYSTEM_PROMPTS]
+        ollama_models.start(client, _model("ollama"), prefixes)
+
+async def close_clients():
+    """Close all pooled clients (called on app shutdown)"""
+    await ollama_models.stop()
+    while _clients:
+        _, client = _clients.popitem()
+        await client.aclose()
+
+def pool_stats() -> dict:
+    """Connection pool snapshot per provider, for sizing the limits above"""
+    stats = {
+        "limits": {
+            "max_connections": AI_HTTP_MAX_CONNECTIONS,
+            "max_keepalive_connections": AI_HTTP_MAX_KEEPALIVE,
+            "keepalive_expiry": AI_HTTP_KEEPALIVE_EXPIRY,
+        },
+        "providers": {},
+    }
+    for provider, client in _clients.items():
+        # httpx doesn't expose its pool publicly; read httpcore's view of it
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", []) or [])
+        pending = list(getattr(pool, "_requests", []) or [])
+        stats["providers"][provider] = {
+            "closed": client.is_closed,
+            "http2": _http2_enabled.get(provider, False),
+            "connections": len(connections),
+            "idle": sum(1 for conn in connections if conn.is_idle()),
+            "active": sum(1 for conn in connections if not conn.is_idle() and not conn.is_closed()),
+            "in_flight": len(pending),
+            "waiting_for_connection": sum(1 for req in pending if getattr(req, "connection", None) is None),
+            "requests_sent": _requests_sent.get(provider, 0),
+        }
+    stats["single_flight"] = _flights.snapshot()
+    if _cassette_mode():
+        stats["cassettes"] = {"mode": _cassette_mode(), **cassette_store.snapshot()}
+    if "ollama" in _clients:
+        stats["ollama_model"] = ollama_models.snapshot()
+    return stats
+
+async def _chat_ollama(messages, usage: dict):
     # Use llama3.2 or fallback to another available model
-    model = os.getenv("OLLAMA_MODEL", "llama3.2:latest")
-    async with httpx.AsyncClient(timeout=120) as c:
-        r = await c.post(
-            f"{OLLAMA_BASE}/api/chat", 
-            json={"model": model, "messages": messages, "stream": False}
-        )
-        r.raise_for_status()
-        data = r.json()
-        # Handle Ollama's response format
-        if "message" in data and "content" in data["message"]:
-            return data["message"]["content"]
-        return data.get("content") or str(data)
-
-async def _chat_openai(messages, model="gpt-4o-mini"):
-    headers = {"Authorization": f"Bearer {OPENAI_API_KEY}"}
+    model = _model("ollama")
+    c = _get_client("ollama")
+    _requests_sent["ollama"] += 1
+    r = await c.post(
+        "/api/chat",
+        json={"model": model, "messages": messages, "stream": False, **ollama_models.request_fields()}
+    )
+    r.raise_for_status()
+    data = r.json()
+    ollama_models.record(data)
+    usage.update(prompt_tokens=data.get("prompt_eval_count"), completion_tokens=data.get("eval_count"))
+    # Handle Ollama's response format
+    if "message" in data and "content" in data["message"]:
+        return data["message"]["content"]
+    return data.get("content") or str(data)
+
+async def _chat_openai(messages, usage: dict, model=OPENAI_MODEL):
     body = {"model": model, "messages": messages}
-    async with httpx.AsyncClient(timeout=120) as c:
-        r = await c.post("https://api.openai.com/v1/chat/completions", headers=headers, json=body)
+    c = _get_client("openai")
+    _requests_sent["openai"] += 1
+    r = await c.post("/v1/chat/completions", json=body)
+    r.raise_for_status()
+    data = r.json()
+    usage.update(data.get("usage") or {})
+    return data["choices"][0]["message"]["content"]
+
+async def _stream_ollama(messages, usage: dict):
+    model = _model("ollama")
+    c = _get_client("ollama")
+    _requests_sent["ollama"] += 1
+    body = {"model": model, "messages": messages, "stream": True, **ollama_models.request_fields()}
+    async with c.stream("POST", "/api/chat", json=body) as r:
+        r.raise_for_status()
+        # Ollama streams one JSON object per line
+        async for line in r.aiter_lines():
+            if not line.strip():
+                continue
+            chunk = json.loads(line)
+            content = chunk.get("message", {}).get("content")
+            if content:
+                yield content
+            if chunk.get("done"):
+                ollama_models.record(chunk)  # the final chunk carries the timings
+                usage.update(prompt_tokens=chunk.get("prompt_eval_count"), completion_tokens=chunk.get("eval_count"))
+                break
+
+async def _stream_openai(messages, usage: dict, model=OPENAI_MODEL):
+    c = _get_client("openai")
+    _requests_sent["openai"] += 1
+    body = {"model": model, "messages": messages, "stream": True}
+    if OPENAI_STREAM_USAGE:
+        body["stream_options"] = {"include_usage": True}
+    async with c.stream("POST", "/v1/chat/completions", json=body) as r:
         r.raise_for_status()
-        data = r.json()
-        return data["choices"][0]["message"]["content"]
+        # OpenAI streams server-sent events: "data: {...}" lines, ending with "data: [DONE]"
+        async for line in r.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            chunk = json.loads(data)
+            if chunk.get("usage"):
+                usage.update(chunk["usage"])
+            choices = chunk.get("choices") or [{}]
+            content = choices[0].get("delta", {}).get("content")
+            if content:
+                yield content
+
+async def _stream_provider(messages, usage: dict, mode: str):
+    """
+    The reply to messages as a token stream: from the live provider, through the
+    cassette recorder, or from a cassette. mode ("chat" or "stream") is only stored
+    with recordings. Cassette files are read and written in a worker thread.
+    """
+    provider = _provider()
+    cassettes = _cassette_mode()
+    if cassettes == "replay" and (
+        AI_REPLAY_MISS != "record" or await asyncio.to_thread(cassette_store.load, messages) is not None
+    ):
+        stream = cassette_store.replay(messages, usage)
+    else:
+        if mode == "chat":
+            async def live():
+                yield await (_chat_ollama(messages, usage) if provider == "ollama" else _chat_openai(messages, usage))
+            stream = live()
+        else:
+            stream = _stream_ollama(messages, usage) if provider == "ollama" else _stream_openai(messages, usage)
+        if cassettes:
+            stream = cassette_store.record(messages, stream, provider, _model(provider), mode, usage)
+    try:
+        async for token in stream:
+            yield token
+    finally:
+        await stream.aclose()  # a caller that stops early frees the upstream connection now
 
-async def chat(messages):
-    if AI_PROVIDER.lower() == "ollama":
-        return await _chat_ollama(messages)
-    return await _chat_openai(messages)
+def _fingerprint(messages) -> str:
+    provider = _provider()
+    return cache_key(provider, _model(provider), messages)
 
-async def generate_blueprint(title: str, context_md: str) -> str:
-    messages = [
-        {"role":"system","content":SYSTEM_SPEC},
+def check_capacity():
+    """Raise LLMQueueFull now if the provider queue is saturated (used before starting a stream)"""
+    schedulers[_provider()].check_capacity()
+
+def queue_stats() -> dict:
+    return {provider: scheduler.snapshot() for provider, scheduler in schedulers.items()}
+
+async def _call_provider(messages, cache_as=None, priority=INTERACTIVE):
+    provider = _provider()
+    async with schedulers[provider].slot(priority):
+        usage = {}
+        started = time.perf_counter()
+        try:
+            response = "".join([token async for token in _stream_provider(messages, usage, "chat")])
+        except Exception:
+            metrics.LLM_ERRORS.inc(1, provider, "chat")
+            raise
+        metrics.observe_llm(provider, "chat", messages, len(response), time.perf_counter() - started, usage=usage)
+    if cache_as:
+        await response_cache.set(cache_as, response)
+    return response
+
+async def chat(messages, use_cache: bool = False, priority: str = INTERACTIVE):
+    """
+    Send messages to the configured provider and return the reply.
+    Routes opt in to the response cache with use_cache=True; identical concurrent
+    requests share a single upstream call. priority picks the scheduler queue class.
+    """
+    use_cache = use_cache and AI_CACHE_ENABLED
+    if not (use_cache or AI_SINGLE_FLIGHT):
+        return await _call_provider(messages, priority=priority)
+
+    key = _fingerprint(messages)
+    if use_cache:
+        cached = await response_cache.get(key)
+        if cached is not None:
+            return cached
+    cache_as = key if use_cache else None
+    if not AI_SINGLE_FLIGHT:
+        return await _call_provider(messages, cache_as, priority)
+    # Cached and uncached callers of the same request don't share a flight,
+    # so a no_cache request never waits on (or populates) a cached one
+    flight_key = f"{key}:cached" if use_cache else key
+    return await _flights.do(flight_key, lambda: _call_provider(messages, cache_as, priority))
+
+async def chat_stream(messages, use_cache: bool = False, priority: str = INTERACTIVE):
+    """Like chat(), but yields response tokens as the model produces them"""
+    key = _fingerprint(messages) if use_cache and AI_CACHE_ENABLED else None
+    if key:
+        cached = await response_cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+    provider = _provider()
+    tokens = [] if key else None
+    async with schedulers[provider].slot(priority):
+        usage = {}
+        stream = _stream_provider(messages, usage, "stream")
+        started = time.perf_counter()
+        first_token = None
+        chars = 0
+        try:
+            async for token in stream:
+                if first_token is None:
+                    first_token = time.perf_counter() - started
+                chars += len(token)
+                if tokens is not None:
+                    tokens.append(token)
+                yield token
+        except Exception:
+            metrics.LLM_ERRORS.inc(1, provider, "stream")
+            raise
+        metrics.observe_llm(provider, "stream", messages, chars, time.perf_counter() - started, first_token, usage)
+    # Only completed generations are cached
+    if key:
+        await response_cache.set(key, "".join(tokens))
+
+SYSTEM_PROMPTS["blueprint"] = SYSTEM_SPEC
+
+def _blueprint_messages(title: str, context_md: str):
+    return [
+        {"role": "system", "content": SYSTEM_SPEC},
         {"role":"user","content":f"# Title: {title}\n\n## Context\n{context_md}"}
     ]
-    return await chat(messages)
+
+async def generate_blueprint_stream(title: str, context_md: str, use_cache: bool = False, priority: str = BACKGROUND):
+    async for token in chat_stream(_blueprint_messages(title, context_md), use_cache=use_cache, priority=priority):
+        yield token
@@ -0,0 +1,148 @@
+import os, json, time, asyncio, hashlib, sqlite3, threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+AI_CACHE_ENABLED = os.getenv("AI_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "512"))
+AI_CACHE_TTL = float(os.getenv("AI_CACHE_TTL", "3600"))  # seconds
+AI_CACHE_DB = os.getenv("AI_CACHE_DB", "")  # e.g. ./data/llm_cache.db; empty = memory only
+
+def normalize_messages(messages: List[Dict]) -> List[Dict]:
+    """Reduce messages to the fields the model sees, with insignificant whitespace removed"""
+    return [
+        {"role": str(m.get("role", "user")).strip().lower(), "content": str(m.get("content", "")).strip()}
+        for m in messages
+    ]
+
+def cache_key(provider: str, model: str, messages: List[Dict]) -> str:
+    """Content address of an LLM request"""
+    payload = json.dumps(
+        {"provider": provider, "model": model, "messages": normalize_messages(messages)},
+        sort_keys=True, ensure_ascii=False, separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def use_cache_for(payload: Dict, route_default: bool) -> bool:
+    """Per-request cache decision: the route's default unless the client sends "no_cache": true"""
+    if payload.get("no_cache"):
+        return False
+    return route_default
+
+class LLMCache:
+    """
+    Two-tier cache of LLM responses: an in-memory LRU bounded by entry count and TTL,
+    backed by an optional SQLite file so entries survive restarts. get() and set() are
+    coroutines: the memory tier answers inline, the SQLite tier is read and written
+    in a worker thread so its I/O never runs on the event loop.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 3600, db_path: str = ""):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (stored_at, value)
+        self._lock = threading.Lock()  # memory tier and stats
+        self._db = None
+        self._db_lock = threading.Lock()  # the SQLite connection, used from worker threads
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0}
+        if db_path:
+            self._open_db()
+
+    def _open_db(self):
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+        )
+        if self.ttl > 0:
+            self._db.execute("DELETE FROM llm_cache WHERE stored_at < ?", (time.time() - self.ttl,))
+        self._db.commit()
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl > 0 and time.time() - stored_at > self.ttl
+
+    async def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if not self._expired(entry[0]):
+                    self._memory.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return entry[1]
+                del self._memory[key]
+                self.stats["expired"] += 1
+
+        row = await asyncio.to_thread(self._disk_get, key) if self._db is not None else None
+        with self._lock:
+            if row is not None:
+                # Promote to the memory tier
+                self._put_memory(key, row[0], row[1])
+                self.stats["hits"] += 1
+                self.stats["disk_hits"] += 1
+                return row[0]
+            self.stats["misses"] += 1
+            return None
+
+    def _disk_get(self, key: str) -> Optional[tuple]:
+        """(value, stored_at) from the SQLite tier; expired rows are deleted on the way"""
+        with self._db_lock:
+            row = self._db.execute("SELECT value, stored_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row and self._expired(row[1]):
+                self._db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._db.commit()
+                with self._lock:
+                    self.stats["expired"] += 1
+                return None
+            return row
+
+    async def set(self, key: str, value: str):
+        now = time.time()
+        with self._lock:
+            self._put_memory(key, value, now)
+            self.stats["stores"] += 1
+        if self._db is not None:
+            await asyncio.to_thread(self._disk_set, key, value, now)
+
+    def _disk_set(self, key: str, value: str, stored_at: float):
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, stored_at) VALUES (?, ?, ?)", (key, value, stored_at)
+            )
+            self._db.commit()
+
+    def _put_memory(self, key: str, value: str, stored_at: float):
+        self._memory[key] = (stored_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM llm_cache")
+                self._db.commit()
+
+    def snapshot(self) -> Dict:
+        disk_entries = None
+        if self._db is not None:
+            with self._db_lock:
+                disk_entries = self._db.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                "enabled": AI_CACHE_ENABLED,
+                "memory_entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "disk_path": self.db_path or None,
+                "disk_entries": disk_entries,
+                "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else None,
+                **self.stats,
+            }
+
+response_cache = LLMCache(AI_CACHE_MAX_ENTRIES, AI_CACHE_TTL, AI_CACHE_DB)
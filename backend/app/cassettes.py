@@ -0,0 +1,134 @@
+import os, json, gzip, time, asyncio, hashlib, threading
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional
+from .cache import normalize_messages
+
+# Where recorded LLM exchanges are kept, one gzipped JSON file per distinct prompt
+AI_CASSETTE_DIR = os.getenv("AI_CASSETTE_DIR", "./data/cassettes")
+# The real provider behind AI_PROVIDER=record (and behind replay misses, see below)
+AI_CASSETTE_UPSTREAM = os.getenv("AI_CASSETTE_UPSTREAM", "openai")
+# Replay pace: 1 = the recorded timing, 10 = ten times faster, 0 = no delays at all
+AI_REPLAY_SPEED = float(os.getenv("AI_REPLAY_SPEED", "1"))
+# A prompt with no cassette: "error" fails the request, "record" asks the upstream and saves the reply
+AI_REPLAY_MISS = os.getenv("AI_REPLAY_MISS", "error").lower()
+
+MODES = ("record", "replay")
+FORMAT_VERSION = 1
+
+class CassetteMiss(LookupError):
+    """Replay found no recording for a prompt"""
+
+def cassette_key(messages: List[Dict]) -> str:
+    """
+    Content address of a prompt. Unlike the response cache key it leaves out the
+    provider and model, so a recording replays whatever the app is configured with.
+    """
+    payload = json.dumps(normalize_messages(messages), sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class CassetteStore:
+    """
+    Recorded LLM replies on disk, with the arrival time of every streamed chunk.
+
+    A cassette is <dir>/<key>.json.gz holding the prompt, the provider and model it
+    was recorded from, the token usage they reported, and "chunks": a list of
+    [milliseconds since the request was sent, text]. A non-streamed reply is a single
+    chunk at the time the whole reply arrived. Recording the same prompt again
+    replaces the cassette. Files are plain gzipped JSON, so a set of them can be
+    checked in as fixtures and read with zcat.
+    """
+
+    def __init__(self, path: str, speed: float = 1.0):
+        self.path = path
+        self.speed = speed
+        self._loaded: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self.stats = {"recorded": 0, "replayed": 0, "misses": 0, "errors": 0}
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, f"{key}.json.gz")
+
+    def load(self, messages: List[Dict]) -> Optional[Dict]:
+        key = cassette_key(messages)
+        with self._lock:
+            cassette = self._loaded.get(key)
+        if cassette is not None:
+            return cassette
+        try:
+            with gzip.open(self._file(key), "rt", encoding="utf-8") as f:
+                cassette = json.load(f)
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            self._loaded[key] = cassette
+        return cassette
+
+    def save(self, messages: List[Dict], provider: str, model: str, mode: str, chunks: List, usage: Dict):
+        key = cassette_key(messages)
+        cassette = {
+            "version": FORMAT_VERSION,
+            "provider": provider,
+            "model": model,
+            "mode": mode,
+            "recorded_at": datetime.utcnow().isoformat(timespec="seconds"),
+            "messages": normalize_messages(messages),
+            "usage": {k: v for k, v in (usage or {}).items() if v is not None},
+            "chunks": chunks,
+        }
+        os.makedirs(self.path, exist_ok=True)
+        # Write then rename, so a concurrent replay never reads half a file
+        tmp = f"{self._file(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            json.dump(cassette, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, self._file(key))
+        with self._lock:
+            self._loaded[key] = cassette
+        self.stats["recorded"] += 1
+
+    async def record(self, messages: List[Dict], stream: AsyncIterator[str], provider: str, model: str,
+                     mode: str, usage: Dict) -> AsyncIterator[str]:
+        """Pass a live token stream through, saving it once it has been read to the end"""
+        started = time.perf_counter()
+        chunks = []
+        async for text in stream:
+            chunks.append([round((time.perf_counter() - started) * 1000), text])
+            yield text
+        # An abandoned or failed stream never gets here, so only whole replies are kept
+        try:
+            await asyncio.to_thread(self.save, messages, provider, model, mode, chunks, usage)
+        except OSError as e:
+            self.stats["errors"] += 1
+            print(f"Could not save LLM cassette: {e}")
+
+    async def replay(self, messages: List[Dict], usage: Dict) -> AsyncIterator[str]:
+        """Yield a recorded reply chunk by chunk, at the recorded pace divided by the replay speed"""
+        cassette = await asyncio.to_thread(self.load, messages)
+        if cassette is None:
+            self.stats["misses"] += 1
+            raise CassetteMiss(f"No LLM cassette for this prompt ({cassette_key(messages)[:12]}) in {self.path}")
+        self.stats["replayed"] += 1
+        usage.update(cassette.get("usage") or {})
+        started = time.perf_counter()
+        for offset_ms, text in cassette["chunks"]:
+            if self.speed > 0:
+                delay = offset_ms / 1000 / self.speed - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            yield text
+
+    def snapshot(self) -> Dict:
+        try:
+            files = sum(1 for name in os.listdir(self.path) if name.endswith(".json.gz"))
+        except FileNotFoundError:
+            files = 0
+        return {
+            "dir": self.path,
+            "upstream": AI_CASSETTE_UPSTREAM,
+            "speed": self.speed,
+            "on_miss": AI_REPLAY_MISS,
+            "cassettes": files,
+            "loaded": len(self._loaded),
+            **self.stats,
+        }
+
+cassette_store = CassetteStore(AI_CASSETTE_DIR, AI_REPLAY_SPEED)
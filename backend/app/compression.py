@@ -0,0 +1,114 @@
+import os, gzip, asyncio
+from typing import Optional
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import zstandard
+except ImportError:  # gzip only
+    zstandard = None
+
+# Compress responses of at least this many bytes when the client accepts it (0 = never)
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+# zstd needs the optional zstandard package; it is preferred over gzip when the client sends both
+COMPRESS_ZSTD = os.getenv("COMPRESS_ZSTD", "1").lower() not in ("0", "false", "no")
+COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "5"))
+COMPRESS_ZSTD_LEVEL = int(os.getenv("COMPRESS_ZSTD_LEVEL", "3"))
+
+_THREAD_MIN_SIZE = 256 * 1024  # bodies this large are compressed off the event loop
+
+stats = {"gzip": 0, "zstd": 0, "bytes_in": 0, "bytes_out": 0}
+
+def _encodings() -> tuple:
+    if COMPRESS_ZSTD and zstandard is not None:
+        return ("zstd", "gzip")
+    return ("gzip",)
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """The best encoding we support from an Accept-Encoding header, or None"""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip()] = q
+    offered = _encodings()
+    # Highest q wins; on a tie, our own order (zstd compresses faster at a similar ratio)
+    ranked = sorted(
+        (name for name in offered if accepted.get(name, accepted.get("*", 0)) > 0),
+        key=lambda name: (-accepted.get(name, accepted.get("*", 0)), offered.index(name)),
+    )
+    return ranked[0] if ranked else None
+
+def compress(encoding: str, body: bytes) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=COMPRESS_ZSTD_LEVEL).compress(body)
+    return gzip.compress(body, compresslevel=COMPRESS_GZIP_LEVEL, mtime=0)
+
+def _compressible(headers: Headers) -> bool:
+    content_type = headers.get("content-type", "")
+    if "content-encoding" in headers or content_type.startswith("text/event-stream"):
+        return False
+    return content_type.startswith(("application/json", "text/")) or "+json" in content_type
+
+class CompressionMiddleware:
+    """
+    Compresses complete responses of at least COMPRESS_MIN_SIZE bytes with zstd or
+    gzip, as negotiated from Accept-Encoding. Streamed responses (SSE, NDJSON) are
+    passed through untouched, since compressing them would hold back every event
+    until the compressor flushed.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.minimum_size <= 0:
+            return await self.app(scope, receive, send)
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+
+        async def send_compressed(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                # Held back until the first body message shows whether the body is complete
+                start = message
+                return
+            if start is None or message["type"] != "http.response.body":
+                return await send(message)
+            start_message, start = start, None
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=list(start_message.get("headers", [])))
+            if message.get("more_body") or len(body) < self.minimum_size or not _compressible(headers):
+                await send(start_message)
+                return await send(message)
+
+            if len(body) >= _THREAD_MIN_SIZE:
+                compressed = await asyncio.to_thread(compress, encoding, body)
+            else:
+                compressed = compress(encoding, body)
+            stats[encoding] += 1
+            stats["bytes_in"] += len(body)
+            stats["bytes_out"] += len(compressed)
+            headers["content-encoding"] = encoding
+            headers["content-length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            await send({**start_message, "headers": headers.raw})
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
+
+def snapshot() -> dict:
+    return {
+        "min_size": COMPRESS_MIN_SIZE,
+        "encodings": list(_encodings()) if COMPRESS_MIN_SIZE > 0 else [],
+        **stats,
+        "ratio": round(stats["bytes_out"] / stats["bytes_in"], 3) if stats["bytes_in"] else None,
+    }
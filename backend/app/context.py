@@ -0,0 +1,214 @@
+import os, json, hashlib, threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+try:
+    import orjson
+except ImportError:  # hashing falls back to the (much slower) stdlib encoder
+    orjson = None
+
+AI_CONTEXT_CACHE_SIZE = int(os.getenv("AI_CONTEXT_CACHE_SIZE", "256"))  # rendered context strings kept
+
+class MindMapIndex:
+    """
+    One pass over a mind map context: nodes by id and by type, so renderers never
+    scan the node list per edge.
+    """
+
+    def __init__(self, context: Dict):
+        self.context = context or {}
+        self.nodes: List[Dict] = self.context.get("nodes", []) or []
+        self.edges: List[Dict] = self.context.get("edges", []) or []
+        self.by_id: Dict[str, Dict] = {}
+        self.by_type: Dict[str, List[Dict]] = {}
+        for node in self.nodes:
+            self.by_id.setdefault(node.get("id"), node)  # first node wins on duplicate ids
+            self.by_type.setdefault(node.get("type", "unknown"), []).append(node)
+
+    def label_for(self, node_id, default):
+        node = self.by_id.get(node_id)
+        return node.get("data", {}).get("label", default) if node else default
+
+def content_hash(context: Dict) -> str:
+    """
+    Fingerprint of a mind map context. Key order is kept as sent: the frontend
+    serializes maps the same way every time, and sorting costs more than it saves.
+    """
+    if orjson is not None:
+        payload = orjson.dumps(context or {}, default=str)
+    else:
+        payload = json.dumps(context or {}, separators=(",", ":"), default=str).encode("utf-8")
+    return hashlib.sha1(payload, usedforsecurity=False).hexdigest()
+
+def _render_chat(index: MindMapIndex) -> str:
+    context = index.context
+    if not context:
+        return "No mind map loaded yet."
+
+    parts = []
+
+    # Project info
+    template_id = context.get("template_id", "unknown")
+    template_name = context.get("template_name", "Unknown Template")
+    parts.append(f"Project Template: {template_name} ({template_id})")
+
+    # Progress metrics
+    progress = context.get("progress", {})
+    if progress:
+        parts.append(f"Specification Completeness: {progress.get('completeness', 0)}%")
+        parts.append(f"Success Probability: {progress.get('successProbability', 0)}%")
+
+        missing = progress.get("missingItems", [])
+        if missing:
+            parts.append(f"Missing Requirements: {', '.join(missing)}")
+
+    # Nodes
+    if index.nodes:
+        parts.append(f"\nTotal Nodes: {len(index.nodes)}")
+        for node_type, type_nodes in index.by_type.items():
+            parts.append(f"\n{node_type.upper()} Nodes ({len(type_nodes)}):")
+            for node in type_nodes:
+                data = node.get("data", {})
+                parts.append(f"  - {data.get('label', 'Unnamed')}")
+                description = data.get("description", "")
+                if description:
+                    parts.append(f"    Description: {description[:100]}")
+
+    # Edges/connections, with node labels for readability
+    if index.edges:
+        parts.append(f"\nConnections ({len(index.edges)} relationships):")
+        for edge in index.edges:
+            source = edge.get("source", "unknown")
+            target = edge.get("target", "unknown")
+            connection_str = f"  - {index.label_for(source, source)} → {index.label_for(target, target)}"
+            label = edge.get("label", "")
+            if label:
+                connection_str += f" ({label})"
+            parts.append(connection_str)
+    else:
+        parts.append("\n⚠️ No connections defined yet. Nodes should be connected to show dependencies and relationships.")
+
+    return "\n".join(parts)
+
+def _render_suggestion(index: MindMapIndex, project_title: str = "Untitled Mind Map") -> str:
+    context = index.context
+    if not context:
+        return "No mind map loaded. This is a blank canvas."
+
+    parts = [f"Project Title: {project_title}"]
+
+    template_id = context.get("template_id", "unknown")
+    template_name = context.get("template_name", "Unknown")
+    parts.append(f"Template: {template_name} ({template_id})")
+
+    progress = context.get("progress", {})
+    if progress:
+        parts.append(f"Completeness: {progress.get('completeness', 0)}%")
+        missing = progress.get("missingItems", [])
+        if missing:
+            parts.append(f"Missing: {', '.join(missing)}")
+
+    # Existing nodes with full details
+    if index.nodes:
+        parts.append(f"\n=== Existing Nodes ({len(index.nodes)}) ===")
+        for node_type, type_nodes in index.by_type.items():
+            parts.append(f"\n{node_type.upper()}:")
+            for node in type_nodes:
+                data = node.get("data", {})
+                parts.append(f"  [{node.get('id', 'unknown')}] {data.get('label', 'Unnamed')}")
+                category = data.get("category", "")
+                if category:
+                    parts.append(f"      Category: {category}")
+                description = data.get("description", "")
+                if description:
+                    parts.append(f"      Description: {description}")
+    else:
+        parts.append("\n=== No nodes yet ===")
+
+    if index.edges:
+        parts.append(f"\n=== Connections ({len(index.edges)}) ===")
+        for edge in index.edges[:10]:  # Limit to first 10
+            parts.append(f"  {edge.get('source', '?')} → {edge.get('target', '?')}")
+
+    return "\n".join(parts)
+
+def _render_evaluation(index: MindMapIndex) -> str:
+    context = index.context
+    parts = [f"Project Type: {context.get('template_name', 'Unknown')}"]
+    parts.append(f"Total Nodes: {len(index.nodes)}")
+
+    for node_type, type_nodes in index.by_type.items():
+        parts.append(f"\n{node_type.upper()} Nodes ({len(type_nodes)}):")
+        for node in type_nodes:
+            data = node.get("data", {})
+            description = data.get("description", "")
+            technology = data.get("technology", "")
+            fields = data.get("fields", [])
+
+            parts.append(f"\n  • {data.get('label', 'Unnamed')}")
+            if description:
+                parts.append(f"    Description: {description}")
+            if technology:
+                parts.append(f"    Technology: {technology}")
+            if fields and len(fields) > 0:
+                parts.append(f"    Fields: {', '.join(fields)}")
+
+            # Flag incomplete nodes
+            if not description or len(description.strip()) < 20:
+                parts.append(f"    ⚠️ Needs more detail")
+
+    parts.append(f"\nConnections: {len(index.edges)} relationships")
+
+    progress = context.get("progress", {})
+    if progress:
+        parts.append(f"\nCurrent Metrics:")
+        parts.append(f"  Rule-based Completeness: {progress.get('completeness', 0)}%")
+        parts.append(f"  Rule-based Success: {progress.get('successProbability', 0)}%")
+
+        missing = progress.get("missingItems", [])
+        if missing:
+            parts.append(f"  Missing: {', '.join(missing)}")
+
+    return "\n".join(parts)
+
+_RENDERERS = {
+    "chat": _render_chat,
+    "suggestion": _render_suggestion,
+    "evaluation": _render_evaluation,
+}
+
+_rendered: "OrderedDict[tuple, str]" = OrderedDict()
+_lock = threading.Lock()
+stats = {"hits": 0, "misses": 0}
+
+def render(flavor: str, context: Dict, *args, digest: Optional[str] = None) -> str:
+    """
+    Render a mind map context for one prompt flavor ("chat", "suggestion", "evaluation").
+    Output is memoized on the map's content hash, so an unchanged map renders once.
+    Pass digest when the caller already knows the content hash.
+    """
+    key = (flavor, digest or content_hash(context), args)
+    with _lock:
+        cached = _rendered.get(key)
+        if cached is not None:
+            _rendered.move_to_end(key)
+            stats["hits"] += 1
+            return cached
+        stats["misses"] += 1
+
+    text = _RENDERERS[flavor](MindMapIndex(context), *args)
+
+    with _lock:
+        _rendered[key] = text
+        while len(_rendered) > AI_CONTEXT_CACHE_SIZE:
+            _rendered.popitem(last=False)
+    return text
+
+def render_chat(context: Dict, digest: Optional[str] = None) -> str:
+    return render("chat", context, digest=digest)
+
+def render_suggestion(context: Dict, project_title: str = "Untitled Mind Map", digest: Optional[str] = None) -> str:
+    return render("suggestion", context, project_title, digest=digest)
+
+def render_evaluation(context: Dict, digest: Optional[str] = None) -> str:
+    return render("evaluation", context, digest=digest)
@@ -1,15 +1,57 @@
-import os
+import os, asyncio
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import SQLModel, create_engine, Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from .metrics import instrument_engine
 
 DB_URL = os.getenv("DB_URL", "sqlite:///./data/data.db")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")  # safe with WAL; FULL fsyncs every commit
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))  # bytes of the file read via mmap
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))  # page cache per connection
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))  # wait for a writer instead of failing
+
+def _async_url(url: str) -> str:
+    """The async driver for DB_URL: aiosqlite for SQLite; set ASYNC_DB_URL for anything else"""
+    scheme, rest = url.split("://", 1)
+    if scheme == "sqlite":
+        return f"sqlite+aiosqlite://{rest}"
+    return url  # must already name an async driver
+
+ASYNC_DB_URL = os.getenv("ASYNC_DB_URL") or _async_url(DB_URL)
+
 connect_args = {"check_same_thread": False} if DB_URL.startswith("sqlite") else {}
 engine = create_engine(DB_URL, connect_args=connect_args)
+# Used by the async (LLM-bound) routes; see run_db()
+async_engine = create_async_engine(ASYNC_DB_URL)
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+
+if DB_URL.startswith("sqlite"):
+    @event.listens_for(engine, "connect")
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, connection_record):
+        """
+        WAL lets list reads run while an autosave commits (rollback journaling makes
+        them take turns); busy_timeout makes a second writer wait rather than raise
+        "database is locked".
+        """
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
 
 def init_db():
     from .models import Folder
+    from .migrations import run_migrations
     
-    # Create all tables
+    # Create all tables, then bring databases created by older versions up to date
     SQLModel.metadata.create_all(engine)
+    run_migrations(engine)
     
     # Initialize default folders if none exist
     with Session(engine) as session:
@@ -27,3 +69,31 @@ def init_db():
 def get_session():
     with Session(engine) as session:
         yield session
+
+async def run_db(fn, *args):
+    """
+    Run fn(session, *args) on the async engine and commit. fn is ordinary sync
+    Session code (storage, graphs, history helpers) driven by the async driver: its
+    queries are awaited, but fn itself runs on the event loop, so keep CPU work out
+    of it (see run_db_in_thread). The connection goes back to the pool as soon as fn
+    returns: async routes call this before and after awaiting the LLM, never across
+    it, so a slow generation holds no connection.
+    """
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        result = await session.run_sync(fn, *args)
+        await session.commit()
+        return result
+
+async def run_db_in_thread(fn, *args):
+    """
+    run_db() for fn that does real CPU work between its queries (parsing maps,
+    rendering context, vector search): fn runs on the sync engine in a worker thread.
+    There is no event loop in that thread, so fn must not create tasks or touch
+    asyncio; return what should happen next and let the caller do it.
+    """
+    def call():
+        with Session(engine, expire_on_commit=False) as session:
+            result = fn(session, *args)
+            session.commit()
+            return result
+    return await asyncio.to_thread(call)
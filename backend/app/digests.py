@@ -0,0 +1,167 @@
+import json, re
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlmodel import Session, select
+from .models import MindMap, MindMapDigest
+from . import storage
+
+DIGEST_LABELS_PER_TYPE = 3
+DIGEST_TECH_KEYWORDS = 8
+
+DIGEST_FIELDS = ("counts", "labels", "tech")  # what callers see; the rest is for incremental updates
+
+def _label(node: Dict) -> str:
+    return (node.get("data") or {}).get("label", "Unnamed")
+
+def _keywords(node: Dict) -> List[str]:
+    technology = (node.get("data") or {}).get("technology")
+    if not isinstance(technology, str):
+        return []
+    return [keyword.strip() for keyword in re.split(r"[,/+;]", technology) if keyword.strip()]
+
+def _state(nodes: List[Dict]) -> Dict:
+    """build_digest() plus the node keys behind the labels and every technology count"""
+    counts: Dict[str, int] = {}
+    labels: Dict[str, List[str]] = {}
+    label_keys: Dict[str, List[str]] = {}
+    tech = Counter()
+    seen = set()
+    for index, node in enumerate(nodes):
+        node_type = node.get("type", "unknown")
+        counts[node_type] = counts.get(node_type, 0) + 1
+        key = storage._item_key("node", node, index, seen)  # as the node's row is keyed
+        type_labels = labels.setdefault(node_type, [])
+        if len(type_labels) < DIGEST_LABELS_PER_TYPE:
+            type_labels.append(_label(node))
+            label_keys.setdefault(node_type, []).append(key)
+        tech.update(_keywords(node))
+    return {
+        "counts": counts,
+        "labels": labels,
+        "tech": [keyword for keyword, _ in tech.most_common(DIGEST_TECH_KEYWORDS)],
+        "label_keys": label_keys,
+        "tech_counts": dict(tech),
+    }
+
+def build_digest(nodes: List[Dict]) -> Dict:
+    """
+    What the suggestion prompt says about a past project: node counts per type, the
+    first few labels of each type, and the most mentioned technologies.
+    """
+    state = _state(nodes)
+    return {field: state[field] for field in DIGEST_FIELDS}
+
+def _apply(state: Dict, changes: List[storage.Change]) -> bool:
+    """
+    Apply PATCH node changes to a digest state in place. False when a change frees a
+    label slot that only the full node order can refill (the caller rebuilds then).
+    Technologies tied on count may rank differently than in a full rebuild.
+    """
+    counts, labels, label_keys = state["counts"], state["labels"], state["label_keys"]
+    tech = Counter(state["tech_counts"])
+    for action, key, before, after in changes:
+        if action == "update" and before.get("type", "unknown") != after.get("type", "unknown"):
+            return False  # the node's place among its new type's nodes is unknown here
+        if before is not None:
+            node_type = before.get("type", "unknown")
+            keys = label_keys.get(node_type, [])
+            if key in keys and action == "update":
+                labels[node_type][keys.index(key)] = _label(after)  # same slot, new label
+            elif key in keys:
+                if counts[node_type] > len(keys):
+                    return False  # a later node of this type would move up into the slot
+                labels[node_type].pop(keys.index(key))
+                keys.remove(key)
+            counts[node_type] -= 1
+            if not counts[node_type]:
+                del counts[node_type], labels[node_type]
+                label_keys.pop(node_type, None)
+            tech.subtract(_keywords(before))
+        if after is not None:
+            node_type = after.get("type", "unknown")
+            keys = label_keys.setdefault(node_type, [])
+            type_labels = labels.setdefault(node_type, [])
+            if key not in keys and len(keys) < DIGEST_LABELS_PER_TYPE:
+                keys.append(key)  # only "add" gets here, and it appends at the end
+                type_labels.append(_label(after))
+            counts[node_type] = counts.get(node_type, 0) + 1
+            tech.update(_keywords(after))
+    tech = Counter({keyword: n for keyword, n in tech.items() if n > 0})
+    state["tech"] = [keyword for keyword, _ in tech.most_common(DIGEST_TECH_KEYWORDS)]
+    state["tech_counts"] = dict(tech)
+    return True
+
+def update_digest(session: Session, mindmap_id: int, nodes: Optional[List[Dict]] = None) -> MindMapDigest:
+    """
+    Rewrite a map's digest in the current transaction. Pass the nodes when the caller
+    already has them parsed (PUT/POST bodies); otherwise they are read from the rows.
+    """
+    if nodes is None:
+        mindmap = session.get(MindMap, mindmap_id)
+        nodes = json.loads(storage.items_json(session, mindmap, "node")) if mindmap else []
+    record = session.get(MindMapDigest, mindmap_id) or MindMapDigest(mindmap_id=mindmap_id)
+    record.node_count = len(nodes)
+    record.digest_json = json.dumps(_state(nodes))
+    record.updated_at = datetime.utcnow()
+    session.add(record)
+    return record
+
+def patch_digest(session: Session, mindmap_id: int, changes: List[storage.Change]) -> MindMapDigest:
+    """
+    Update a map's digest from the node changes of a PATCH, without reading the other
+    nodes. Falls back to update_digest() for digests written before incremental
+    updates, and for the few changes whose effect depends on the full node order.
+    """
+    record = session.get(MindMapDigest, mindmap_id)
+    state = json.loads(record.digest_json) if record is not None else {}
+    if "label_keys" not in state or not _apply(state, changes):
+        return update_digest(session, mindmap_id)
+    record.node_count = sum(state["counts"].values())
+    record.digest_json = json.dumps(state)
+    record.updated_at = datetime.utcnow()
+    session.add(record)
+    return record
+
+def recent_digests(session: Session, exclude_id: Optional[int] = None, limit: int = 5) -> List[Dict]:
+    """Digests of the most recently updated maps (see project_digests)"""
+    return project_digests(session, exclude_id=exclude_id, limit=limit)
+
+def project_digests(session: Session, ids: Optional[List[int]] = None, exclude_id: Optional[int] = None, limit: int = 5) -> List[Dict]:
+    """
+    Digests of the given maps, in the order given, or of the most recently updated
+    ones: title, template and updated_at from the mind map row, everything else from
+    the digest. Maps written before digests existed get theirs built here, once.
+    """
+    query = (
+        select(MindMap.id, MindMap.title, MindMap.template_id, MindMap.updated_at,
+               MindMapDigest.node_count, MindMapDigest.digest_json)
+        .outerjoin(MindMapDigest, MindMapDigest.mindmap_id == MindMap.id)
+    )
+    if ids is not None:
+        query = query.where(MindMap.id.in_(ids))
+    else:
+        query = query.order_by(MindMap.updated_at.desc()).limit(limit)
+    if exclude_id is not None:
+        query = query.where(MindMap.id != exclude_id)
+    rows = session.exec(query).all()
+    if ids is not None:
+        rows = sorted(rows, key=lambda row: ids.index(row.id))
+
+    result = []
+    for row in rows:
+        if row.digest_json is None:
+            record = update_digest(session, row.id)
+            node_count, digest = record.node_count, json.loads(record.digest_json)
+        else:
+            node_count, digest = row.node_count, json.loads(row.digest_json)
+        digest = {field: digest[field] for field in DIGEST_FIELDS if field in digest}
+        result.append({
+            "id": row.id,
+            "title": row.title,
+            "template_id": row.template_id,
+            "updated_at": row.updated_at,
+            "node_count": node_count,
+            **digest,
+        })
+    return result
@@ -0,0 +1,153 @@
+import os, json, hashlib, threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from sqlmodel import Session
+from .models import MindMap
+from . import storage
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+AI_GRAPH_CACHE_SIZE = int(os.getenv("AI_GRAPH_CACHE_SIZE", "64"))  # parsed mind maps kept in memory
+
+# The only node data the context renderers read; positions, styles etc. are dropped
+NODE_DATA_FIELDS = ("label", "description", "category", "technology", "fields")
+
+def _compact_node(node: Dict) -> Dict:
+    data = node.get("data") or {}
+    record = {"id": node.get("id"), "data": {k: data[k] for k in NODE_DATA_FIELDS if k in data}}
+    if "type" in node:
+        record["type"] = node["type"]
+    return record
+
+def _compact_edge(edge: Dict) -> Dict:
+    return {k: edge[k] for k in ("source", "target", "label") if k in edge}
+
+class LoadedGraph:
+    """Parsed, compacted nodes/edges of one stored mind map at one revision"""
+
+    __slots__ = ("mindmap_id", "revision", "title", "template_id", "nodes", "edges")
+
+    def __init__(self, session: Session, mindmap: MindMap, nodes_json: Optional[str] = None, edges_json: Optional[str] = None):
+        self.mindmap_id = mindmap.id
+        self.revision = revision_of(mindmap)
+        self.title = mindmap.title
+        self.template_id = mindmap.template_id
+        if nodes_json is None:
+            nodes_json = storage.items_json(session, mindmap, "node")
+        if edges_json is None:
+            edges_json = storage.items_json(session, mindmap, "edge")
+        self.nodes: List[Dict] = [_compact_node(n) for n in _loads(nodes_json)]
+        self.edges: List[Dict] = [_compact_edge(e) for e in _loads(edges_json)]
+
+def revision_of(mindmap: MindMap) -> str:
+    """Revision token clients can send back: the map's updated_at, as GET /mindmaps/{id} returns it"""
+    return mindmap.updated_at.isoformat() if mindmap.updated_at else ""
+
+class GraphCache:
+    """LRU of parsed mind maps, invalidated whenever a map is written"""
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._graphs: "OrderedDict[int, LoadedGraph]" = OrderedDict()
+        self._generations: Dict[int, int] = {}  # bumped on every invalidation
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stale": 0, "invalidations": 0}
+
+    def get(self, session: Session, mindmap_id: int, revision: Optional[str] = None) -> Optional[LoadedGraph]:
+        with self._lock:
+            graph = self._graphs.get(mindmap_id)
+            if graph is not None and (not revision or revision == graph.revision):
+                self._graphs.move_to_end(mindmap_id)
+                self.stats["hits"] += 1
+                return graph
+            self.stats["stale" if graph is not None else "misses"] += 1
+            generation = self._generations.get(mindmap_id, 0)
+
+        mindmap = session.get(MindMap, mindmap_id)
+        if not mindmap:
+            return None
+        graph = LoadedGraph(session, mindmap)
+        self._keep(graph, generation)
+        return graph
+
+    def get_many(self, session: Session, mindmaps: List[MindMap]) -> List[LoadedGraph]:
+        """
+        Graphs of already loaded maps, in order. Cache misses are parsed from one
+        node query and one edge query for all of them instead of two per map.
+        """
+        graphs, missing, generations = {}, [], {}
+        with self._lock:
+            for mindmap in mindmaps:
+                graph = self._graphs.get(mindmap.id)
+                if graph is not None and graph.revision == revision_of(mindmap):
+                    self._graphs.move_to_end(mindmap.id)
+                    self.stats["hits"] += 1
+                    graphs[mindmap.id] = graph
+                else:
+                    self.stats["stale" if graph is not None else "misses"] += 1
+                    missing.append(mindmap)
+                    generations[mindmap.id] = self._generations.get(mindmap.id, 0)
+        if missing:
+            nodes = storage.items_json_many(session, missing, "node")
+            edges = storage.items_json_many(session, missing, "edge")
+            for mindmap in missing:
+                graph = LoadedGraph(session, mindmap, nodes[mindmap.id], edges[mindmap.id])
+                self._keep(graph, generations[mindmap.id])
+                graphs[mindmap.id] = graph
+        return [graphs[m.id] for m in mindmaps]
+
+    def _keep(self, graph: LoadedGraph, generation: int):
+        with self._lock:
+            # A write landed while we were loading; serve this copy but don't keep it
+            if self._generations.get(graph.mindmap_id, 0) != generation:
+                return
+            self._graphs[graph.mindmap_id] = graph
+            self._graphs.move_to_end(graph.mindmap_id)
+            while len(self._graphs) > self.max_entries:
+                self._graphs.popitem(last=False)
+
+    def invalidate(self, mindmap_id: int):
+        with self._lock:
+            self._generations[mindmap_id] = self._generations.get(mindmap_id, 0) + 1
+            if self._graphs.pop(mindmap_id, None) is not None:
+                self.stats["invalidations"] += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {"entries": len(self._graphs), "max_entries": self.max_entries, **self.stats}
+
+graph_cache = GraphCache(AI_GRAPH_CACHE_SIZE)
+
+def resolve_context(payload: Dict, session: Session) -> Tuple[Dict, Optional[str], Optional[LoadedGraph]]:
+    """
+    Work out the mind map context for an AI request. Clients may send the whole map in
+    "context" as before, or just "project_id" (plus optional "revision"), in which case
+    nodes/edges come from the stored map. Small client-side fields in "context"
+    (template_name, progress) are merged in either way.
+
+    Returns (context, digest, graph): digest is a cheap memo key for the context
+    renderers when the graph came from the server, else None.
+    """
+    context = payload.get("context") or {}
+    project_id = payload.get("project_id")
+    if not project_id or "nodes" in context:
+        return context, None, None
+
+    graph = graph_cache.get(session, int(project_id), payload.get("revision"))
+    if graph is None:
+        return context, None, None
+
+    merged, digest = graph_context(graph, context)
+    return merged, digest, graph
+
+def graph_context(graph: LoadedGraph, context: Optional[Dict] = None) -> Tuple[Dict, str]:
+    """A stored graph as a renderer context, merged with client extras, and its memo digest"""
+    context = context or {}
+    merged = {"template_id": graph.template_id, **context, "nodes": graph.nodes, "edges": graph.edges}
+    extras = json.dumps({k: v for k, v in context.items() if k not in ("nodes", "edges")}, sort_keys=True, default=str)
+    digest = f"{graph.mindmap_id}@{graph.revision}:{hashlib.sha1(extras.encode('utf-8'), usedforsecurity=False).hexdigest()}"
+    return merged, digest
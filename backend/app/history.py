@@ -0,0 +1,138 @@
+import os, json, asyncio, hashlib
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from sqlmodel import Session
+from .ai import SYSTEM_PROMPTS, chat
+from .db import run_db
+from .models import ChatSummary, MindMap
+from .scheduler import BATCH
+
+AI_HISTORY_KEEP_MESSAGES = int(os.getenv("AI_HISTORY_KEEP_MESSAGES", "6"))  # recent messages sent verbatim
+AI_HISTORY_TOKEN_BUDGET = int(os.getenv("AI_HISTORY_TOKEN_BUDGET", "3000"))  # summary + recent messages
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a developer and an AI assistant about a software specification mind map.
+
+Merge the new messages into the existing summary. Keep decisions made, requirements, constraints, open questions and the names of features, nodes and technologies discussed. Drop pleasantries and repetition.
+
+Reply with the updated summary only, in at most 250 words."""
+
+SYSTEM_PROMPTS["summary"] = SUMMARY_PROMPT
+
+# Mind maps with a summarization task running, and strong refs to those tasks
+_summarizing = set()
+_tasks = set()
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) - good enough for budgeting"""
+    return len(text) // 4 + 1
+
+def _clean(history: List[Dict]) -> List[Dict]:
+    return [{"role": m.get("role", "user"), "content": m.get("content", "")} for m in history]
+
+def _prefix_hash(history: List[Dict], count: int) -> str:
+    payload = json.dumps(history[:count], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _load_summary(session: Session, mindmap_id: int, history: List[Dict]) -> Optional[ChatSummary]:
+    record = session.get(ChatSummary, mindmap_id)
+    if not record or record.summarized_count > len(history):
+        return None
+    # History was edited or cleared since the summary was written
+    if record.summarized_hash != _prefix_hash(history, record.summarized_count):
+        return None
+    return record
+
+class PendingSummary(NamedTuple):
+    """Messages that fell out of the window: history[:upto] still has to be folded into the summary"""
+    mindmap_id: int
+    history: List[Dict]
+    upto: int
+
+def compact_history(
+    history: List[Dict],
+    mindmap_id: Optional[int] = None,
+    session: Optional[Session] = None,
+    keep: int = AI_HISTORY_KEEP_MESSAGES,
+    budget: int = AI_HISTORY_TOKEN_BUDGET,
+) -> Tuple[List[Dict], Optional[PendingSummary]]:
+    """
+    Turn a full chat history into the messages to send: the stored running summary
+    (if any) plus the most recent messages, trimmed to the token budget. Also returns
+    the messages that have fallen out of the window, if any, for the caller to pass to
+    schedule_summary() on the event loop. Only reads the session, so it is safe to
+    call from a worker thread.
+    Without a mind map there is nowhere to keep a summary, so the history is sent whole.
+    """
+    history = _clean(history)
+    if not mindmap_id:
+        return history, None
+    record = _load_summary(session, mindmap_id, history) if mindmap_id and session else None
+    summarized = record.summarized_count if record else 0
+
+    tail = history[max(summarized, len(history) - keep):]
+    messages = []
+    used = 0
+    if record and record.summary:
+        messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{record.summary}"})
+        used = estimate_tokens(record.summary)
+
+    # Keep the newest messages that fit; always keep the last one
+    kept = []
+    for msg in reversed(tail):
+        cost = estimate_tokens(msg["content"])
+        if kept and used + cost > budget:
+            break
+        kept.append(msg)
+        used += cost
+    messages.extend(reversed(kept))
+
+    pending = None
+    if len(history) - summarized > keep:
+        pending = PendingSummary(mindmap_id, history, len(history) - keep)
+    return messages, pending
+
+def schedule_summary(pending: Optional[PendingSummary]):
+    """Fold what compact_history() left over into the summary off the request path (call on the loop)"""
+    if pending is None or pending.mindmap_id in _summarizing:
+        return
+    mindmap_id, history, upto = pending
+    task = asyncio.get_running_loop().create_task(_summarize(mindmap_id, history, upto))
+    _summarizing.add(mindmap_id)  # only once the task exists, or the map would never be summarized again
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+async def _summarize(mindmap_id: int, history: List[Dict], upto: int):
+    try:
+        loaded = await run_db(_summary_start, mindmap_id, history)
+        if loaded is None:
+            return
+        previous, start = loaded
+        if upto <= start:
+            return
+
+        new_messages = "\n".join(f"{m['role']}: {m['content']}" for m in history[start:upto])
+        summary = await chat([
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": f"Existing summary:\n{previous or '(none)'}\n\nNew messages:\n{new_messages}"},
+        ], priority=BATCH)
+
+        await run_db(_save_summary, mindmap_id, summary.strip(), upto, _prefix_hash(history, upto))
+    except Exception as e:
+        print(f"Error summarizing chat history for mind map {mindmap_id}: {e}")
+    finally:
+        _summarizing.discard(mindmap_id)
+
+def _summary_start(session: Session, mindmap_id: int, history: List[Dict]):
+    """(existing summary, messages it covers), or None if the mind map is gone"""
+    if not session.get(MindMap, mindmap_id):
+        return None
+    record = _load_summary(session, mindmap_id, history)
+    return (record.summary, record.summarized_count) if record else ("", 0)
+
+def _save_summary(session: Session, mindmap_id: int, summary: str, count: int, prefix_hash: str):
+    record = session.get(ChatSummary, mindmap_id) or ChatSummary(mindmap_id=mindmap_id)
+    record.summary = summary
+    record.summarized_count = count
+    record.summarized_hash = prefix_hash
+    record.updated_at = datetime.utcnow()
+    session.add(record)
@@ -0,0 +1,237 @@
+import os, json, uuid, asyncio
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+from sqlalchemy import delete, update
+from sqlmodel import Session, select
+from .db import run_db
+from .models import Job
+from .sse import sse_event
+
+AI_JOB_WORKERS = int(os.getenv("AI_JOB_WORKERS", "2"))  # jobs run at once; the LLM scheduler still caps provider calls
+AI_JOB_BATCH_WORKERS = int(os.getenv("AI_JOB_BATCH_WORKERS", "1"))  # batch jobs run at once, in their own lane
+AI_JOB_RETENTION_DAYS = float(os.getenv("AI_JOB_RETENTION_DAYS", "7"))  # finished jobs older than this are pruned on startup
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+FINISHED = (SUCCEEDED, FAILED)
+
+# kind -> async handler(payload, emit) returning the JSON-able result.
+# emit(event, data) pushes a progress event to anyone following the job.
+Handler = Callable[[Dict, Callable[[str, Dict], None]], Awaitable[Dict]]
+_handlers: Dict[str, Handler] = {}
+
+# Each lane has its own FIFO and workers, so long batch jobs never hold the
+# workers that single blueprints and evaluations wait for
+DEFAULT_LANE, BATCH_LANE = "default", "batch"
+_lanes: Dict[str, str] = {}  # kind -> lane
+
+def handler(kind: str, lane: str = DEFAULT_LANE):
+    """Register the coroutine that runs jobs of this kind, and the lane they queue in"""
+    def register(fn: Handler) -> Handler:
+        _handlers[kind] = fn
+        _lanes[kind] = lane
+        return fn
+    return register
+
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+def job_status(job: Job) -> Dict:
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "progress": job.progress,
+        "error": job.error,
+        "created_at": _iso(job.created_at),
+        "started_at": _iso(job.started_at),
+        "finished_at": _iso(job.finished_at),
+    }
+
+def job_result(job: Job) -> Optional[Dict]:
+    return json.loads(job.result_json) if job.result_json is not None else None
+
+class JobQueue:
+    """
+    Jobs are rows in the job table. Each lane (see handler()) has a fixed pool of
+    asyncio workers running its jobs in submission order. Progress goes to
+    in-memory subscribers (SSE streams, waiting requests), results go to the
+    database, so a client that disconnects loses nothing. Jobs that were queued or running when the process stopped are picked
+    up again on the next start.
+    """
+
+    def __init__(self, workers: Dict[str, int]):
+        self.workers = {lane: max(1, count) for lane, count in workers.items()}
+        self._queues: Dict[str, "asyncio.Queue[str]"] = {}  # per lane, created by start() on the serving loop
+        self._tasks: List[asyncio.Task] = []
+        self._subscribers: Dict[str, List[asyncio.Queue]] = {}
+        self._progress: Dict[str, int] = {}
+        self.stats = {"submitted": 0, "succeeded": 0, "failed": 0, "resumed": 0}
+
+    async def start(self):
+        self._queues = {lane: asyncio.Queue() for lane in self.workers}
+        resumed = await run_db(_resume_unfinished)
+        for job_id, kind in resumed:
+            self._lane(kind).put_nowait(job_id)
+        self.stats["resumed"] += len(resumed)
+        self._tasks = [
+            asyncio.create_task(self._worker(queue))
+            for lane, queue in self._queues.items()
+            for _ in range(self.workers[lane])
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, kind: str, payload: Dict) -> Job:
+        if kind not in _handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job = await run_db(_create_job, kind, payload)
+        self.stats["submitted"] += 1
+        self._lane(kind).put_nowait(job.id)
+        return job
+
+    def _lane(self, kind: str) -> "asyncio.Queue[str]":
+        return self._queues.get(_lanes.get(kind, DEFAULT_LANE), self._queues[DEFAULT_LANE])
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        job = await run_db(lambda session: session.get(Job, job_id))
+        if job is not None and job.status == RUNNING:
+            job.progress = self._progress.get(job_id, job.progress)
+        return job
+
+    def subscribe(self, job_id: str) -> "asyncio.Queue":
+        queue = asyncio.Queue()
+        self._subscribers.setdefault(job_id, []).append(queue)
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: "asyncio.Queue"):
+        subscribers = self._subscribers.get(job_id, [])
+        if queue in subscribers:
+            subscribers.remove(queue)
+        if not subscribers:
+            self._subscribers.pop(job_id, None)
+
+    async def wait(self, job_id: str) -> Job:
+        """Wait for a job to finish; cancelling the wait leaves the job running"""
+        queue = self.subscribe(job_id)
+        try:
+            job = await self.get(job_id)
+            while job is not None and job.status not in FINISHED:
+                event, _ = await queue.get()
+                if event in ("done", "error"):
+                    job = await self.get(job_id)
+            return job
+        finally:
+            self.unsubscribe(job_id, queue)
+
+    def _emit(self, job_id: str, event: str, data: Dict):
+        for queue in self._subscribers.get(job_id, []):
+            queue.put_nowait((event, data))
+
+    async def _worker(self, queue: "asyncio.Queue[str]"):
+        while True:
+            job_id = await queue.get()
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                print(f"Error running job {job_id}: {e}")
+
+    async def _run(self, job_id: str):
+        job = await run_db(_mark_running, job_id)
+        if job is None:
+            return  # already finished or deleted
+        self._progress[job_id] = 0
+        self._emit(job_id, "status", {"id": job_id, "status": RUNNING})
+
+        def emit(event: str, data: Dict):
+            if event == "token":
+                self._progress[job_id] += len(data.get("content", ""))
+            self._emit(job_id, event, data)
+
+        try:
+            result = await _handlers[job.kind](json.loads(job.payload_json), emit)
+        except Exception as e:
+            print(f"Job {job_id} ({job.kind}) failed: {e}")
+            await run_db(_finish, job_id, FAILED, None, str(e) or type(e).__name__, self._progress.pop(job_id, 0))
+            self.stats["failed"] += 1
+            self._emit(job_id, "error", {"error": str(e) or type(e).__name__})
+            return
+        await run_db(_finish, job_id, SUCCEEDED, result, None, self._progress.pop(job_id, 0))
+        self.stats["succeeded"] += 1
+        self._emit(job_id, "done", result)
+
+    def snapshot(self) -> Dict:
+        return {
+            "workers": self.workers,
+            "queued": sum(queue.qsize() for queue in self._queues.values()),
+            "queued_by_lane": {lane: queue.qsize() for lane, queue in self._queues.items()},
+            "running": len(self._progress),
+            "following": sum(len(s) for s in self._subscribers.values()),
+            **self.stats,
+        }
+
+def _create_job(session: Session, kind: str, payload: Dict) -> Job:
+    job = Job(id=uuid.uuid4().hex, kind=kind, payload_json=json.dumps(payload))
+    session.add(job)
+    return job
+
+def _mark_running(session: Session, job_id: str) -> Optional[Job]:
+    job = session.get(Job, job_id)
+    if job is None or job.status in FINISHED:
+        return None
+    job.status = RUNNING
+    job.started_at = datetime.utcnow()
+    session.add(job)
+    return job
+
+def _finish(session: Session, job_id: str, status: str, result: Optional[Dict], error: Optional[str], progress: int):
+    job = session.get(Job, job_id)
+    if job is None:
+        return
+    job.status = status
+    job.result_json = json.dumps(result, default=str) if result is not None else None
+    job.error = error
+    job.progress = progress
+    job.finished_at = datetime.utcnow()
+    session.add(job)
+
+def _resume_unfinished(session: Session) -> List[str]:
+    """Requeue jobs interrupted by a restart and prune old finished ones"""
+    if AI_JOB_RETENTION_DAYS > 0:
+        cutoff = datetime.utcnow() - timedelta(days=AI_JOB_RETENTION_DAYS)
+        session.exec(delete(Job).where(Job.status.in_(FINISHED), Job.finished_at < cutoff))
+    session.exec(update(Job).where(Job.status == RUNNING).values(status=QUEUED, started_at=None))
+    query = select(Job.id, Job.kind).where(Job.status == QUEUED).order_by(Job.created_at)
+    return [(job_id, kind) for job_id, kind in session.exec(query).all()]
+
+job_queue = JobQueue({DEFAULT_LANE: AI_JOB_WORKERS, BATCH_LANE: AI_JOB_BATCH_WORKERS})
+
+async def job_events(job_id: str):
+    """
+    SSE stream of a job: its current status, then "token" events while it runs, and
+    finally "done" with the result or "error". A finished job replays its outcome.
+    Disconnecting only stops the stream, never the job.
+    """
+    queue = job_queue.subscribe(job_id)
+    try:
+        job = await job_queue.get(job_id)
+        if job is None:
+            yield sse_event("error", {"error": "Job not found"})
+            return
+        yield sse_event("status", job_status(job))
+        if job.status in FINISHED:
+            if job.status == SUCCEEDED:
+                yield sse_event("done", job_result(job))
+            else:
+                yield sse_event("error", {"error": job.error})
+            return
+        while True:
+            event, data = await queue.get()
+            yield sse_event(event, data)
+            if event in ("done", "error"):
+                return
+    finally:
+        job_queue.unsubscribe(job_id, queue)
@@ -0,0 +1,163 @@
+import json
+from typing import Any, Dict, List, Optional
+
+class StreamingObject:
+    """
+    Incremental scanner for a JSON object that arrives in chunks, such as a model
+    reply streamed token by token. feed() returns each element of one array member
+    (items_key) as soon as that element is complete. Completed top-level members
+    go to fields. Prose or code fences around the object are skipped.
+
+    Each character is scanned once, and a value is only decoded when its closing
+    character arrives. A reply cut off mid-way still yields every member and
+    element that finished before the cut (see result()).
+    """
+
+    def __init__(self, items_key: str = "suggestions"):
+        self.items_key = items_key
+        self.fields: Dict[str, Any] = {}  # completed top-level members
+        self.items: List[Any] = []        # completed elements of fields[items_key], in order
+        self.closed = False               # the top-level object has ended
+        self._buffer = ""
+        self._pos = 0
+        self._start: Optional[int] = None  # index of the top-level "{"
+        self._stack: List[str] = []        # open containers
+        self._in_string = False
+        self._escape = False
+        self._expect = "key"               # at depth 1: "key", "colon" or "value"
+        self._key: Optional[str] = None
+        self._key_start: Optional[int] = None
+        self._value_start: Optional[int] = None  # start of the top-level value being read
+        self._item_start: Optional[int] = None   # start of the items_key element being read
+        self._scalar_depth: Optional[int] = None  # depth of the number/literal being read
+
+    def feed(self, chunk: str) -> List[Any]:
+        """Add text; return the items_key elements it completed"""
+        self._buffer += chunk
+        completed = len(self.items)
+        buffer, stack = self._buffer, self._stack
+        i = self._pos
+        while i < len(buffer) and not self.closed:
+            c = buffer[i]
+            if self._start is None:
+                if c == "{":
+                    self._start = i
+                    stack.append(c)
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    self._string_closed(i)
+            elif c == '"':
+                self._begin(i)
+                self._in_string = True
+            elif c in "{[":
+                self._begin(i)
+                stack.append(c)
+            elif c in "}]":
+                self._end_scalar(i)
+                stack.pop()
+                if stack:
+                    self._end(i + 1, len(stack))
+                else:
+                    self.closed = True
+            elif c in ", \t\r\n:":
+                self._end_scalar(i)
+                if len(stack) == 1:
+                    if c == ":" and self._expect == "colon":
+                        self._expect = "value"
+                    elif c == ",":
+                        self._expect = "key"
+            else:
+                self._begin(i)
+                if self._scalar_depth is None:
+                    self._scalar_depth = len(stack)
+            i += 1
+        self._pos = i
+        return self.items[completed:]
+
+    def _in_items(self) -> bool:
+        return len(self._stack) == 2 and self._stack[1] == "[" and self._key == self.items_key
+
+    def _begin(self, i: int):
+        depth = len(self._stack)
+        if depth == 1:
+            if self._expect == "key":
+                self._key_start = i
+            elif self._expect == "value" and self._value_start is None:
+                self._value_start = i
+        elif depth == 2 and self._item_start is None and self._in_items():
+            self._item_start = i
+
+    def _string_closed(self, i: int):
+        if len(self._stack) == 1 and self._expect == "key" and self._key_start is not None:
+            self._key = _decode(self._buffer[self._key_start:i + 1])
+            self._key_start = None
+            self._expect = "colon"
+        else:
+            self._end(i + 1, len(self._stack))
+
+    def _end_scalar(self, i: int):
+        if self._scalar_depth is not None and self._scalar_depth == len(self._stack):
+            self._scalar_depth = None
+            self._end(i, len(self._stack))
+
+    def _end(self, end: int, depth: int):
+        """A value that started at this depth ends just before index end"""
+        if depth == 1 and self._value_start is not None:
+            value = _decode(self._buffer[self._value_start:end])
+            if value is not _INVALID and self._key is not None:
+                self.fields[self._key] = value
+            self._value_start = None
+            self._expect = "after"
+        elif depth == 2 and self._item_start is not None and self._in_items():
+            value = _decode(self._buffer[self._item_start:end])
+            if value is not _INVALID:
+                self.items.append(value)
+            self._item_start = None
+
+    def partial_string(self, key: str) -> Optional[str]:
+        """The text so far of a top-level string member that is still being streamed"""
+        if key in self.fields:
+            return self.fields[key]
+        if self._key != key or self._value_start is None or not self._in_string or len(self._stack) != 1:
+            return None
+        raw = self._buffer[self._value_start:]
+        if self._escape:
+            raw = raw[:-1]
+        for cut in range(len(raw), max(len(raw) - 6, 0), -1):  # back off a split \\u escape
+            value = _decode(raw[:cut] + '"')
+            if value is not _INVALID:
+                return value
+        return None
+
+    def result(self) -> Optional[Dict]:
+        """
+        The whole object once it has closed and decodes cleanly. Otherwise the
+        members recovered so far with "truncated": True, or None when no
+        object was found.
+        """
+        if self._start is None:
+            return None
+        if self.closed:
+            whole = _decode(self._buffer[self._start:self._pos])
+            if isinstance(whole, dict):
+                return whole
+        recovered = dict(self.fields)
+        recovered.setdefault(self.items_key, list(self.items))
+        message = self.partial_string("message")
+        if message is not None:
+            recovered["message"] = message
+        recovered["truncated"] = True
+        return recovered
+
+_INVALID = object()
+
+def _decode(raw: str):
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return _INVALID
@@ -1,30 +1,127 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from .db import init_db
-from .routes import notes, blueprints, mindmaps, chat, evaluate, folders, suggestions
+from .db import async_engine, init_db
+from . import ai, compression, metrics, profiling
+from .cache import response_cache
+from .graphs import graph_cache
+from .jobs import job_queue
+from .vectors import vector_index
+from .scheduler import LLMQueueFull
+from .routes import notes, blueprints, mindmaps, messages, chat, evaluate, folders, suggestions, jobs, search
 
 app = FastAPI(title="AI Whisper API", version="0.1.0")
 
+app.add_middleware(compression.CompressionMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
+app.add_middleware(profiling.ProfilingMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Profile-File"],
 )
 
+@app.exception_handler(LLMQueueFull)
+async def _llm_queue_full(request: Request, exc: LLMQueueFull):
+    # Shed load instead of letting the request sit until the upstream timeout
+    return JSONResponse(
+        status_code=429,
+        content={"error": str(exc), "retry_after": exc.retry_after},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
 @app.on_event("startup")
-def _startup():
+async def _startup():
     init_db()
+    await ai.start_clients()
+    await job_queue.start()
+    await vector_index.start()
+
+@app.on_event("shutdown")
+async def _shutdown():
+    await job_queue.stop()
+    await vector_index.stop()
+    await ai.close_clients()
+    await async_engine.dispose()
 
 app.include_router(folders.router)
 app.include_router(notes.router)
 app.include_router(blueprints.router)
 app.include_router(mindmaps.router)
+app.include_router(messages.router)
 app.include_router(chat.router)
 app.include_router(suggestions.router)
 app.include_router(evaluate.router)
+app.include_router(jobs.router)
+app.include_router(search.router)
 
 @app.get("/healthz")
 def healthz():
     return {"ok": True}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Request, LLM and database timings plus queue gauges, in Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+metrics.gauge(
+    "llm_requests_active", "LLM requests holding a scheduler slot", ("provider",),
+    lambda: [((provider,), s["active"]) for provider, s in ai.queue_stats().items()],
+)
+metrics.gauge(
+    "llm_queue_depth", "LLM requests waiting for a scheduler slot", ("provider",),
+    lambda: [((provider,), s["queue_depth"]) for provider, s in ai.queue_stats().items()],
+)
+metrics.gauge(
+    "jobs", "Background jobs by state", ("state",),
+    lambda: [((state,), job_queue.snapshot()[state]) for state in ("queued", "running")],
+)
+
+@app.get("/healthz/ai-pool")
+def ai_pool_stats():
+    """Connection pool usage of the shared LLM HTTP clients"""
+    return ai.pool_stats()
+
+@app.get("/healthz/ai-queue")
+def ai_queue_stats():
+    """Concurrency, queue depth and wait times of the per-provider LLM schedulers"""
+    return ai.queue_stats()
+
+@app.get("/healthz/jobs")
+def job_queue_stats():
+    """Worker pool size, queue depth and outcome counters of the background job queue"""
+    return job_queue.snapshot()
+
+@app.get("/healthz/vector-index")
+def vector_index_stats():
+    """Size, persistence state and search counters of the local similarity index"""
+    return vector_index.snapshot()
+
+@app.get("/healthz/profiling")
+def profiling_stats():
+    """Per-request profiler settings and counters"""
+    return profiling.snapshot()
+
+@app.get("/healthz/compression")
+def compression_stats():
+    """Negotiated encodings, responses compressed and bytes saved"""
+    return compression.snapshot()
+
+@app.get("/healthz/graph-cache")
+def graph_cache_stats():
+    """Occupancy and hit counters of the parsed mind map cache"""
+    return graph_cache.snapshot()
+
+@app.get("/healthz/ai-cache")
+def ai_cache_stats():
+    """Hit/miss counters and occupancy of the LLM response cache"""
+    return response_cache.snapshot()
+
+@app.delete("/healthz/ai-cache")
+def clear_ai_cache():
+    response_cache.clear()
+    return {"ok": True}
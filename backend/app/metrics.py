@@ -0,0 +1,202 @@
+import os, time, threading
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import event
+
+# Set to 0 to turn off recording; /metrics then serves whatever was recorded before
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").lower() not in ("0", "false", "no")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Histogram:
+    """
+    Prometheus histogram keyed by label values. observe() is a bisect and three
+    additions under a lock; buckets are only made cumulative when scraped.
+    """
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...], buckets: Tuple[float, ...]):
+        self.name, self.help, self.labelnames, self.buckets = name, help, labelnames, buckets
+        self._series: Dict[Tuple[str, ...], List] = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        if not METRICS_ENABLED:
+            return
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            snapshot = [(labels, list(series)) for labels, series in self._series.items()]
+        for labels, series in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = f'le="{bound}"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}"
+            le = 'le="+Inf"'
+            yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {series[-1]}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {series[-2]}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {series[-1]}"
+
+class Counter:
+    """Prometheus counter keyed by label values"""
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...]):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float, *labels: str):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            snapshot = list(self._values.items())
+        for labels, value in snapshot:
+            yield f"{self.name}{_labels(self.labelnames, labels)} {value}"
+
+class Gauge:
+    """Prometheus gauge read at scrape time from a callback returning (label values, value) pairs"""
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...], collect: Callable[[], Iterable[Tuple[Tuple, float]]]):
+        self.name, self.help, self.labelnames, self.collect = name, help, labelnames, collect
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        for labels, value in self.collect():
+            yield f"{self.name}{_labels(self.labelnames, labels)} {value}"
+
+_registry: List = []
+
+def _register(metric):
+    _registry.append(metric)
+    return metric
+
+def gauge(name: str, help: str, labelnames: Tuple[str, ...], collect: Callable[[], Iterable[Tuple[Tuple, float]]]) -> Gauge:
+    return _register(Gauge(name, help, labelnames, collect))
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in _registry:
+        try:
+            lines.extend(metric.render())
+        except Exception as e:
+            print(f"Error rendering metric {metric.name}: {e}")
+    return "\n".join(lines) + "\n"
+
+HTTP_DURATION = _register(Histogram(
+    "http_request_duration_seconds", "Time from request to the last byte of the response, by route template",
+    ("method", "route", "status"), LATENCY_BUCKETS,
+))
+LLM_TTFT = _register(Histogram(
+    "llm_time_to_first_token_seconds", "Time from sending a streamed LLM request to its first token",
+    ("provider",), LATENCY_BUCKETS,
+))
+LLM_DURATION = _register(Histogram(
+    "llm_generation_seconds", "Time from sending an LLM request to the end of its reply",
+    ("provider", "mode"), LATENCY_BUCKETS,
+))
+LLM_PROMPT_CHARS = _register(Histogram(
+    "llm_prompt_chars", "Characters of message content sent per LLM request",
+    ("provider",), SIZE_BUCKETS,
+))
+LLM_RESPONSE_CHARS = _register(Histogram(
+    "llm_response_chars", "Characters of reply per LLM request",
+    ("provider",), SIZE_BUCKETS,
+))
+LLM_TOKENS = _register(Counter(
+    "llm_tokens_total", "Tokens reported by the provider's usage fields",
+    ("provider", "type"),
+))
+LLM_ERRORS = _register(Counter(
+    "llm_errors_total", "LLM requests that failed",
+    ("provider", "mode"),
+))
+DB_DURATION = _register(Histogram(
+    "db_query_duration_seconds", "Time spent executing one SQL statement",
+    ("operation",), DB_BUCKETS,
+))
+
+def observe_llm(provider: str, mode: str, messages: List[Dict], response_chars: int, seconds: float,
+                first_token: Optional[float] = None, usage: Optional[Dict] = None):
+    """Record one finished LLM call; usage holds prompt_tokens/completion_tokens when the provider sent them"""
+    if not METRICS_ENABLED:
+        return
+    LLM_DURATION.observe(seconds, provider, mode)
+    if first_token is not None:
+        LLM_TTFT.observe(first_token, provider)
+    LLM_PROMPT_CHARS.observe(sum(len(m.get("content") or "") for m in messages), provider)
+    LLM_RESPONSE_CHARS.observe(response_chars, provider)
+    for kind in ("prompt_tokens", "completion_tokens"):
+        if usage and usage.get(kind):
+            LLM_TOKENS.inc(usage[kind], provider, kind.split("_")[0])
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing every HTTP request until its response body is sent, so a
+    streamed reply counts its full length. Labels use the matched route template
+    ("/mindmaps/{mindmap_id}"), never the raw path, to keep the series count fixed.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_DURATION.observe(time.perf_counter() - started, scope["method"], route, str(status[0]))
+
+_OPERATIONS = {"SELECT": "select", "INSERT": "insert", "UPDATE": "update", "DELETE": "delete", "PRAGMA": "pragma"}
+
+def instrument_engine(engine):
+    """Time every statement run on a (sync) engine; pass async_engine.sync_engine for the async one"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info["query_started"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop("query_started", None)
+        if started is not None:
+            operation = _OPERATIONS.get(statement.lstrip()[:6].upper(), "other")
+            DB_DURATION.observe(time.perf_counter() - started, operation)
@@ -0,0 +1,136 @@
+from datetime import datetime
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+
+# Columns added to existing tables after their first release; create_all() never adds them
+_ADDED_COLUMNS = [
+    ("note", "mindmap_id", "INTEGER REFERENCES mindmap(id)"),
+    ("mindmap", "folder_id", "INTEGER REFERENCES folder(id)"),
+    ("mindmap", "chat_history", "TEXT DEFAULT '[]'"),
+]
+
+# Same names SQLModel gives Field(index=True), so new and migrated databases match
+_INDEXES = [
+    ("ix_mindmap_folder_id", "mindmap", "folder_id"),
+    ("ix_mindmap_updated_at", "mindmap", "updated_at"),
+    ("ix_note_mindmap_id", "note", "mindmap_id"),
+    ("ix_note_updated_at", "note", "updated_at"),
+    ("ix_blueprint_updated_at", "blueprint", "updated_at"),
+]
+
+def _add_missing_columns(conn: Connection):
+    inspector = inspect(conn)
+    for table, column, ddl in _ADDED_COLUMNS:
+        if column not in {c["name"] for c in inspector.get_columns(table)}:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+def _add_list_indexes(conn: Connection):
+    for name, table, column in _INDEXES:
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({column})"))
+
+# Full-text search over mind maps (titles, plus node text of maps still stored as blobs),
+# their nodes, notes and blueprints. The rowid is the source rowid * 4 + kind code, so the
+# sync triggers below replace and delete single rows instead of scanning.
+_SEARCH_TABLE = """
+CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+    title, body, tags, kind UNINDEXED, ref_id UNINDEXED, mindmap_id UNINDEXED,
+    tokenize = 'porter unicode61'
+)
+"""
+
+_LEGACY_NODE_TEXT = """
+CASE WHEN json_valid({row}.nodes_json) THEN (
+    SELECT group_concat(coalesce(json_extract(j.value, '$.data.label'), '') || ' ' ||
+                        coalesce(json_extract(j.value, '$.data.description'), ''), ' ')
+    FROM json_each({row}.nodes_json) AS j
+) END
+"""
+
+_NODE_BODY = """
+trim(coalesce(json_extract({row}.data_json, '$.data.description'), '') || ' ' ||
+     coalesce(json_extract({row}.data_json, '$.data.category'), '') || ' ' ||
+     coalesce(json_extract({row}.data_json, '$.data.technology'), ''))
+"""
+
+# table -> (kind code, columns whose changes reindex, indexed values for row {row})
+_SEARCH_SOURCES = {
+    "mindmap": (0, "title, nodes_json",
+                "{row}.id * 4, {row}.title, coalesce(" + _LEGACY_NODE_TEXT + ", ''), '', 'mindmap', {row}.id, {row}.id"),
+    "mindmapnode": (1, "data_json",
+                    "{row}.rowid * 4 + 1, coalesce(json_extract({row}.data_json, '$.data.label'), ''), "
+                    + _NODE_BODY + ", '', 'node', {row}.node_id, {row}.mindmap_id"),
+    "note": (2, "title, content_md, tags, mindmap_id",
+             "{row}.id * 4 + 2, {row}.title, {row}.content_md, {row}.tags, 'note', {row}.id, {row}.mindmap_id"),
+    "blueprint": (3, "title, spec_text",
+                  "{row}.id * 4 + 3, {row}.title, {row}.spec_text, '', 'blueprint', {row}.id, NULL"),
+}
+
+def _add_search_index(conn: Connection):
+    if conn.dialect.name != "sqlite":
+        return  # FTS5 is SQLite only; /search reports itself unavailable elsewhere
+    conn.execute(text(_SEARCH_TABLE))
+    # Refill from scratch, so re-running it is safe. mindmapnode's rowid is its id
+    # column since migration 4; before that it was implicit and VACUUM could renumber it
+    conn.execute(text("DELETE FROM search_index"))
+    columns = "rowid, title, body, tags, kind, ref_id, mindmap_id"
+    for table, (code, watched, values) in _SEARCH_SOURCES.items():
+        key = "rowid" if table == "mindmapnode" else "id"
+        insert = f"INSERT INTO search_index ({columns}) VALUES ({values.format(row='new')});"
+        delete = f"DELETE FROM search_index WHERE rowid = old.{key} * 4 + {code};"
+        conn.execute(text(f"CREATE TRIGGER IF NOT EXISTS search_{table}_ai AFTER INSERT ON {table} BEGIN {insert} END"))
+        conn.execute(text(f"CREATE TRIGGER IF NOT EXISTS search_{table}_au AFTER UPDATE OF {watched} ON {table} BEGIN {delete} {insert} END"))
+        conn.execute(text(f"CREATE TRIGGER IF NOT EXISTS search_{table}_ad AFTER DELETE ON {table} BEGIN {delete} END"))
+        conn.execute(text(f"INSERT INTO search_index ({columns}) SELECT {values.format(row=table)} FROM {table}"))
+
+def _add_node_row_ids(conn: Connection):
+    """
+    Give mindmapnode an INTEGER PRIMARY KEY (its composite key becomes a unique
+    constraint): the table is rebuilt, which drops its search triggers, so the search
+    index is set up again on top.
+    """
+    from .models import MindMapNode
+    if "id" not in {c["name"] for c in inspect(conn).get_columns("mindmapnode")}:
+        conn.execute(text("ALTER TABLE mindmapnode RENAME TO mindmapnode_old"))
+        MindMapNode.__table__.create(conn)
+        conn.execute(text(
+            "INSERT INTO mindmapnode (mindmap_id, node_id, position, data_json) "
+            "SELECT mindmap_id, node_id, position, data_json FROM mindmapnode_old ORDER BY mindmap_id, position"
+        ))
+        conn.execute(text("DROP TABLE mindmapnode_old"))
+    _add_search_index(conn)
+
+# (version, description, step). Append only; never renumber or edit a released step.
+# Every step must be idempotent: a crash between a step and its version row, or two
+# workers starting at once, just runs it again.
+MIGRATIONS = [
+    (1, "columns missing from databases created by early versions", _add_missing_columns),
+    (2, "indexes for list filters and keyset pagination", _add_list_indexes),
+    (3, "full-text search index with sync triggers", _add_search_index),
+    (4, "stable row ids for mind map nodes, keying their search index rows", _add_node_row_ids),
+]
+
+def applied_versions(conn: Connection) -> set:
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_version "
+        "(version INTEGER PRIMARY KEY, description TEXT NOT NULL, applied_at TIMESTAMP NOT NULL)"
+    ))
+    return {row[0] for row in conn.execute(text("SELECT version FROM schema_version"))}
+
+def run_migrations(engine: Engine):
+    """Apply pending migrations in version order, each in its own transaction"""
+    with engine.begin() as conn:
+        done = applied_versions(conn)
+    for version, description, step in MIGRATIONS:
+        if version in done:
+            continue
+        try:
+            with engine.begin() as conn:
+                step(conn)
+                conn.execute(
+                    text("INSERT INTO schema_version (version, description, applied_at) VALUES (:v, :d, :t)"),
+                    {"v": version, "d": description, "t": datetime.utcnow()},
+                )
+            print(f"Applied migration {version}: {description}")
+        except IntegrityError:
+            pass  # another worker recorded it first
@@ -1,6 +1,6 @@
 from typing import Optional
 from sqlmodel import SQLModel, Field, Column
-from sqlalchemy import Text
+from sqlalchemy import Text, UniqueConstraint
 from datetime import datetime
 
 class Folder(SQLModel, table=True):
@@ -13,12 +13,12 @@ class Folder(SQLModel, table=True):
 
 class Note(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    mindmap_id: Optional[int] = Field(default=None, foreign_key="mindmap.id")
+    mindmap_id: Optional[int] = Field(default=None, foreign_key="mindmap.id", index=True)
     title: str
     content_md: str = ""
     tags: str = ""
     created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow, index=True)
 
 class Blueprint(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -26,15 +26,81 @@ class Blueprint(SQLModel, table=True):
     spec_text: str = ""   # YAML/Markdown-like blueprint content
     rationale_md: str = ""
     created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow, index=True)
 
 class MindMap(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    folder_id: Optional[int] = Field(default=None, foreign_key="folder.id")
+    folder_id: Optional[int] = Field(default=None, foreign_key="folder.id", index=True)
     title: str
     template_id: str = ""  # e.g., "saas-app", "api-service", "blank"
-    nodes_json: str = Field(sa_column=Column(Text))  # JSON string of nodes
-    edges_json: str = Field(sa_column=Column(Text))  # JSON string of edges
-    chat_history: str = Field(sa_column=Column(Text), default="[]")  # JSON string of chat messages
+    # Legacy JSON blobs of nodes/edges; NULL once the map is stored as MindMapNode/MindMapEdge
+    # rows (see storage.py), which API responses then compose back into these fields
+    nodes_json: Optional[str] = Field(sa_column=Column(Text))
+    edges_json: Optional[str] = Field(sa_column=Column(Text))
+    # Legacy JSON blob of chat messages; NULL once they are stored as ChatMessage rows
+    chat_history: Optional[str] = Field(sa_column=Column(Text), default="[]")
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+class ChatSummary(SQLModel, table=True):
+    """Running summary of the older part of a mind map's chat history"""
+    mindmap_id: int = Field(primary_key=True, foreign_key="mindmap.id")
+    summary: str = Field(sa_column=Column(Text), default="")
+    summarized_count: int = 0  # leading history messages folded into the summary
+    summarized_hash: str = ""  # hash of those messages, to detect rewritten history
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class MindMapNode(SQLModel, table=True):
+    """One node of a mind map; MindMap.nodes_json is NULL once a map is stored this way"""
+    __table_args__ = (UniqueConstraint("mindmap_id", "node_id"),)
+    id: Optional[int] = Field(default=None, primary_key=True)  # the rowid, so VACUUM keeps it (search_index keys on it)
+    mindmap_id: int = Field(foreign_key="mindmap.id")
+    node_id: str
+    position: int = 0  # order within the map
+    data_json: str = Field(sa_column=Column(Text))  # the full node as JSON
+
+class MindMapEdge(SQLModel, table=True):
+    """One edge of a mind map; MindMap.edges_json is NULL once a map is stored this way"""
+    mindmap_id: int = Field(primary_key=True, foreign_key="mindmap.id")
+    edge_id: str = Field(primary_key=True)
+    position: int = 0
+    source: str = ""
+    target: str = ""
+    data_json: str = Field(sa_column=Column(Text))  # the full edge as JSON
+
+class ChatMessage(SQLModel, table=True):
+    """One chat message of a mind map; the id doubles as the pagination cursor"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    mindmap_id: int = Field(foreign_key="mindmap.id", index=True)
+    role: str = "user"
+    data_json: str = Field(sa_column=Column(Text))  # the full message as the client sent it
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class Job(SQLModel, table=True):
+    """A background LLM job (blueprint, evaluation); survives restarts and client disconnects"""
+    id: str = Field(primary_key=True)  # uuid4 hex
+    kind: str = Field(index=True)  # registered handler name, see jobs.py
+    status: str = Field(default="queued", index=True)  # queued, running, succeeded, failed
+    payload_json: str = Field(sa_column=Column(Text), default="{}")
+    result_json: Optional[str] = Field(sa_column=Column(Text), default=None)
+    error: Optional[str] = None
+    progress: int = 0  # characters generated so far
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class Evaluation(SQLModel, table=True):
+    """A stored AI evaluation of a mind map"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    mindmap_id: Optional[int] = Field(default=None, foreign_key="mindmap.id", index=True)
+    evaluation: str = Field(sa_column=Column(Text), default="")
+    ai_completeness: Optional[int] = None
+    ai_success: Optional[int] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class MindMapDigest(SQLModel, table=True):
+    """Compact summary of a mind map's nodes for cross-project context, rewritten with the nodes"""
+    mindmap_id: int = Field(primary_key=True, foreign_key="mindmap.id")
+    node_count: int = 0
+    digest_json: str = Field(sa_column=Column(Text), default="{}")  # see digests.build_digest
     updated_at: datetime = Field(default_factory=datetime.utcnow)
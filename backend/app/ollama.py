@@ -0,0 +1,142 @@
+import os, time, asyncio, httpx
+from typing import Dict, List, Optional
+from .scheduler import BACKGROUND, schedulers
+
+# How long Ollama keeps the model loaded after a request: a duration ("30m", "2h"),
+# "-1" to keep it loaded for good, or "0" to unload straight away. Sent with every
+# request, since Ollama otherwise falls back to its own default (5m) each time.
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+# Load the model (and prime the prompt prefixes below) on startup, not on the first user's request
+OLLAMA_WARMUP = os.getenv("OLLAMA_WARMUP", "1").lower() not in ("0", "false", "no")
+# Static prompt prefixes to prime after loading, by name (see ai.SYSTEM_PROMPTS)
+OLLAMA_WARM_PREFIXES = [p.strip() for p in os.getenv("OLLAMA_WARM_PREFIXES", "suggestions").split(",") if p.strip()]
+# Seconds without a request after which the model is warmed again (0 = never); covers
+# keep-alive expiry and eviction by other models sharing the Ollama server
+OLLAMA_REWARM_INTERVAL = float(os.getenv("OLLAMA_REWARM_INTERVAL", "0"))
+# Context window; any change forces Ollama to reload the model, so every request,
+# the warm-up included, sends the same value
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "0"))
+# A load_duration above this marks a request that waited for a cold model
+OLLAMA_COLD_LOAD_MS = float(os.getenv("OLLAMA_COLD_LOAD_MS", "500"))
+
+def _keep_alive():
+    # Ollama reads a bare number as seconds (negative = forever) but needs a unit in a string
+    try:
+        return float(OLLAMA_KEEP_ALIVE)
+    except ValueError:
+        return OLLAMA_KEEP_ALIVE
+
+def _ms(ns) -> float:
+    return round((ns or 0) / 1e6, 1)
+
+class OllamaModelManager:
+    """
+    Keeps the configured Ollama model resident and its static prompt prefixes in
+    the runner's KV cache, and records the timings Ollama reports with each reply.
+
+    Ollama reuses the cached prefix of the previous prompt on a runner slot, so a
+    request whose leading messages are byte-identical to the last one only pays
+    prompt evaluation for the new tail. prompt_eval_count in the stats shows how
+    many tokens were actually evaluated.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._last_request = 0.0
+        self.warm = False
+        self.stats = {
+            "requests": 0,
+            "cold_starts": 0,
+            "warmups": 0,
+            "warmup_failures": 0,
+            "last_warmup_ms": None,
+            "last_load_ms": None,
+            "max_load_ms": 0.0,
+            "prompt_tokens": 0,
+            "prompt_eval_ms": 0.0,
+            "output_tokens": 0,
+            "eval_ms": 0.0,
+        }
+
+    def request_fields(self) -> Dict:
+        """keep_alive and load options to merge into every /api/chat body"""
+        self._last_request = time.monotonic()
+        fields = {"keep_alive": _keep_alive()}
+        if OLLAMA_NUM_CTX:
+            fields["options"] = {"num_ctx": OLLAMA_NUM_CTX}
+        return fields
+
+    def record(self, data: Dict):
+        """Fold the stats of a finished reply (or the final stream chunk) into the counters"""
+        if "total_duration" not in data:
+            return
+        load_ms = _ms(data.get("load_duration"))
+        self.stats["requests"] += 1
+        self.stats["last_load_ms"] = load_ms
+        self.stats["max_load_ms"] = max(self.stats["max_load_ms"], load_ms)
+        if load_ms > OLLAMA_COLD_LOAD_MS:
+            self.stats["cold_starts"] += 1
+            print(f"Ollama cold start: model load took {load_ms:.0f} ms")
+        self.stats["prompt_tokens"] += data.get("prompt_eval_count") or 0
+        self.stats["prompt_eval_ms"] += _ms(data.get("prompt_eval_duration"))
+        self.stats["output_tokens"] += data.get("eval_count") or 0
+        self.stats["eval_ms"] += _ms(data.get("eval_duration"))
+
+    async def warmup(self, client: httpx.AsyncClient, model: str, prefixes: List[List[Dict]]):
+        """Load the model, then run each prefix with a one-token reply so it lands in the KV cache"""
+        started = time.perf_counter()
+        try:
+            async with schedulers["ollama"].slot(BACKGROUND):
+                # A request without messages only loads the model
+                r = await client.post("/api/chat", json={"model": model, "messages": [], "stream": False, **self.request_fields()})
+                r.raise_for_status()
+                self.warm = True
+                for messages in prefixes:
+                    body = {"model": model, "messages": messages, "stream": False, **self.request_fields()}
+                    body["options"] = {**body.get("options", {}), "num_predict": 1}
+                    r = await client.post("/api/chat", json=body)
+                    r.raise_for_status()
+                    self.record(r.json())
+        except Exception as e:
+            self.stats["warmup_failures"] += 1
+            print(f"Ollama warm-up of {model} failed: {e}")
+            return
+        self.stats["warmups"] += 1
+        self.stats["last_warmup_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        print(f"Ollama model {model} warm in {self.stats['last_warmup_ms']:.0f} ms")
+
+    def start(self, client: httpx.AsyncClient, model: str, prefixes: List[List[Dict]]):
+        if OLLAMA_WARMUP or OLLAMA_REWARM_INTERVAL > 0:
+            self._task = asyncio.create_task(self._run(client, model, prefixes))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self, client: httpx.AsyncClient, model: str, prefixes: List[List[Dict]]):
+        if OLLAMA_WARMUP:
+            await self.warmup(client, model, prefixes)
+        while OLLAMA_REWARM_INTERVAL > 0:
+            idle = time.monotonic() - self._last_request
+            if idle < OLLAMA_REWARM_INTERVAL:
+                await asyncio.sleep(OLLAMA_REWARM_INTERVAL - idle)
+                continue
+            await self.warmup(client, model, prefixes)
+
+    def snapshot(self) -> Dict:
+        requests = self.stats["requests"] or 1
+        return {
+            "keep_alive": OLLAMA_KEEP_ALIVE,
+            "num_ctx": OLLAMA_NUM_CTX or None,
+            "warm": self.warm,
+            "rewarm_interval": OLLAMA_REWARM_INTERVAL,
+            **self.stats,
+            "avg_prompt_tokens": round(self.stats["prompt_tokens"] / requests, 1),
+            "avg_prompt_eval_ms": round(self.stats["prompt_eval_ms"] / requests, 1),
+            "output_tokens_per_s": round(self.stats["output_tokens"] / (self.stats["eval_ms"] / 1000), 1)
+                                   if self.stats["eval_ms"] else None,
+        }
+
+ollama_models = OllamaModelManager()
@@ -0,0 +1,45 @@
+from datetime import datetime
+from typing import List, Optional, Tuple
+from fastapi import HTTPException, Response
+from sqlalchemy import and_, or_
+
+MAX_PAGE_SIZE = 500
+
+def encode_cursor(updated_at: datetime, row_id: int) -> str:
+    return f"{updated_at.isoformat()}_{row_id}"
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        updated_at, row_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(updated_at), int(row_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {cursor}")
+
+def keyset(query, model, limit: Optional[int], cursor: Optional[str]):
+    """
+    Order a list query newest first on (updated_at, id) and, when limit is given,
+    fetch one page after the cursor. Seeks on the index instead of OFFSET, so a
+    deep page costs the same as the first.
+    """
+    if cursor:
+        updated_at, row_id = decode_cursor(cursor)
+        query = query.where(or_(
+            model.updated_at < updated_at,
+            and_(model.updated_at == updated_at, model.id < row_id),
+        ))
+    query = query.order_by(model.updated_at.desc(), model.id.desc())
+    if limit is not None:
+        query = query.limit(limit + 1)
+    return query
+
+def page(rows: List, limit: Optional[int], response: Response) -> List:
+    """
+    Trim the extra row keyset() fetched and put the next page's cursor in the
+    X-Next-Cursor header, so list bodies stay plain arrays.
+    """
+    if limit is None or len(rows) <= limit:
+        return rows
+    rows = rows[:limit]
+    last = rows[-1]
+    response.headers["X-Next-Cursor"] = encode_cursor(last.updated_at, last.id)
+    return rows
@@ -0,0 +1,211 @@
+import os, re, sys, time, random, asyncio, cProfile, threading
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Optional
+
+# Where profiles go, and how many are kept (oldest deleted first)
+AI_PROFILE_DIR = os.getenv("AI_PROFILE_DIR", "./data/profiles")
+AI_PROFILE_MAX_FILES = int(os.getenv("AI_PROFILE_MAX_FILES", "200"))
+# Fraction of requests profiled without being asked (0 = only on request)
+AI_PROFILE_SAMPLE_RATE = float(os.getenv("AI_PROFILE_SAMPLE_RATE", "0"))
+# Honour an "X-Profile: 1 | collapsed | pstats" request header. Off by default: anyone who
+# can reach the API could otherwise make the server profile itself and write files
+AI_PROFILE_HEADER = os.getenv("AI_PROFILE_HEADER", "0").lower() not in ("0", "false", "no")
+# "collapsed": stack samples in flamegraph.pl / speedscope format, covering every thread.
+# "pstats": cProfile of the event loop thread, for pstats / snakeviz.
+AI_PROFILE_FORMAT = os.getenv("AI_PROFILE_FORMAT", "collapsed")
+AI_PROFILE_INTERVAL_MS = float(os.getenv("AI_PROFILE_INTERVAL_MS", "5"))
+# Only profile paths starting with one of these (comma separated; empty = all)
+AI_PROFILE_PATHS = [p.strip() for p in os.getenv("AI_PROFILE_PATHS", "").split(",") if p.strip()]
+
+FORMATS = ("collapsed", "pstats")
+_BODY_PEEK = 64 * 1024  # request body bytes searched for a project_id
+_PROJECT_IN_BODY = re.compile(rb'"project_id"\s*:\s*"?(\d+)')
+
+# Leaf frames of threads that are waiting, not working; their samples are dropped
+_IDLE = {
+    ("selectors.py", "select"), ("threading.py", "wait"), ("queue.py", "get"),
+    ("thread.py", "_worker"), ("runners.py", "run"),
+}
+
+class StackSampler(threading.Thread):
+    """
+    Samples the Python stack of every other thread each interval and counts the
+    distinct busy stacks. Stdlib only and cheap enough for production (one
+    sys._current_frames() per tick). It sees the whole process, so work done for
+    concurrent requests during the window shows up too.
+    """
+
+    def __init__(self, interval: float):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self.ticks = 0
+        self._done = threading.Event()
+        self._labels: Dict = {}
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        return label
+
+    def run(self):
+        me = threading.get_ident()
+        while not self._done.wait(self.interval):
+            self.ticks += 1
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                leaf = frame.f_code
+                if (os.path.basename(leaf.co_filename), leaf.co_name) in _IDLE:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+class _Session:
+    """One profiled request"""
+
+    def __init__(self, fmt: str):
+        self.fmt = fmt
+        self.started = time.perf_counter()
+        if fmt == "pstats":
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        else:
+            self.profiler = StackSampler(AI_PROFILE_INTERVAL_MS / 1000)
+            self.profiler.start()
+
+    def stop(self) -> float:
+        if self.fmt == "pstats":
+            self.profiler.disable()
+        else:
+            self.profiler.stop()
+        return time.perf_counter() - self.started
+
+    def write(self, path: str):
+        if self.fmt == "pstats":
+            self.profiler.dump_stats(path)
+        else:
+            with open(path, "w") as f:
+                for stack, count in self.profiler.samples.most_common():
+                    f.write(f"{stack} {count}\n")
+
+# One profiled request at a time: cProfile hooks the whole loop thread, and overlapping
+# samplers would each record the other's work anyway
+_active = threading.Lock()
+stats = {"profiled": 0, "skipped_busy": 0, "errors": 0}
+
+def _requested_format(scope) -> Optional[str]:
+    if AI_PROFILE_PATHS and not any(scope["path"].startswith(p) for p in AI_PROFILE_PATHS):
+        return None
+    if AI_PROFILE_HEADER:
+        for name, value in scope.get("headers", []):
+            if name == b"x-profile":
+                value = value.decode("latin-1").strip().lower()
+                if value in FORMATS:
+                    return value
+                return AI_PROFILE_FORMAT if value not in ("", "0", "false", "no") else None
+    if AI_PROFILE_SAMPLE_RATE > 0 and random.random() < AI_PROFILE_SAMPLE_RATE:
+        return AI_PROFILE_FORMAT
+    return None
+
+def _file_name(scope, body: bytes, fmt: str) -> str:
+    route = getattr(scope.get("route"), "path", None) or scope["path"]
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+    params = scope.get("path_params") or {}
+    project_id = params.get("mindmap_id") or params.get("project_id")
+    if project_id is None:
+        match = re.search(rb"(?:^|&)(?:project_id|mindmap_id)=(\d+)", scope.get("query_string", b"")) or _PROJECT_IN_BODY.search(body)
+        project_id = match.group(1).decode() if match else None
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+    project = f"-p{project_id}" if project_id is not None else ""
+    return f"{stamp}-{scope['method'].lower()}-{slug}{project}.{'pstats' if fmt == 'pstats' else 'collapsed'}"
+
+def _save(session: _Session, name: str):
+    os.makedirs(AI_PROFILE_DIR, exist_ok=True)
+    session.write(os.path.join(AI_PROFILE_DIR, name))
+    if AI_PROFILE_MAX_FILES > 0:
+        files = sorted(
+            (entry for entry in os.scandir(AI_PROFILE_DIR) if entry.name.endswith((".pstats", ".collapsed"))),
+            key=lambda entry: entry.stat().st_mtime,
+        )
+        for entry in files[:-AI_PROFILE_MAX_FILES]:
+            os.remove(entry.path)
+
+class ProfilingMiddleware:
+    """
+    Profiles requests picked by AI_PROFILE_SAMPLE_RATE or the X-Profile header, from
+    the first byte in until the last byte out, and writes one file per request to
+    AI_PROFILE_DIR named <time>-<method>-<route>[-p<project_id>].<format>. The
+    response carries the file name in X-Profile-File.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        fmt = _requested_format(scope) if scope["type"] == "http" else None
+        if fmt is None:
+            return await self.app(scope, receive, send)
+        if not _active.acquire(blocking=False):
+            stats["skipped_busy"] += 1
+            return await self.app(scope, receive, send)
+
+        body = bytearray()
+        name = None
+
+        async def peek_receive():
+            message = await receive()
+            if message["type"] == "http.request" and len(body) < _BODY_PEEK:
+                body.extend(message.get("body", b"")[:_BODY_PEEK - len(body)])
+            return message
+
+        async def send_named(message):
+            nonlocal name
+            if message["type"] == "http.response.start":
+                # Routing and the body read are done by now, so the tags are known
+                name = _file_name(scope, bytes(body), fmt)
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-file", name.encode())]}
+            await send(message)
+
+        try:
+            session = _Session(fmt)
+        except Exception as e:
+            _active.release()
+            stats["errors"] += 1
+            print(f"Could not start profiler: {e}")
+            return await self.app(scope, receive, send)
+        try:
+            await self.app(scope, peek_receive, send_named)
+        finally:
+            elapsed = session.stop()
+            try:
+                name = name or _file_name(scope, bytes(body), fmt)
+                await asyncio.to_thread(_save, session, name)
+                stats["profiled"] += 1
+                print(f"Profiled {scope['method']} {scope['path']} ({elapsed * 1000:.0f} ms) -> {name}")
+            except Exception as e:
+                stats["errors"] += 1
+                print(f"Could not write profile {name}: {e}")
+            finally:
+                _active.release()
+
+def snapshot() -> Dict:
+    return {
+        "dir": AI_PROFILE_DIR,
+        "format": AI_PROFILE_FORMAT,
+        "sample_rate": AI_PROFILE_SAMPLE_RATE,
+        "header": AI_PROFILE_HEADER,
+        "paths": AI_PROFILE_PATHS,
+        **stats,
+    }
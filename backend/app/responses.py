@@ -0,0 +1,47 @@
+import json
+from typing import Any
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import Response
+
+try:
+    import orjson
+    _loads = orjson.loads
+    # orjson >= 3.9 embeds pre-serialized JSON as-is; older versions re-parse it
+    _Fragment = getattr(orjson, "Fragment", None)
+except ImportError:  # the stdlib encoder, several times slower on large maps
+    orjson = None
+    _loads = json.loads
+    _Fragment = None
+
+def raw_json(text: str, trusted: bool = True) -> Any:
+    """
+    A stored JSON string to embed in a FastJSONResponse as a value rather than as an
+    escaped string. trusted text (composed from rows written by json.dumps) is copied
+    into the output unparsed; anything else, such as a legacy blob, is parsed first,
+    and stays a string if it isn't valid JSON.
+    """
+    text = text or "[]"
+    if trusted and _Fragment is not None:
+        return _Fragment(text)
+    try:
+        return _loads(text)
+    except ValueError:
+        return text
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        # Types orjson doesn't know (pydantic models, Decimal...) go through FastAPI's encoder
+        return orjson.dumps(content, default=jsonable_encoder)
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(Response):
+    """
+    JSON response serialized in one orjson pass. Returning it from a route skips
+    FastAPI's jsonable_encoder walk over the content, and it can carry raw_json()
+    values. Dates come out in the same ISO 8601 form as the default response.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -1,31 +1,71 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Response
 from sqlmodel import Session, select
 from datetime import datetime
-from typing import Dict
-from ..db import get_session
+from typing import Dict, Optional
+from ..db import get_session, run_db
 from ..models import Blueprint
-from ..ai import generate_blueprint
+from ..pagination import MAX_PAGE_SIZE, keyset, page
+from ..ai import check_capacity, generate_blueprint_stream
+from ..cache import use_cache_for
+from ..jobs import handler, job_events, job_queue, job_status
+from ..sse import sse_response
+from ..vectors import vector_index
 
 router = APIRouter(prefix="/blueprints", tags=["blueprints"])
 
+# Regenerating a blueprint with the same title/context returns the same spec
+CACHE_RESPONSES = True
+
 @router.get("/")
-def list_blueprints(session: Session = Depends(get_session)):
-    return session.exec(select(Blueprint).order_by(Blueprint.updated_at.desc())).all()
+def list_blueprints(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    session: Session = Depends(get_session),
+):
+    query = keyset(select(Blueprint), Blueprint, limit, cursor)
+    return page(session.exec(query).all(), limit, response)
 
 @router.get("/{blueprint_id}")
 def get_blueprint(blueprint_id: int, session: Session = Depends(get_session)):
     return session.get(Blueprint, blueprint_id)
 
 @router.post("/")
-async def create_blueprint(payload: Dict, session: Session = Depends(get_session)):
+async def create_blueprint(payload: Dict):
+    """
+    Generate and save a blueprint. Runs in the request on the LLM scheduler (a full
+    queue is a 429); POST /blueprints/jobs returns at once and survives a disconnect.
+    """
+    check_capacity()
+    return await _blueprint_job(payload, lambda event, data: None)
+
+@router.post("/jobs", status_code=202)
+async def submit_blueprint_job(payload: Dict):
+    """Queue blueprint generation and return the job; see /jobs/{id}"""
+    return job_status(await job_queue.submit("blueprint", payload))
+
+@router.post("/stream")
+async def create_blueprint_stream(payload: Dict):
+    """
+    Streaming variant of blueprint creation: sends the spec as Server-Sent Events
+    while it is generated, then saves it and sends the stored blueprint. The first
+    event carries the job id; GET /jobs/{id}/events picks the stream up again.
+    """
+    check_capacity()
+    job = await job_queue.submit("blueprint", payload)
+    return sse_response(job_events(job.id))
+
+@handler("blueprint")
+async def _blueprint_job(payload: Dict, emit) -> Dict:
     title = str(payload.get("title", "Untitled")).strip() or "Untitled"
     context_md = str(payload.get("context_md", ""))
-    spec = await generate_blueprint(title, context_md)
-    bp = Blueprint(title=title, spec_text=spec)
-    session.add(bp)
-    session.commit()
-    session.refresh(bp)
-    return bp
+    tokens = []
+    async for token in generate_blueprint_stream(title, context_md, use_cache=use_cache_for(payload, CACHE_RESPONSES)):
+        tokens.append(token)
+        emit("token", {"content": token})
+    # No connection is held while the spec is generated; it is only needed to save it
+    bp = await run_db(_save_blueprint, title, "".join(tokens))
+    return bp.model_dump(mode="json")
 
 @router.put("/{blueprint_id}")
 def update_blueprint(blueprint_id: int, payload: Dict, session: Session = Depends(get_session)):
@@ -44,6 +84,7 @@ def update_blueprint(blueprint_id: int, payload: Dict, session: Session = Depend
     session.add(bp)
     session.commit()
     session.refresh(bp)
+    vector_index.index_blueprint(bp)
     return bp
 
 @router.delete("/{blueprint_id}")
@@ -54,4 +95,13 @@ def delete_blueprint(blueprint_id: int, session: Session = Depends(get_session))
     
     session.delete(bp)
     session.commit()
+    vector_index.remove_blueprint(blueprint_id)
     return {"ok": True}
+
+def _save_blueprint(session: Session, title: str, spec_text: str) -> Blueprint:
+    bp = Blueprint(title=title, spec_text=spec_text)
+    session.add(bp)
+    session.flush()
+    session.refresh(bp)
+    vector_index.index_blueprint(bp)
+    return bp
@@ -1,9 +1,19 @@
 from fastapi import APIRouter
 from typing import Dict, List
-from ..ai import chat
+from sqlmodel import Session
+from ..ai import SYSTEM_PROMPTS, chat, chat_stream, check_capacity
+from ..cache import use_cache_for
+from ..context import render_chat
+from ..db import run_db_in_thread
+from ..graphs import resolve_context
+from ..history import compact_history, schedule_summary
+from ..sse import sse_event, sse_response
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
+# Conversational replies should not repeat verbatim
+CACHE_RESPONSES = False
+
 SYSTEM_PROMPT = """You are an AI assistant helping solo developers create complete specification documents for their projects.
 
 Your role:
@@ -25,115 +35,70 @@ The mind map flows **left to right**, with earlier components on the left connec
 
 Be concise, actionable, and encouraging. Focus on helping them build a successful MVP."""
 
+SYSTEM_PROMPTS["chat"] = SYSTEM_PROMPT
+
 @router.post("/")
 async def chat_with_ai(payload: Dict):
     """
     Chat endpoint that receives user message and mind map context
     """
-    user_message = payload.get("message", "")
-    mind_map_context = payload.get("context", {})
-    conversation_history = payload.get("history", [])
-    
-    # Build context string from mind map
-    context_str = _build_context_string(mind_map_context)
-    
-    # Build messages for AI
-    messages = [
-        {"role": "system", "content": SYSTEM_PROMPT}
-    ]
-    
-    # Add conversation history
-    for msg in conversation_history:
-        messages.append({
-            "role": msg.get("role", "user"),
-            "content": msg.get("content", "")
-        })
-    
-    # Add current message with context
-    user_content = f"{user_message}\n\n<MindMapContext>\n{context_str}\n</MindMapContext>"
-    messages.append({
-        "role": "user",
-        "content": user_content
-    })
+    messages, context_str, pending = await run_db_in_thread(_build_messages, payload)
+    schedule_summary(pending)
     
     # Get AI response
-    response = await chat(messages)
+    response = await chat(messages, use_cache=use_cache_for(payload, CACHE_RESPONSES))
     
     return {
         "message": response,
         "context_used": bool(context_str)
     }
 
-def _build_context_string(context: Dict) -> str:
+@router.post("/stream")
+async def chat_with_ai_stream(payload: Dict):
     """
-    Convert mind map context into readable string for AI
+    Streaming variant of the chat endpoint: sends response tokens as Server-Sent Events
     """
-    if not context:
-        return "No mind map loaded yet."
+    messages, context_str, pending = await run_db_in_thread(_build_messages, payload)
+    schedule_summary(pending)
+    check_capacity()
     
-    parts = []
+    async def events():
+        try:
+            async for token in chat_stream(messages, use_cache=use_cache_for(payload, CACHE_RESPONSES)):
+                yield sse_event("token", {"content": token})
+        except Exception as e:
+            print(f"Error streaming chat response: {e}")
+            yield sse_event("error", {"error": str(e)})
+            return
+        yield sse_event("done", {"context_used": bool(context_str)})
     
-    # Project info
-    template_id = context.get("template_id", "unknown")
-    template_name = context.get("template_name", "Unknown Template")
-    parts.append(f"Project Template: {template_name} ({template_id})")
+    return sse_response(events())
+
+def _build_messages(session: Session, payload: Dict):
+    """
+    Build the AI message list for a chat request. Returns (messages, context_str, pending
+    summary for schedule_summary)
+    """
+    user_message = payload.get("message", "")
+    conversation_history = payload.get("history", [])
+    project_id = payload.get("project_id")  # Enables the persisted history summary
     
-    # Progress metrics
-    progress = context.get("progress", {})
-    if progress:
-        completeness = progress.get("completeness", 0)
-        success_prob = progress.get("successProbability", 0)
-        parts.append(f"Specification Completeness: {completeness}%")
-        parts.append(f"Success Probability: {success_prob}%")
-        
-        missing = progress.get("missingItems", [])
-        if missing:
-            parts.append(f"Missing Requirements: {', '.join(missing)}")
+    # Build context string from mind map (sent by the client or loaded by project_id)
+    mind_map_context, digest, _ = resolve_context(payload, session)
+    context_str = render_chat(mind_map_context, digest=digest)
     
-    # Nodes
-    nodes = context.get("nodes", [])
-    if nodes:
-        parts.append(f"\nTotal Nodes: {len(nodes)}")
-        
-        # Group by type
-        by_type = {}
-        for node in nodes:
-            node_type = node.get("type", "unknown")
-            if node_type not in by_type:
-                by_type[node_type] = []
-            by_type[node_type].append(node)
-        
-        for node_type, type_nodes in by_type.items():
-            parts.append(f"\n{node_type.upper()} Nodes ({len(type_nodes)}):")
-            for node in type_nodes:
-                label = node.get("data", {}).get("label", "Unnamed")
-                description = node.get("data", {}).get("description", "")
-                parts.append(f"  - {label}")
-                if description:
-                    parts.append(f"    Description: {description[:100]}")
+    # Build messages for AI
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
     
-    # Edges/connections
-    edges = context.get("edges", [])
-    if edges:
-        parts.append(f"\nConnections ({len(edges)} relationships):")
-        for edge in edges:
-            source = edge.get("source", "unknown")
-            target = edge.get("target", "unknown")
-            label = edge.get("label", "")
-            
-            # Find node labels for better readability
-            source_node = next((n for n in nodes if n.get("id") == source), None)
-            target_node = next((n for n in nodes if n.get("id") == target), None)
-            
-            source_label = source_node.get("data", {}).get("label", source) if source_node else source
-            target_label = target_node.get("data", {}).get("label", target) if target_node else target
-            
-            connection_str = f"  - {source_label} → {target_label}"
-            if label:
-                connection_str += f" ({label})"
-            parts.append(connection_str)
-    else:
-        parts.append("\n⚠️ No connections defined yet. Nodes should be connected to show dependencies and relationships.")
+    # Add conversation history: running summary of older turns plus the recent ones
+    history, pending = compact_history(conversation_history, project_id, session)
+    messages.extend(history)
     
-    return "\n".join(parts)
-
+    # Add current message with context
+    user_content = f"{user_message}\n\n<MindMapContext>\n{context_str}\n</MindMapContext>"
+    messages.append({
+        "role": "user",
+        "content": user_content
+    })
+    
+    return messages, context_str, pending
@@ -1,9 +1,28 @@
-from fastapi import APIRouter
-from typing import Dict
-from ..ai import chat
+import os, asyncio
+from fastapi import APIRouter, Depends, Query
+from typing import Dict, List, Optional
+from sqlalchemy import func
+from sqlmodel import Session, select
+from ..ai import SYSTEM_PROMPTS, chat_stream, check_capacity
+from ..cache import use_cache_for
+from ..context import render_evaluation
+from ..db import get_session, run_db, run_db_in_thread
+from ..graphs import graph_cache, graph_context, resolve_context
+from ..jobs import BATCH_LANE, handler, job_events, job_queue, job_status
+from ..models import Evaluation, MindMap
+from ..pagination import MAX_PAGE_SIZE
+from ..scheduler import BACKGROUND, BATCH, LLMQueueFull
+from ..sse import sse_response
 
 router = APIRouter(prefix="/evaluate", tags=["evaluate"])
 
+# Evaluations of an unchanged map are repeated on every ProgressIndicators refresh
+CACHE_RESPONSES = True
+
+# Batch evaluations: maps evaluated at once (the provider scheduler still caps LLM calls), maps per batch
+AI_EVAL_BATCH_CONCURRENCY = int(os.getenv("AI_EVAL_BATCH_CONCURRENCY", "4"))
+AI_EVAL_BATCH_MAX = int(os.getenv("AI_EVAL_BATCH_MAX", "200"))
+
 EVALUATION_PROMPT = """You are an expert software architect evaluating a project specification.
 
 Analyze the provided mind map and provide:
@@ -15,22 +34,155 @@ Analyze the provided mind map and provide:
 
 Be honest and constructive. Focus on what would actually help them build a successful MVP."""
 
+SYSTEM_PROMPTS["evaluation"] = EVALUATION_PROMPT
+
 @router.post("/")
 async def evaluate_mindmap(payload: Dict):
     """
-    AI-powered evaluation of mind map specification quality
+    AI-powered evaluation of mind map specification quality.
+    Send the map in "context", or just "project_id" to evaluate the stored map.
+    Runs in the request on the LLM scheduler (a full queue is a 429) and is stored
+    as an Evaluation; POST /evaluate/jobs returns at once and survives a disconnect.
+    """
+    check_capacity()
+    return await _evaluation_job(payload, lambda event, data: None)
+
+@router.post("/jobs", status_code=202)
+async def submit_evaluation_job(payload: Dict):
+    """Queue an evaluation and return the job; see /jobs/{id}"""
+    return job_status(await job_queue.submit("evaluation", payload))
+
+@router.post("/batch")
+async def evaluate_batch(payload: Dict):
+    """
+    Evaluate many stored maps: {"mindmap_ids": [...]} or {"folder_id": n}.
+    Server-Sent Events: "status", then one "result" event per map as it finishes
+    (mindmap_id, title, scores and evaluation_id, or an error), then "done" with
+    the summary. Every evaluation is stored, see GET /evaluate/scores.
     """
-    context = payload.get("context", {})
+    if not _batch_selected(payload):
+        return {"error": "Send mindmap_ids or folder_id"}
+    return sse_response(job_events((await job_queue.submit("evaluation_batch", payload)).id))
+
+@router.post("/batch/jobs", status_code=202)
+async def submit_evaluation_batch_job(payload: Dict):
+    """Queue a batch evaluation and return the job; see /jobs/{id}"""
+    if not _batch_selected(payload):
+        return {"error": "Send mindmap_ids or folder_id"}
+    return job_status(await job_queue.submit("evaluation_batch", payload))
+
+@router.get("/scores")
+def latest_scores(
+    folder_id: Optional[int] = None,
+    session: Session = Depends(get_session),
+):
+    """Latest stored scores per mind map (optionally one folder's), without the evaluation text"""
+    latest = select(Evaluation.mindmap_id, func.max(Evaluation.id).label("id")).group_by(Evaluation.mindmap_id).subquery()
+    query = (
+        select(Evaluation.id, Evaluation.mindmap_id, MindMap.title, Evaluation.ai_completeness, Evaluation.ai_success, Evaluation.created_at)
+        .join(latest, latest.c.id == Evaluation.id)
+        .join(MindMap, MindMap.id == Evaluation.mindmap_id)
+    )
+    if folder_id is not None:
+        query = query.where(MindMap.folder_id == folder_id)
+    return [
+        {"evaluation_id": row.id, "mindmap_id": row.mindmap_id, "title": row.title,
+         "ai_completeness": row.ai_completeness, "ai_success": row.ai_success, "created_at": row.created_at}
+        for row in session.exec(query.order_by(MindMap.title)).all()
+    ]
+
+@router.get("/")
+def list_evaluations(
+    mindmap_id: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    session: Session = Depends(get_session),
+):
+    """Stored evaluations, newest first, optionally for one mind map"""
+    query = select(Evaluation)
+    if mindmap_id is not None:
+        query = query.where(Evaluation.mindmap_id == mindmap_id)
+    return session.exec(query.order_by(Evaluation.id.desc()).limit(limit)).all()
+
+@handler("evaluation")
+async def _evaluation_job(payload: Dict, emit) -> Dict:
+    context, digest, _ = await run_db_in_thread(lambda session: resolve_context(payload, session))
+    project_id = payload.get("project_id")
+    return await _evaluate(
+        context, digest, int(project_id) if project_id else None,
+        use_cache_for(payload, CACHE_RESPONSES), BACKGROUND, emit,
+    )
+
+@handler("evaluation_batch", lane=BATCH_LANE)
+async def _evaluation_batch_job(payload: Dict, emit) -> Dict:
+    graphs = await run_db_in_thread(_load_batch, payload)
+    use_cache = use_cache_for(payload, CACHE_RESPONSES)
+    # Don't queue more maps on the provider than it can run; the rest wait here
+    limit = asyncio.Semaphore(max(1, AI_EVAL_BATCH_CONCURRENCY))
+    
+    async def evaluate_one(graph) -> Dict:
+        context, digest = graph_context(graph)
+        async with limit:
+            try:
+                result = await _evaluate(context, digest, graph.mindmap_id, use_cache, BATCH)
+                outcome = {
+                    "mindmap_id": graph.mindmap_id,
+                    "title": graph.title,
+                    "ai_completeness": result["ai_completeness"],
+                    "ai_success": result["ai_success"],
+                    "evaluation_id": result["evaluation_id"],
+                }
+            except Exception as e:
+                print(f"Batch evaluation of mind map {graph.mindmap_id} failed: {e}")
+                outcome = {"mindmap_id": graph.mindmap_id, "title": graph.title, "error": str(e) or type(e).__name__}
+        emit("result", outcome)
+        return outcome
     
+    outcomes = await asyncio.gather(*(evaluate_one(graph) for graph in graphs))
+    return {
+        "evaluated": sum(1 for o in outcomes if "error" not in o),
+        "failed": sum(1 for o in outcomes if "error" in o),
+        "results": outcomes,
+    }
+
+def _batch_selected(payload: Dict) -> bool:
+    return bool(payload.get("mindmap_ids")) or payload.get("folder_id") is not None
+
+def _load_batch(session: Session, payload: Dict) -> List:
+    """The requested maps with one query, parsed through the graph cache"""
+    query = select(MindMap)
+    if payload.get("mindmap_ids"):
+        query = query.where(MindMap.id.in_([int(i) for i in payload["mindmap_ids"]]))
+    elif payload.get("folder_id") is not None:
+        query = query.where(MindMap.folder_id == int(payload["folder_id"]))
+    else:
+        raise ValueError("Send mindmap_ids or folder_id")
+    mindmaps = session.exec(query.order_by(MindMap.id).limit(AI_EVAL_BATCH_MAX)).all()
+    return graph_cache.get_many(session, mindmaps)
+
+async def _evaluate(context: Dict, digest: Optional[str], mindmap_id: Optional[int], use_cache: bool, priority: str, emit=None) -> Dict:
+    """Evaluate one rendered map, store the result and return it"""
     # Build detailed context for AI
-    context_str = _build_evaluation_context(context)
+    context_str = render_evaluation(context, digest=digest)
     
     messages = [
         {"role": "system", "content": EVALUATION_PROMPT},
         {"role": "user", "content": f"Evaluate this project specification:\n\n{context_str}"}
     ]
     
-    response = await chat(messages)
+    for attempt in range(3):
+        tokens = []
+        try:
+            async for token in chat_stream(messages, use_cache=use_cache, priority=priority):
+                tokens.append(token)
+                if emit:
+                    emit("token", {"content": token})
+            break
+        except LLMQueueFull as e:
+            # Batches run behind interactive traffic; wait for room rather than fail
+            if priority != BATCH or attempt == 2:
+                raise
+            await asyncio.sleep(e.retry_after)
+    response = "".join(tokens)
     
     # Parse AI response for scores (basic parsing)
     try:
@@ -40,65 +192,20 @@ async def evaluate_mindmap(payload: Dict):
         completeness_score = None
         success_score = None
     
+    evaluation = await run_db(_save_evaluation, mindmap_id, response, completeness_score, success_score)
+    
     return {
         "evaluation": response,
         "ai_completeness": completeness_score,
-        "ai_success": success_score
+        "ai_success": success_score,
+        "evaluation_id": evaluation.id
     }
 
-def _build_evaluation_context(context: Dict) -> str:
-    """Build detailed context for AI evaluation"""
-    parts = []
-    
-    template_name = context.get("template_name", "Unknown")
-    parts.append(f"Project Type: {template_name}")
-    
-    nodes = context.get("nodes", [])
-    parts.append(f"Total Nodes: {len(nodes)}")
-    
-    if nodes:
-        # Group and analyze nodes
-        by_type = {}
-        for node in nodes:
-            node_type = node.get("type", "unknown")
-            if node_type not in by_type:
-                by_type[node_type] = []
-            by_type[node_type].append(node)
-        
-        for node_type, type_nodes in by_type.items():
-            parts.append(f"\n{node_type.upper()} Nodes ({len(type_nodes)}):")
-            for node in type_nodes:
-                label = node.get("data", {}).get("label", "Unnamed")
-                description = node.get("data", {}).get("description", "")
-                technology = node.get("data", {}).get("technology", "")
-                fields = node.get("data", {}).get("fields", [])
-                
-                parts.append(f"\n  • {label}")
-                if description:
-                    parts.append(f"    Description: {description}")
-                if technology:
-                    parts.append(f"    Technology: {technology}")
-                if fields and len(fields) > 0:
-                    parts.append(f"    Fields: {', '.join(fields)}")
-                
-                # Flag incomplete nodes
-                if not description or len(description.strip()) < 20:
-                    parts.append(f"    ⚠️ Needs more detail")
-    
-    edges = context.get("edges", [])
-    parts.append(f"\nConnections: {len(edges)} relationships")
-    
-    progress = context.get("progress", {})
-    if progress:
-        parts.append(f"\nCurrent Metrics:")
-        parts.append(f"  Rule-based Completeness: {progress.get('completeness', 0)}%")
-        parts.append(f"  Rule-based Success: {progress.get('successProbability', 0)}%")
-        
-        missing = progress.get("missingItems", [])
-        if missing:
-            parts.append(f"  Missing: {', '.join(missing)}")
-    
-    return "\n".join(parts)
+def _save_evaluation(session: Session, mindmap_id: Optional[int], text: str, completeness: Optional[int], success: Optional[int]) -> Evaluation:
+    evaluation = Evaluation(mindmap_id=mindmap_id, evaluation=text, ai_completeness=completeness, ai_success=success)
+    session.add(evaluation)
+    session.flush()
+    return evaluation
 
 def _extract_score(text: str, score_name: str) -> int:
     """
@@ -114,4 +221,3 @@ def _extract_score(text: str, score_name: str) -> int:
         return int(match.group(1))
     
     return None
-
@@ -0,0 +1,40 @@
+from fastapi import APIRouter
+from typing import Dict
+from ..jobs import FINISHED, job_events, job_queue, job_result, job_status
+from ..sse import sse_response
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+@router.post("/", status_code=202)
+async def submit_job(payload: Dict):
+    """
+    Queue a background job: {"kind": "blueprint" | "evaluation", "payload": {...}}, where
+    payload is the body the matching POST /blueprints/ or /evaluate/ takes.
+    Follow it with GET /jobs/{id}/events or poll GET /jobs/{id}.
+    """
+    try:
+        job = await job_queue.submit(str(payload.get("kind", "")), payload.get("payload") or {})
+    except ValueError as e:
+        return {"error": str(e)}
+    return job_status(job)
+
+@router.get("/{job_id}")
+async def get_job(job_id: str):
+    job = await job_queue.get(job_id)
+    if not job:
+        return {"error": "Job not found"}
+    return job_status(job)
+
+@router.get("/{job_id}/result")
+async def get_job_result(job_id: str):
+    job = await job_queue.get(job_id)
+    if not job:
+        return {"error": "Job not found"}
+    if job.status not in FINISHED:
+        return job_status(job)
+    return {**job_status(job), "result": job_result(job)}
+
+@router.get("/{job_id}/events")
+async def follow_job(job_id: str):
+    """Server-Sent Events: "status", then "token" events while running, then "done" or "error" """
+    return sse_response(job_events(job_id))
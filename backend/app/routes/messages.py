@@ -0,0 +1,55 @@
+from fastapi import APIRouter, Depends, Query
+from sqlmodel import Session
+from typing import Dict, Optional
+from ..db import get_session
+from ..models import MindMap
+from .. import storage
+
+router = APIRouter(prefix="/mindmaps", tags=["messages"])
+
+@router.get("/{mindmap_id}/messages")
+def list_messages(
+    mindmap_id: int,
+    limit: int = Query(50, ge=1, le=500),
+    before: Optional[int] = None,
+    session: Session = Depends(get_session),
+):
+    """
+    Page through a mind map's chat history, newest page first. Messages within a page
+    are in chronological order; pass next_cursor as `before` to load older ones.
+    """
+    mindmap = session.get(MindMap, mindmap_id)
+    if not mindmap:
+        return {"error": "Mind map not found"}
+    if mindmap.chat_history is not None:
+        # One-time move of a legacy JSON blob into message rows
+        storage.ensure_message_rows(session, mindmap)
+        session.commit()
+
+    messages, next_cursor = storage.page_messages(session, mindmap_id, limit, before)
+    return {"messages": messages, "next_cursor": next_cursor, "has_more": next_cursor is not None}
+
+@router.post("/{mindmap_id}/messages")
+def append_messages(mindmap_id: int, payload: Dict, session: Session = Depends(get_session)):
+    """
+    Append one message ({"role": ..., "content": ...}) or several ({"messages": [...]})
+    to a mind map's chat history.
+    """
+    mindmap = session.get(MindMap, mindmap_id)
+    if not mindmap:
+        return {"error": "Mind map not found"}
+
+    messages = payload["messages"] if isinstance(payload.get("messages"), list) else [payload]
+    rows = storage.append_messages(session, mindmap, messages)
+    session.commit()
+    return {"ok": True, "appended": len(rows), "last_id": rows[-1].id if rows else None}
+
+@router.delete("/{mindmap_id}/messages")
+def clear_messages(mindmap_id: int, session: Session = Depends(get_session)):
+    mindmap = session.get(MindMap, mindmap_id)
+    if not mindmap:
+        return {"error": "Mind map not found"}
+
+    storage.sync_messages(session, mindmap, [])
+    session.commit()
+    return {"ok": True}
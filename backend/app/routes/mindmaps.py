@@ -1,25 +1,67 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Response
 from sqlmodel import Session, select
 from datetime import datetime
-from typing import Dict, Optional
-import json
+from typing import Dict, List, Literal, Optional
 from ..db import get_session
-from ..models import MindMap
+from ..graphs import graph_cache
+from ..digests import patch_digest, update_digest
+from ..models import ChatSummary, MindMap, MindMapDigest
+from ..pagination import MAX_PAGE_SIZE, keyset, page
+from ..responses import FastJSONResponse
+from ..vectors import vector_index
+from .. import storage
 
 router = APIRouter(prefix="/mindmaps", tags=["mindmaps"])
 
 @router.get("/")
-def list_mindmaps(folder_id: Optional[int] = None, session: Session = Depends(get_session)):
-    """List mind maps, optionally filtered by folder"""
-    query = select(MindMap)
+def list_mindmaps(
+    response: Response,
+    folder_id: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    view: Literal["summary", "full"] = "summary",
+    blobs: Literal["string", "raw"] = "string",
+    include: Optional[str] = None,
+    session: Session = Depends(get_session),
+):
+    """
+    List mind maps newest first, optionally filtered by folder. Entries are summaries
+    (no nodes, edges or chat history, but node_count/edge_count); GET /mindmaps/{id}
+    returns the full document, as does view=full here. With limit, one page is
+    returned and the next page's cursor is in the X-Next-Cursor header.
+    """
+    query = select(MindMap) if view == "full" else select(*storage.SUMMARY_COLUMNS)
     if folder_id is not None:
         query = query.where(MindMap.folder_id == folder_id)
-    query = query.order_by(MindMap.updated_at.desc())
-    return session.exec(query).all()
+    rows = page(session.exec(keyset(query, MindMap, limit, cursor)).all(), limit, response)
+    if view == "full":
+        content = storage.documents(session, rows, raw=blobs == "raw", chat=_includes_chat(include))
+    else:
+        content = storage.summaries(session, rows)
+    # Returned as a Response, so the pagination header has to be copied over
+    return FastJSONResponse(content, headers=dict(response.headers))
 
 @router.get("/{mindmap_id}")
-def get_mindmap(mindmap_id: int, session: Session = Depends(get_session)):
-    return session.get(MindMap, mindmap_id)
+def get_mindmap(
+    mindmap_id: int,
+    blobs: Literal["string", "raw"] = "string",
+    include: Optional[str] = None,
+    session: Session = Depends(get_session),
+):
+    """
+    One mind map. The chat is not included, only message_count: page through it with
+    GET /mindmaps/{id}/messages, or send include=chat for the whole chat_history.
+    nodes_json, edges_json (and chat_history) are JSON strings by default; blobs=raw
+    embeds them as arrays, which skips escaping them on the way out and a second
+    JSON.parse in the client.
+    """
+    mindmap = session.get(MindMap, mindmap_id)
+    if not mindmap:
+        return None
+    return FastJSONResponse(storage.document(session, mindmap, raw=blobs == "raw", chat=_includes_chat(include)))
+
+def _includes_chat(include: Optional[str]) -> bool:
+    return "chat" in [part.strip() for part in (include or "").split(",")]
 
 @router.post("/")
 def create_mindmap(payload: Dict, session: Session = Depends(get_session)):
@@ -29,17 +71,24 @@ def create_mindmap(payload: Dict, session: Session = Depends(get_session)):
     edges = payload.get("edges", [])
     folder_id = payload.get("folder_id")  # Optional folder assignment
     
+    # Nodes, edges and chat messages live in their own tables; the blob columns stay NULL
     mindmap = MindMap(
         title=title,
         template_id=template_id,
-        nodes_json=json.dumps(nodes),
-        edges_json=json.dumps(edges),
+        nodes_json=None,
+        edges_json=None,
+        chat_history=None,
         folder_id=folder_id
     )
     session.add(mindmap)
+    session.flush()
+    storage.replace_items(session, mindmap, "node", nodes)
+    storage.replace_items(session, mindmap, "edge", edges)
+    update_digest(session, mindmap.id, nodes)
     session.commit()
     session.refresh(mindmap)
-    return mindmap
+    vector_index.index_mindmap(mindmap.id, mindmap.title, nodes)
+    return storage.document(session, mindmap)
 
 @router.put("/{mindmap_id}")
 def update_mindmap(mindmap_id: int, payload: Dict, session: Session = Depends(get_session)):
@@ -47,22 +96,73 @@ def update_mindmap(mindmap_id: int, payload: Dict, session: Session = Depends(ge
     if not mindmap:
         return {"error": "Mind map not found"}
 
+    node_changes = []
     if "title" in payload:
         mindmap.title = str(payload["title"]).strip() or "Untitled Mind Map"
-    if "nodes" in payload:
-        mindmap.nodes_json = json.dumps(payload["nodes"])
-    if "edges" in payload:
-        mindmap.edges_json = json.dumps(payload["edges"])
+    if "nodes" in payload or "edges" in payload:
+        # Written as a diff against the stored rows, so an autosave that moved
+        # one node updates one row rather than the whole document
+        storage.ensure_rows(session, mindmap)
+        if "nodes" in payload:
+            node_changes = storage.replace_items(session, mindmap, "node", payload["nodes"])
+            if node_changes:
+                update_digest(session, mindmap_id, payload["nodes"])
+        if "edges" in payload:
+            storage.replace_items(session, mindmap, "edge", payload["edges"])
     if "folder_id" in payload:
         mindmap.folder_id = payload["folder_id"]
     if "chat_history" in payload:
-        mindmap.chat_history = json.dumps(payload["chat_history"])
+        # Prefer POST /mindmaps/{id}/messages; a full history is stored as a diff
+        storage.sync_messages(session, mindmap, payload["chat_history"])
 
     mindmap.updated_at = datetime.utcnow()
     session.add(mindmap)
     session.commit()
+    graph_cache.invalidate(mindmap_id)
     session.refresh(mindmap)
-    return mindmap
+    if "title" in payload:
+        vector_index.index_mindmap(mindmap_id, mindmap.title)
+    _index_changes(mindmap_id, node_changes)
+    return storage.document(session, mindmap)
+
+@router.patch("/{mindmap_id}")
+def patch_mindmap(mindmap_id: int, payload: Dict, session: Session = Depends(get_session)):
+    """
+    Apply add/update/remove operations to individual nodes and edges, e.g.
+    {"ops": [{"op": "update", "node": {"id": "n1", "position": {"x": 10, "y": 20}}},
+             {"op": "remove", "edge": {"id": "e3"}}]}
+    Only the touched rows are written, however large the map is.
+    """
+    mindmap = session.get(MindMap, mindmap_id)
+    if not mindmap:
+        return {"error": "Mind map not found"}
+
+    storage.ensure_rows(session, mindmap)
+    try:
+        applied, node_changes = storage.apply_ops(session, mindmap, payload.get("ops", []))
+    except ValueError as e:
+        session.rollback()
+        return {"error": str(e)}
+    if node_changes:
+        # Digest and similarity index follow the touched nodes only
+        patch_digest(session, mindmap_id, node_changes)
+    if "title" in payload:
+        mindmap.title = str(payload["title"]).strip() or "Untitled Mind Map"
+
+    mindmap.updated_at = datetime.utcnow()
+    session.add(mindmap)
+    session.commit()
+    graph_cache.invalidate(mindmap_id)
+    if "title" in payload:
+        vector_index.index_mindmap(mindmap_id, mindmap.title)
+    _index_changes(mindmap_id, node_changes)
+    return {"ok": True, "id": mindmap_id, "updated_at": mindmap.updated_at, **applied}
+
+def _index_changes(mindmap_id: int, changes: List[storage.Change]):
+    """Re-index the nodes a write added, changed or removed; moves leave the text alone"""
+    nodes = {key: after for action, key, _, after in changes if action != "move"}
+    if nodes:
+        vector_index.index_nodes(mindmap_id, nodes)
 
 @router.delete("/{mindmap_id}")
 def delete_mindmap(mindmap_id: int, session: Session = Depends(get_session)):
@@ -70,7 +170,13 @@ def delete_mindmap(mindmap_id: int, session: Session = Depends(get_session)):
     if not mindmap:
         return {"error": "Mind map not found"}
     
+    for derived in (session.get(ChatSummary, mindmap_id), session.get(MindMapDigest, mindmap_id)):
+        if derived:
+            session.delete(derived)
+    storage.delete_items(session, mindmap_id)
     session.delete(mindmap)
     session.commit()
+    graph_cache.invalidate(mindmap_id)
+    vector_index.remove_mindmap(mindmap_id)
     return {"ok": True}
 
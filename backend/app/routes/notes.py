@@ -1,19 +1,26 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Response
 from sqlmodel import Session, select
 from datetime import datetime
 from typing import Dict, Optional
 from ..db import get_session
 from ..models import Note
+from ..pagination import MAX_PAGE_SIZE, keyset, page
+from ..vectors import vector_index
 
 router = APIRouter(prefix="/notes", tags=["notes"])
 
 @router.get("/")
-def list_notes(mindmap_id: Optional[int] = None, session: Session = Depends(get_session)):
+def list_notes(
+    response: Response,
+    mindmap_id: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    session: Session = Depends(get_session),
+):
     query = select(Note)
     if mindmap_id is not None:
         query = query.where(Note.mindmap_id == mindmap_id)
-    query = query.order_by(Note.updated_at.desc())
-    return session.exec(query).all()
+    return page(session.exec(keyset(query, Note, limit, cursor)).all(), limit, response)
 
 @router.get("/{note_id}")
 def get_note(note_id: int, session: Session = Depends(get_session)):
@@ -30,6 +37,7 @@ def create_note(payload: Dict, session: Session = Depends(get_session)):
     session.add(note)
     session.commit()
     session.refresh(note)
+    vector_index.index_note(note)
     return note
 
 @router.put("/{note_id}")
@@ -49,6 +57,7 @@ def update_note(note_id: int, payload: Dict, session: Session = Depends(get_sess
     session.add(note)
     session.commit()
     session.refresh(note)
+    vector_index.index_note(note)
     return note
 
 @router.delete("/{note_id}")
@@ -59,4 +68,5 @@ def delete_note(note_id: int, session: Session = Depends(get_session)):
     
     session.delete(note)
     session.commit()
+    vector_index.remove_note(note_id)
     return {"ok": True}
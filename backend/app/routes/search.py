@@ -0,0 +1,90 @@
+import re
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session
+from typing import Optional
+from ..db import get_session
+
+router = APIRouter(prefix="/search", tags=["search"])
+
+KINDS = ("mindmap", "node", "note", "blueprint")
+MAX_RESULTS = 50
+
+# bm25 column weights in search_index order: title, body, tags
+_RANK = "bm25(search_index, 10.0, 1.0, 5.0)"
+
+def _fts_query(q: str) -> str:
+    """
+    Turn free text into an FTS5 query: every word must match, the last one as a
+    prefix so results follow the user as they type. Words are quoted, so FTS5
+    syntax in the input (AND, NEAR, column filters, stray quotes) is plain text.
+    """
+    words = re.findall(r"\w+", q)
+    terms = [f'"{w}"' for w in words]
+    if terms and q.rstrip()[-1:].isalnum():
+        terms[-1] += "*"
+    return " ".join(terms)
+
+@router.get("/")
+def search(
+    q: str = "",
+    kind: Optional[str] = Query(None, description="Comma separated subset of mindmap,node,note,blueprint"),
+    tag: Optional[str] = Query(None, description="Only notes carrying this tag"),
+    limit: int = Query(20, ge=1, le=MAX_RESULTS),
+    offset: int = Query(0, ge=0),
+    session: Session = Depends(get_session),
+):
+    """
+    Full-text search over mind map titles, node labels and descriptions, notes and
+    blueprints, best matches first. Each result carries a snippet with the matched
+    terms wrapped in <mark>; pass next_offset back as offset for the next page.
+    """
+    match = _fts_query(q)
+    if tag:
+        tag_terms = " ".join(f'"{w}"' for w in re.findall(r"\w+", tag))
+        if tag_terms:
+            match = f"{match} tags : ({tag_terms})".strip()
+    if not match:
+        return {"query": q, "results": [], "next_offset": None}
+
+    kinds = [k for k in (kind or "").split(",") if k in KINDS] or list(KINDS)
+    if tag:
+        kinds = ["note"]
+    params = {"match": match, "limit": limit + 1, "offset": offset}
+    params.update({f"kind{i}": k for i, k in enumerate(kinds)})
+    kind_filter = ", ".join(f":kind{i}" for i in range(len(kinds)))
+
+    sql = text(f"""
+        SELECT search_index.kind, search_index.ref_id, search_index.mindmap_id,
+               search_index.title,
+               snippet(search_index, -1, '<mark>', '</mark>', '…', 12) AS snippet,
+               {_RANK} AS rank,
+               mindmap.title AS mindmap_title
+        FROM search_index
+        LEFT JOIN mindmap ON mindmap.id = search_index.mindmap_id
+        WHERE search_index MATCH :match AND search_index.kind IN ({kind_filter})
+        ORDER BY rank
+        LIMIT :limit OFFSET :offset
+    """)
+    try:
+        rows = session.execute(sql, params).all()
+    except OperationalError as e:
+        # No search_index table: the database is not SQLite, or predates migration 3
+        print(f"Search failed: {e}")
+        return {"error": "Full-text search is unavailable on this database"}
+
+    results = [
+        {
+            "kind": row.kind,
+            "id": row.ref_id,
+            "mindmap_id": row.mindmap_id,
+            "mindmap_title": row.mindmap_title,
+            "title": row.title,
+            "snippet": row.snippet,
+            "score": round(-row.rank, 4),
+        }
+        for row in rows[:limit]
+    ]
+    next_offset = offset + limit if len(rows) > limit else None
+    return {"query": q, "results": results, "next_offset": next_offset}
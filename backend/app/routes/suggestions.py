@@ -1,12 +1,26 @@
-from fastapi import APIRouter, Depends
-from typing import Dict, List, Optional
-from sqlmodel import Session, select
-from ..ai import chat
-from ..db import get_session
-from ..models import MindMap
+from fastapi import APIRouter
+from typing import Dict, List, Optional, Tuple
+from sqlmodel import Session
+import os
+from ..ai import SYSTEM_PROMPTS, chat, chat_stream, check_capacity
+from ..cache import use_cache_for
+from ..context import render_suggestion
+from ..sse import sse_event, sse_response
+from ..db import run_db_in_thread
+from ..graphs import resolve_context
+from ..history import PendingSummary, compact_history, schedule_summary
+from ..jsonstream import StreamingObject
+from ..digests import project_digests, recent_digests
+from ..scheduler import LLMQueueFull
+from ..vectors import vector_index
 
 router = APIRouter(prefix="/suggestions", tags=["suggestions"])
 
+# Re-asking the same question should get fresh suggestions
+CACHE_RESPONSES = False
+
+AI_RELATED_TOP_K = int(os.getenv("AI_RELATED_TOP_K", "12"))  # similar nodes/notes/blueprints pulled into the prompt
+
 SUGGESTION_SYSTEM_PROMPT = """You are an AI specification assistant that collaboratively builds mind maps with users.
 
 Your role is to analyze conversations and suggest specific, actionable mind map updates.
@@ -172,45 +186,102 @@ When working with Spec-Driven Development templates, follow this structured appr
 
 IMPORTANT: Always return valid JSON. Do not include any text before or after the JSON object."""
 
+SYSTEM_PROMPTS["suggestions"] = SUGGESTION_SYSTEM_PROMPT
+
 @router.post("/analyze")
-async def analyze_conversation(payload: Dict, session: Session = Depends(get_session)):
+async def analyze_conversation(payload: Dict):
     """
     Analyze conversation and mind map to generate structured suggestions.
     Now includes cross-project pattern recognition.
     """
+    messages, pending = await run_db_in_thread(_build_messages, payload)
+    schedule_summary(pending)
+    
+    # Get AI response
+    try:
+        response = await chat(messages, use_cache=use_cache_for(payload, CACHE_RESPONSES))
+        return _parse_suggestions(response)
+    except LLMQueueFull:
+        raise
+    except Exception as e:
+        print(f"Error parsing AI response: {e}")
+        return _error_response(e)
+
+@router.post("/analyze/stream")
+async def analyze_conversation_stream(payload: Dict):
+    """
+    Streaming variant of /analyze: sends the model's tokens as Server-Sent Events,
+    a "message" event once the reply's message is complete, a "suggestion" event
+    for each suggestion as soon as the model has finished writing it, and a final
+    "result" event with the parsed suggestions.
+    """
+    messages, pending = await run_db_in_thread(_build_messages, payload)
+    schedule_summary(pending)
+    check_capacity()
+    
+    async def events():
+        parser = StreamingObject("suggestions")
+        tokens = []
+        sent_message = False
+        try:
+            async for token in chat_stream(messages, use_cache=use_cache_for(payload, CACHE_RESPONSES)):
+                tokens.append(token)
+                yield sse_event("token", {"content": token})
+                for suggestion in parser.feed(token):
+                    yield sse_event("suggestion", {"index": len(parser.items) - 1, "suggestion": suggestion})
+                if not sent_message and "message" in parser.fields:
+                    sent_message = True
+                    yield sse_event("message", {"content": parser.fields["message"]})
+            result = _parse_suggestions("".join(tokens), parser)
+        except Exception as e:
+            print(f"Error parsing AI response: {e}")
+            result = _error_response(e)
+            if parser.items:
+                result["suggestions"] = parser.items  # keep what was already sent
+        yield sse_event("result", result)
+    
+    return sse_response(events())
+
+def _build_messages(session: Session, payload: Dict) -> Tuple[List[Dict], Optional[PendingSummary]]:
+    """
+    Build the AI message list for a suggestion request, including cross-project context.
+    Returns (messages, pending summary for schedule_summary)
+    """
     user_message = payload.get("message", "")
-    mind_map_context = payload.get("context", {})
     conversation_history = payload.get("history", [])
     current_project_id = payload.get("project_id")  # Current project ID
-    current_project_title = payload.get("project_title", "Untitled Mind Map")
     
-    # Build context for current project
-    context_str = _build_detailed_context(mind_map_context, current_project_title)
+    # Build context for current project (sent by the client or loaded by project_id)
+    mind_map_context, digest, graph = resolve_context(payload, session)
+    current_project_title = payload.get("project_title", graph.title if graph else "Untitled Mind Map")
+    context_str = render_suggestion(mind_map_context, current_project_title, digest=digest)
     
     # Load other projects for pattern recognition
     other_projects_context = ""
     if current_project_id:
         try:
-            query = select(MindMap).where(MindMap.id != current_project_id).order_by(MindMap.updated_at.desc()).limit(5)
-            other_projects = session.exec(query).all()
+            # The past projects most similar to this message, else the most recent ones
+            related = vector_index.search(user_message, k=AI_RELATED_TOP_K, exclude_project=int(current_project_id))
+            related_ids = []
+            for match in related:
+                if match["kind"] in ("node", "project") and match["project_id"] not in related_ids:
+                    related_ids.append(match["project_id"])
+            if related_ids:
+                other_projects = project_digests(session, ids=related_ids[:5])
+            else:
+                other_projects = recent_digests(session, exclude_id=int(current_project_id), limit=5)
             
-            if other_projects:
-                other_projects_context = _build_other_projects_context(other_projects)
+            if other_projects or related:
+                other_projects_context = _build_other_projects_context(other_projects, related, ranked=bool(related_ids))
         except Exception as e:
             print(f"Error loading other projects: {e}")
     
     # Build messages for AI
-    messages = [
-        {"role": "system", "content": SUGGESTION_SYSTEM_PROMPT}
-    ]
+    messages = [{"role": "system", "content": SUGGESTION_SYSTEM_PROMPT}]
     
-    # Add recent conversation history (last 6 messages)
-    recent_history = conversation_history[-6:] if len(conversation_history) > 6 else conversation_history
-    for msg in recent_history:
-        messages.append({
-            "role": msg.get("role", "user"),
-            "content": msg.get("content", "")
-        })
+    # Add conversation history: running summary of older turns plus the last 6 messages
+    history, pending = compact_history(conversation_history, current_project_id, session, keep=6)
+    messages.extend(history)
     
     # Add current message with full context
     user_content = f"""User Message: {user_message}
@@ -236,138 +307,80 @@ Note: You can reference these past projects to suggest similar patterns or appro
         "content": user_content
     })
     
-    # Get AI response
-    try:
-        response = await chat(messages)
-        
-        # Try to extract JSON from response
-        import json
-        import re
-        
-        # Look for JSON object in response
-        json_match = re.search(r'\{[\s\S]*\}', response)
-        if json_match:
-            json_str = json_match.group(0)
-            suggestion_data = json.loads(json_str)
-            return suggestion_data
-        else:
-            # Fallback: return unstructured response
-            return {
-                "message": response,
-                "suggestions": [],
-                "impact": "minor",
-                "needsApproval": False
-            }
-    except Exception as e:
-        print(f"Error parsing AI response: {e}")
-        return {
-            "message": "I'm having trouble analyzing that. Could you rephrase your question?",
-            "suggestions": [],
-            "impact": "minor",
-            "needsApproval": False,
-            "error": str(e)
-        }
+    return messages, pending
 
-def _build_detailed_context(context: Dict, project_title: str = "Untitled Mind Map") -> str:
+def _parse_suggestions(response: str, parser: Optional[StreamingObject] = None) -> Dict:
     """
-    Build detailed context string for suggestion analysis
+    Extract the structured suggestion JSON from a model response. A reply cut off
+    or broken part-way keeps the message and every suggestion completed before it.
     """
-    if not context:
-        return "No mind map loaded. This is a blank canvas."
-    
-    parts = []
-    
-    # Project title
-    parts.append(f"Project Title: {project_title}")
-    
-    # Template info
-    template_id = context.get("template_id", "unknown")
-    template_name = context.get("template_name", "Unknown")
-    parts.append(f"Template: {template_name} ({template_id})")
-    
-    # Progress
-    progress = context.get("progress", {})
-    if progress:
-        parts.append(f"Completeness: {progress.get('completeness', 0)}%")
-        missing = progress.get("missingItems", [])
-        if missing:
-            parts.append(f"Missing: {', '.join(missing)}")
-    
-    # Existing nodes with full details
-    nodes = context.get("nodes", [])
-    if nodes:
-        parts.append(f"\n=== Existing Nodes ({len(nodes)}) ===")
-        
-        by_type = {}
-        for node in nodes:
-            node_type = node.get("type", "unknown")
-            if node_type not in by_type:
-                by_type[node_type] = []
-            by_type[node_type].append(node)
-        
-        for node_type, type_nodes in by_type.items():
-            parts.append(f"\n{node_type.upper()}:")
-            for node in type_nodes:
-                node_id = node.get("id", "unknown")
-                label = node.get("data", {}).get("label", "Unnamed")
-                description = node.get("data", {}).get("description", "")
-                category = node.get("data", {}).get("category", "")
-                
-                parts.append(f"  [{node_id}] {label}")
-                if category:
-                    parts.append(f"      Category: {category}")
-                if description:
-                    parts.append(f"      Description: {description}")
-    else:
-        parts.append("\n=== No nodes yet ===")
-    
-    # Connections
-    edges = context.get("edges", [])
-    if edges:
-        parts.append(f"\n=== Connections ({len(edges)}) ===")
-        for edge in edges[:10]:  # Limit to first 10
-            source = edge.get("source", "?")
-            target = edge.get("target", "?")
-            parts.append(f"  {source} → {target}")
-    
-    return "\n".join(parts)
+    if parser is None:
+        parser = StreamingObject("suggestions")
+        parser.feed(response)
+    result = parser.result()
+    if result is not None and (not result.get("truncated") or "message" in result or parser.items):
+        if result.get("truncated"):
+            print(f"Recovered {len(parser.items)} suggestions from an incomplete AI response")
+            result.setdefault("message", "")
+            result.setdefault("impact", "minor")
+            result.setdefault("needsApproval", True)
+        return result
+    # Fallback: return unstructured response
+    return {
+        "message": response,
+        "suggestions": [],
+        "impact": "minor",
+        "needsApproval": False
+    }
+
+def _error_response(e: Exception) -> Dict:
+    return {
+        "message": "I'm having trouble analyzing that. Could you rephrase your question?",
+        "suggestions": [],
+        "impact": "minor",
+        "needsApproval": False,
+        "error": str(e)
+    }
 
-def _build_other_projects_context(projects: List[MindMap]) -> str:
+def _build_other_projects_context(projects: List[Dict], related: List[Dict] = (), ranked: bool = False) -> str:
     """
-    Build context string summarizing user's other projects for pattern recognition
+    Build context string summarizing user's other projects for pattern recognition,
+    from their stored digests (see digests.py) and the vector index matches
     """
-    import json
-    
     parts = []
-    parts.append("Here are summaries of the user's other recent projects:")
+    if ranked:
+        parts.append("Here are summaries of the user's other projects most related to this message:")
+    else:
+        parts.append("Here are summaries of the user's other recent projects:")
+    
+    matching_nodes = {}
+    for match in related:
+        if match["kind"] == "node":
+            matching_nodes.setdefault(match["project_id"], []).append(match["label"])
     
     for project in projects:
-        parts.append(f"\n--- {project.title} (ID: {project.id}) ---")
-        parts.append(f"Template: {project.template_id}")
-        parts.append(f"Last updated: {project.updated_at.strftime('%Y-%m-%d')}")
+        parts.append(f"\n--- {project['title']} (ID: {project['id']}) ---")
+        parts.append(f"Template: {project['template_id']}")
+        parts.append(f"Last updated: {project['updated_at'].strftime('%Y-%m-%d')}")
         
-        # Parse nodes to get key features
-        try:
-            nodes = json.loads(project.nodes_json) if project.nodes_json else []
-            if nodes:
-                parts.append(f"Nodes: {len(nodes)}")
-                
-                # Group by type and show top items
-                by_type = {}
-                for node in nodes:
-                    node_type = node.get("type", "unknown")
-                    if node_type not in by_type:
-                        by_type[node_type] = []
-                    by_type[node_type].append(node)
-                
-                for node_type, type_nodes in by_type.items():
-                    # Show first 3 nodes of each type
-                    sample_labels = [n.get("data", {}).get("label", "Unnamed") for n in type_nodes[:3]]
-                    parts.append(f"  {node_type}: {', '.join(sample_labels)}")
-                    if len(type_nodes) > 3:
-                        parts.append(f"    ... and {len(type_nodes) - 3} more")
-        except Exception as e:
-            parts.append(f"  (Unable to parse nodes: {str(e)})")
+        if project["node_count"]:
+            parts.append(f"Nodes: {project['node_count']}")
+            
+            # Top items of each type
+            for node_type, count in project.get("counts", {}).items():
+                sample_labels = project.get("labels", {}).get(node_type, [])
+                parts.append(f"  {node_type}: {', '.join(sample_labels)}")
+                if count > len(sample_labels):
+                    parts.append(f"    ... and {count - len(sample_labels)} more")
+            if project.get("tech"):
+                parts.append(f"  Technologies: {', '.join(project['tech'])}")
+        if project["id"] in matching_nodes:
+            parts.append(f"  Matching nodes: {', '.join(matching_nodes[project['id']])}")
+    
+    documents = [match for match in related if match["kind"] in ("note", "blueprint")]
+    if documents:
+        parts.append("\nRelated notes and blueprints:")
+        for match in documents:
+            parts.append(f"  - {match['kind']}: {match['label']}")
     
     return "\n".join(parts)
-
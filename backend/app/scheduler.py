@@ -0,0 +1,130 @@
+import os, math, time, heapq, asyncio, itertools
+from collections import deque
+from contextlib import asynccontextmanager
+
+# Priority classes, most urgent first
+INTERACTIVE = "interactive"   # chat, suggestions: a user is watching
+BACKGROUND = "background"     # evaluate, blueprints
+BATCH = "batch"               # bulk jobs
+PRIORITIES = {INTERACTIVE: 0, BACKGROUND: 1, BATCH: 2}
+
+AI_MAX_CONCURRENCY_OLLAMA = int(os.getenv("AI_MAX_CONCURRENCY_OLLAMA", "2"))
+AI_MAX_CONCURRENCY_OPENAI = int(os.getenv("AI_MAX_CONCURRENCY_OPENAI", "16"))
+AI_MAX_QUEUE = int(os.getenv("AI_MAX_QUEUE", "32"))
+AI_QUEUE_TIMEOUT = float(os.getenv("AI_QUEUE_TIMEOUT", "30"))  # seconds a request may wait for a slot
+
+class LLMQueueFull(Exception):
+    """Raised when a request can't get a provider slot; the API turns it into a 429"""
+
+    def __init__(self, provider: str, retry_after: int, reason: str = "queue full"):
+        super().__init__(f"LLM {provider} {reason}, retry after {retry_after}s")
+        self.provider = provider
+        self.retry_after = retry_after
+        self.reason = reason
+
+class LLMScheduler:
+    """
+    Bounded-concurrency gate in front of one provider. Requests beyond the cap wait in
+    a priority queue (interactive before background before batch, FIFO within a class).
+    A full queue or an over-long wait sheds the request with LLMQueueFull.
+    """
+
+    def __init__(self, provider: str, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self.provider = provider
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._active = 0
+        self._waiters = []  # heap of [priority rank, seq, priority, future]
+        self._seq = itertools.count()
+        self._service_ewma = None  # smoothed seconds per request, for Retry-After
+        self._waits = {p: deque(maxlen=512) for p in PRIORITIES}
+        self.stats = {"admitted": 0, "queued": 0, "rejected": 0, "timed_out": 0}
+
+    def retry_after(self) -> int:
+        per_request = self._service_ewma or 5.0
+        return max(1, math.ceil(per_request * (len(self._waiters) + 1) / self.max_concurrency))
+
+    def check_capacity(self):
+        """Fail fast when a new request would be rejected anyway"""
+        if self._active >= self.max_concurrency and len(self._waiters) >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise LLMQueueFull(self.provider, self.retry_after())
+
+    @asynccontextmanager
+    async def slot(self, priority: str = INTERACTIVE):
+        await self._acquire(priority)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            self._service_ewma = elapsed if self._service_ewma is None else 0.8 * self._service_ewma + 0.2 * elapsed
+            self._release()
+
+    async def _acquire(self, priority: str):
+        if priority not in PRIORITIES:
+            priority = INTERACTIVE
+        if self._active < self.max_concurrency and not self._waiters:
+            self._active += 1
+            self.stats["admitted"] += 1
+            self._waits[priority].append(0.0)
+            return
+
+        self.check_capacity()
+        fut = asyncio.get_running_loop().create_future()
+        entry = [PRIORITIES[priority], next(self._seq), priority, fut]
+        heapq.heappush(self._waiters, entry)
+        self.stats["queued"] += 1
+        queued_at = time.monotonic()
+        try:
+            await asyncio.wait_for(fut, self.queue_timeout if self.queue_timeout > 0 else None)
+        except BaseException as e:
+            if fut.done() and not fut.cancelled():
+                # The slot was handed over just as we gave up; pass it on
+                self._release()
+            elif entry in self._waiters:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            if isinstance(e, asyncio.TimeoutError):
+                self.stats["timed_out"] += 1
+                raise LLMQueueFull(self.provider, self.retry_after(), "queue wait timed out") from None
+            raise
+        self.stats["admitted"] += 1
+        self._waits[priority].append(time.monotonic() - queued_at)
+
+    def _release(self):
+        # Hand the slot straight to the most urgent waiter; _active stays the same
+        while self._waiters:
+            fut = heapq.heappop(self._waiters)[3]
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self._active -= 1
+
+    def snapshot(self) -> dict:
+        waits = {}
+        for priority, samples in self._waits.items():
+            ordered = sorted(samples)
+            waits[priority] = {
+                "queued": sum(1 for w in self._waiters if w[2] == priority),
+                "samples": len(ordered),
+                "p50_ms": round(ordered[len(ordered) // 2] * 1000, 1) if ordered else None,
+                "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 1) if ordered else None,
+                "max_ms": round(ordered[-1] * 1000, 1) if ordered else None,
+            }
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "queue_timeout": self.queue_timeout,
+            "active": self._active,
+            "queue_depth": len(self._waiters),
+            "avg_service_s": round(self._service_ewma, 3) if self._service_ewma is not None else None,
+            "wait_times": waits,
+            **self.stats,
+        }
+
+schedulers = {
+    "ollama": LLMScheduler("ollama", AI_MAX_CONCURRENCY_OLLAMA, AI_MAX_QUEUE, AI_QUEUE_TIMEOUT),
+    "openai": LLMScheduler("openai", AI_MAX_CONCURRENCY_OPENAI, AI_MAX_QUEUE, AI_QUEUE_TIMEOUT),
+}
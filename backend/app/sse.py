@@ -0,0 +1,15 @@
+import json
+from fastapi.responses import StreamingResponse
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # keep nginx-style proxies from buffering the stream
+}
+
+def sse_event(event: str, data) -> str:
+    """Format one Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def sse_response(events) -> StreamingResponse:
+    """Wrap an async generator of formatted events in a text/event-stream response"""
+    return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
@@ -0,0 +1,382 @@
+import json
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import delete, func, or_
+from sqlmodel import Session, select
+from .models import ChatMessage, MindMap, MindMapEdge, MindMapNode
+from .responses import raw_json
+
+# kind -> (row model, key column, legacy blob column on MindMap)
+KINDS = {
+    "node": (MindMapNode, "node_id", "nodes_json"),
+    "edge": (MindMapEdge, "edge_id", "edges_json"),
+}
+BLOB_FIELDS = ("nodes_json", "edges_json", "chat_history")
+
+def _dumps(item: Dict) -> str:
+    # Default separators, so "[" + ", ".join(rows) + "]" matches json.dumps(list) byte for byte
+    return json.dumps(item)
+
+def _item_key(kind: str, item: Dict, index: int, seen: set) -> str:
+    item_id = item.get("id")
+    if item_id is not None:
+        key = str(item_id)
+    elif kind == "edge":
+        key = f"{item.get('source')}->{item.get('target')}"
+    else:
+        key = f"#{index}"
+    if key in seen:
+        key = f"{key}#{index}"
+    seen.add(key)
+    return key
+
+def _new_row(kind: str, mindmap_id: int, key: str, position: int, item: Dict):
+    model, key_col, _ = KINDS[kind]
+    row = model(mindmap_id=mindmap_id, position=position, data_json=_dumps(item), **{key_col: key})
+    if kind == "edge":
+        row.source = str(item.get("source", ""))
+        row.target = str(item.get("target", ""))
+    return row
+
+# (action, key, item before, item after) for each node/edge a write touched; action is
+# "add", "update", "remove" or "move" (same item at a new position, PUT only)
+Change = Tuple[str, str, Optional[Dict], Optional[Dict]]
+
+def _rows(session: Session, kind: str, mindmap_id: int):
+    model, key_col, _ = KINDS[kind]
+    query = select(model).where(model.mindmap_id == mindmap_id).order_by(model.position, getattr(model, key_col))
+    return session.exec(query).all()
+
+def _row(session: Session, kind: str, mindmap_id: int, key: str):
+    model, key_col, _ = KINDS[kind]
+    return session.exec(select(model).where(model.mindmap_id == mindmap_id, getattr(model, key_col) == key)).first()
+
+def ensure_rows(session: Session, mindmap: MindMap):
+    """Move a map still stored as JSON blobs into node/edge rows (first write after upgrade)"""
+    for kind, (_, _, blob_attr) in KINDS.items():
+        blob = getattr(mindmap, blob_attr)
+        if blob is None:
+            continue
+        seen = set()
+        for index, item in enumerate(json.loads(blob or "[]")):
+            session.add(_new_row(kind, mindmap.id, _item_key(kind, item, index, seen), index, item))
+        setattr(mindmap, blob_attr, None)
+    session.add(mindmap)
+
+def replace_items(session: Session, mindmap: MindMap, kind: str, items: List[Dict]) -> List[Change]:
+    """
+    Full replacement of a map's nodes or edges (PUT), written as a diff against the
+    stored rows: only added, changed, moved and removed items touch the database.
+    Returns those changes.
+    """
+    _, key_col, _ = KINDS[kind]
+    existing = {getattr(row, key_col): row for row in _rows(session, kind, mindmap.id)}
+    changes: List[Change] = []
+    seen = set()
+    for index, item in enumerate(items):
+        key = _item_key(kind, item, index, seen)
+        row = existing.pop(key, None)
+        if row is None:
+            session.add(_new_row(kind, mindmap.id, key, index, item))
+            changes.append(("add", key, None, item))
+            continue
+        data = _dumps(item)
+        if row.data_json != data:
+            changes.append(("update", key, json.loads(row.data_json), item))
+            row.data_json = data
+            if kind == "edge":
+                row.source = str(item.get("source", ""))
+                row.target = str(item.get("target", ""))
+        elif row.position != index:
+            changes.append(("move", key, item, item))
+        if row.position != index:
+            row.position = index
+        session.add(row)
+    for key, row in existing.items():
+        changes.append(("remove", key, json.loads(row.data_json), None))
+        session.delete(row)
+    return changes
+
+def apply_ops(session: Session, mindmap: MindMap, ops: List[Dict]) -> Tuple[Dict, List[Change]]:
+    """
+    Apply PATCH operations to individual nodes/edges. Each op is
+    {"op": "add" | "update" | "remove", "node": {...}} or the same with "edge".
+    "add" inserts (or replaces) the item at the end, "update" shallow-merges the given
+    fields into the stored item ("data" is merged one level deeper), "remove" deletes it;
+    removing a node also removes its edges. Returns the op counts and the node changes,
+    in order. Raises ValueError on a malformed op.
+    """
+    applied = {"added": 0, "updated": 0, "removed": 0}
+    node_changes: List[Change] = []
+    next_position = {}
+    for op in ops:
+        kind = "node" if "node" in op else "edge" if "edge" in op else None
+        action = op.get("op")
+        item = op.get(kind) if kind else None
+        if kind is None or not isinstance(item, dict) or action not in ("add", "update", "remove"):
+            raise ValueError(f"Invalid operation: {op}")
+        model, key_col, _ = KINDS[kind]
+
+        if action == "add":
+            if kind not in next_position:
+                current = session.exec(select(func.max(model.position)).where(model.mindmap_id == mindmap.id)).one()
+                next_position[kind] = -1 if current is None else current
+            next_position[kind] += 1
+            key = _item_key(kind, item, next_position[kind], set())
+            row = _row(session, kind, mindmap.id, key)
+            if row is not None:
+                session.delete(row)
+                session.flush()
+            if kind == "node":
+                node_changes.append(("add", key, json.loads(row.data_json) if row is not None else None, item))
+            session.add(_new_row(kind, mindmap.id, key, next_position[kind], item))
+            session.flush()
+            applied["added"] += 1
+            continue
+
+        if item.get("id") is None:
+            raise ValueError(f"{kind} {action} needs an id")
+        key = str(item["id"])
+        row = _row(session, kind, mindmap.id, key)
+        if row is None:
+            raise ValueError(f"{kind} {key} not found")
+
+        if action == "update":
+            before = json.loads(row.data_json)
+            merged = json.loads(row.data_json)
+            for field, value in item.items():
+                if field == "data" and isinstance(value, dict) and isinstance(merged.get("data"), dict):
+                    merged["data"] = {**merged["data"], **value}
+                else:
+                    merged[field] = value
+            row.data_json = _dumps(merged)
+            if kind == "edge":
+                row.source = str(merged.get("source", ""))
+                row.target = str(merged.get("target", ""))
+            else:
+                node_changes.append(("update", key, before, merged))
+            session.add(row)
+            applied["updated"] += 1
+        else:
+            session.delete(row)
+            if kind == "node":
+                node_changes.append(("remove", key, json.loads(row.data_json), None))
+                attached = select(MindMapEdge).where(
+                    MindMapEdge.mindmap_id == mindmap.id,
+                    or_(MindMapEdge.source == key, MindMapEdge.target == key),
+                )
+                for edge in session.exec(attached).all():
+                    session.delete(edge)
+                    applied["removed"] += 1
+            applied["removed"] += 1
+        session.flush()
+    return applied, node_changes
+
+def items_json(session: Session, mindmap: MindMap, kind: str) -> str:
+    """The map's nodes or edges as a JSON array string, from the blob or the rows"""
+    model, key_col, blob_attr = KINDS[kind]
+    blob = getattr(mindmap, blob_attr)
+    if blob is not None:
+        return blob
+    query = (
+        select(model.data_json)
+        .where(model.mindmap_id == mindmap.id)
+        .order_by(model.position, getattr(model, key_col))
+    )
+    return "[" + ", ".join(session.exec(query).all()) + "]"
+
+def items_json_many(session: Session, mindmaps: List[MindMap], kind: str) -> Dict[int, str]:
+    """items_json() for many maps, with one query for all the maps stored as rows"""
+    model, key_col, blob_attr = KINDS[kind]
+    result = {m.id: getattr(m, blob_attr) for m in mindmaps if getattr(m, blob_attr) is not None}
+    grouped = {m.id: [] for m in mindmaps if m.id not in result}
+    if grouped:
+        query = (
+            select(model.mindmap_id, model.data_json)
+            .where(model.mindmap_id.in_(list(grouped)))
+            .order_by(model.mindmap_id, model.position, getattr(model, key_col))
+        )
+        for mindmap_id, data_json in session.exec(query).all():
+            grouped[mindmap_id].append(data_json)
+    for mindmap_id, rows in grouped.items():
+        result[mindmap_id] = "[" + ", ".join(rows) + "]"
+    return result
+
+def _embed(data: Dict, mindmap: MindMap) -> Dict:
+    # Arrays composed from rows are valid JSON by construction; legacy blobs are checked
+    for field in BLOB_FIELDS:
+        if field in data:
+            data[field] = raw_json(data[field], trusted=getattr(mindmap, field) is None)
+    return data
+
+def message_counts(session: Session, mindmaps: List[MindMap]) -> Dict[int, int]:
+    """Chat messages per map, from one grouped COUNT (legacy blobs are counted by parsing them)"""
+    counts = {m.id: len(json.loads(m.chat_history or "[]")) for m in mindmaps if m.chat_history is not None}
+    ids = [m.id for m in mindmaps if m.chat_history is None]
+    if ids:
+        query = select(ChatMessage.mindmap_id, func.count()).where(ChatMessage.mindmap_id.in_(ids)).group_by(ChatMessage.mindmap_id)
+        counts.update({i: 0 for i in ids})
+        counts.update(dict(session.exec(query).all()))
+    return counts
+
+def _without_chat(data: Dict, count: int) -> Dict:
+    data.pop("chat_history", None)
+    data["message_count"] = count
+    return data
+
+def document(session: Session, mindmap: MindMap, raw: bool = False, chat: bool = False) -> Dict:
+    """
+    A mind map with the node/edge JSON fields filled in. chat_history is only included
+    with chat; otherwise there is a message_count, and the messages are read a page at
+    a time from /mindmaps/{id}/messages. With raw, the JSON fields are embedded as
+    arrays for a FastJSONResponse instead of as JSON strings.
+    """
+    data = mindmap.model_dump()
+    data["nodes_json"] = items_json(session, mindmap, "node")
+    data["edges_json"] = items_json(session, mindmap, "edge")
+    if chat:
+        data["chat_history"] = chat_history_json(session, mindmap)
+    else:
+        _without_chat(data, message_counts(session, [mindmap])[mindmap.id])
+    return _embed(data, mindmap) if raw else data
+
+def documents(session: Session, mindmaps: List[MindMap], raw: bool = False, chat: bool = False) -> List[Dict]:
+    """document() for many maps, with one query per kind instead of one per map"""
+    ids = [m.id for m in mindmaps if m.nodes_json is None or m.edges_json is None or m.chat_history is None]
+    composed = {}
+    for kind, (model, key_col, _) in KINDS.items():
+        grouped = {i: [] for i in ids}
+        if ids:
+            query = (
+                select(model.mindmap_id, model.data_json)
+                .where(model.mindmap_id.in_(ids))
+                .order_by(model.mindmap_id, model.position, getattr(model, key_col))
+            )
+            for mindmap_id, data_json in session.exec(query).all():
+                grouped[mindmap_id].append(data_json)
+        composed[kind] = grouped
+
+    chats = {i: [] for i in ids}
+    if ids and chat:
+        query = (
+            select(ChatMessage.mindmap_id, ChatMessage.data_json)
+            .where(ChatMessage.mindmap_id.in_(ids))
+            .order_by(ChatMessage.mindmap_id, ChatMessage.id)
+        )
+        for mindmap_id, data_json in session.exec(query).all():
+            chats[mindmap_id].append(data_json)
+    counts = message_counts(session, mindmaps) if not chat else {}
+
+    result = []
+    for mindmap in mindmaps:
+        data = mindmap.model_dump()
+        for kind, (_, _, blob_attr) in KINDS.items():
+            if data[blob_attr] is None:
+                data[blob_attr] = "[" + ", ".join(composed[kind].get(mindmap.id, [])) + "]"
+        if not chat:
+            _without_chat(data, counts[mindmap.id])
+        elif data["chat_history"] is None:
+            data["chat_history"] = "[" + ", ".join(chats.get(mindmap.id, [])) + "]"
+        result.append(_embed(data, mindmap) if raw else data)
+    return result
+
+# Columns of the list projection; never the node/edge/chat blobs
+SUMMARY_COLUMNS = (MindMap.id, MindMap.title, MindMap.folder_id, MindMap.template_id, MindMap.created_at, MindMap.updated_at)
+
+def summaries(session: Session, rows: List) -> List[Dict]:
+    """
+    List entries for rows selected with SUMMARY_COLUMNS, with node/edge counts from one
+    grouped COUNT per kind. Only maps still stored as legacy blobs have theirs read.
+    """
+    ids = [row.id for row in rows]
+    counts = {}
+    for kind, (model, _, _) in KINDS.items():
+        counts[kind] = {}
+        if ids:
+            query = select(model.mindmap_id, func.count()).where(model.mindmap_id.in_(ids)).group_by(model.mindmap_id)
+            counts[kind] = dict(session.exec(query).all())
+
+    legacy = [i for i in ids if i not in counts["node"] and i not in counts["edge"]]
+    if legacy:
+        query = select(MindMap.id, MindMap.nodes_json, MindMap.edges_json).where(
+            MindMap.id.in_(legacy),
+            or_(MindMap.nodes_json.is_not(None), MindMap.edges_json.is_not(None)),
+        )
+        for mindmap_id, nodes_json, edges_json in session.exec(query).all():
+            counts["node"][mindmap_id] = len(json.loads(nodes_json or "[]"))
+            counts["edge"][mindmap_id] = len(json.loads(edges_json or "[]"))
+
+    return [
+        {
+            **row._asdict(),
+            "node_count": counts["node"].get(row.id, 0),
+            "edge_count": counts["edge"].get(row.id, 0),
+        }
+        for row in rows
+    ]
+
+def delete_items(session: Session, mindmap_id: int):
+    for model, _, _ in KINDS.values():
+        session.exec(delete(model).where(model.mindmap_id == mindmap_id))
+    session.exec(delete(ChatMessage).where(ChatMessage.mindmap_id == mindmap_id))
+
+def _message_row(mindmap_id: int, message: Dict) -> ChatMessage:
+    return ChatMessage(mindmap_id=mindmap_id, role=str(message.get("role", "user")), data_json=_dumps(message))
+
+def ensure_message_rows(session: Session, mindmap: MindMap):
+    """Move a map's chat history still stored as a JSON blob into ChatMessage rows"""
+    if mindmap.chat_history is None:
+        return
+    for message in json.loads(mindmap.chat_history or "[]"):
+        session.add(_message_row(mindmap.id, message))
+    mindmap.chat_history = None
+    session.add(mindmap)
+
+def append_messages(session: Session, mindmap: MindMap, messages: List[Dict]) -> List[ChatMessage]:
+    """Append messages: one INSERT each, regardless of how long the conversation is"""
+    ensure_message_rows(session, mindmap)
+    rows = [_message_row(mindmap.id, message) for message in messages]
+    session.add_all(rows)
+    return rows
+
+def sync_messages(session: Session, mindmap: MindMap, history: List[Dict]):
+    """
+    Store a full chat history sent the old way (PUT chat_history) as a diff against the
+    stored rows: new messages are appended, edited ones updated, dropped ones deleted.
+    """
+    ensure_message_rows(session, mindmap)
+    session.flush()
+    rows = session.exec(
+        select(ChatMessage).where(ChatMessage.mindmap_id == mindmap.id).order_by(ChatMessage.id)
+    ).all()
+    for index, message in enumerate(history):
+        if index >= len(rows):
+            session.add(_message_row(mindmap.id, message))
+            continue
+        data = _dumps(message)
+        if rows[index].data_json != data:
+            rows[index].data_json = data
+            rows[index].role = str(message.get("role", "user"))
+            session.add(rows[index])
+    for row in rows[len(history):]:
+        session.delete(row)
+
+def page_messages(session: Session, mindmap_id: int, limit: int, before: Optional[int] = None) -> Tuple[List[Dict], Optional[int]]:
+    """
+    The newest `limit` messages older than the cursor `before`, in chronological order,
+    plus the cursor for the next (older) page or None when there is nothing older.
+    """
+    query = select(ChatMessage.id, ChatMessage.data_json).where(ChatMessage.mindmap_id == mindmap_id)
+    if before is not None:
+        query = query.where(ChatMessage.id < before)
+    rows = session.exec(query.order_by(ChatMessage.id.desc()).limit(limit + 1)).all()
+    has_more = len(rows) > limit
+    rows = list(reversed(rows[:limit]))
+    next_cursor = rows[0][0] if has_more and rows else None
+    return [json.loads(data_json) for _, data_json in rows], next_cursor
+
+def chat_history_json(session: Session, mindmap: MindMap) -> str:
+    """The map's chat history as a JSON array string, from the blob or the rows"""
+    if mindmap.chat_history is not None:
+        return mindmap.chat_history
+    query = select(ChatMessage.data_json).where(ChatMessage.mindmap_id == mindmap.id).order_by(ChatMessage.id)
+    return "[" + ", ".join(session.exec(query).all()) + "]"
@@ -0,0 +1,441 @@
+import os, io, re, json, math, time, zlib, asyncio, threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from sqlmodel import Session, select
+from .db import run_db
+from .models import Blueprint, MindMap, MindMapNode, Note
+
+AI_VECTOR_INDEX_PATH = os.getenv("AI_VECTOR_INDEX_PATH", "./data/vector_index.npz")  # "" keeps it in memory only
+AI_VECTOR_DIM = int(os.getenv("AI_VECTOR_DIM", "512"))  # hashed feature buckets per document
+AI_VECTOR_BUDGET_MS = float(os.getenv("AI_VECTOR_BUDGET_MS", "25"))  # max time one search may scan
+AI_VECTOR_MIN_SCORE = float(os.getenv("AI_VECTOR_MIN_SCORE", "0.1"))  # cosine below this is noise
+AI_VECTOR_SAVE_INTERVAL = float(os.getenv("AI_VECTOR_SAVE_INTERVAL", "30"))  # seconds between snapshots of a changed index
+
+FORMAT_VERSION = 2
+# Rows updated this long before a snapshot was taken are checked again on load: a write
+# commits a moment before it reaches the index, so a snapshot in between can miss it
+SYNC_SLACK = timedelta(seconds=60)
+KIND_CODES = {"node": 0, "project": 1, "note": 2, "blueprint": 3}
+KIND_NAMES = {code: kind for kind, code in KIND_CODES.items()}
+TEXT_LIMIT = 2000  # characters of a note/blueprint body that get indexed
+SCAN_CHUNK = 4096
+
+_TOKEN = re.compile(r"[a-z0-9][a-z0-9+#.\-]*[a-z0-9+#]|[a-z0-9]")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do for from has have how i in is it its my of on or our should "
+    "so than that the their them then there these this to up us we what when which will with you your".split()
+)
+
+def _fold(token: str) -> str:
+    """Crude plural folding, so "invoices" finds "Invoice" """
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    return token
+
+def _features(text: str) -> List[str]:
+    tokens = [_fold(t) for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS]
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+def embed(text: str, dim: int = AI_VECTOR_DIM) -> np.ndarray:
+    """
+    Signed feature hashing of word unigrams and bigrams, sublinear tf, L2-normalized.
+    crc32 rather than hash() so vectors stay valid across restarts.
+    """
+    counts: Dict[int, int] = {}
+    for feature in _features(text):
+        h = zlib.crc32(feature.encode("utf-8"))
+        key = h % dim if h & 0x80000000 else -(h % dim) - 1  # sign folded into the key
+        counts[key] = counts.get(key, 0) + 1
+    vector = np.zeros(dim, dtype=np.float32)
+    if counts:
+        buckets = [key if key >= 0 else -key - 1 for key in counts]
+        weights = [(1.0 if key >= 0 else -1.0) * (1.0 + math.log(count)) for key, count in counts.items()]
+        np.add.at(vector, buckets, weights)
+        norm = float(np.sqrt(vector @ vector))
+        if norm:
+            vector /= norm
+    return vector
+
+def _node_text(node: Dict) -> Tuple[str, str]:
+    data = node.get("data") or {}
+    label = str(data.get("label", "") or "")
+    extra = " ".join(str(data.get(k, "") or "") for k in ("description", "category", "technology"))
+    return label, f"{label} {extra}".strip()
+
+class VectorIndex:
+    """
+    In-process similarity index over mind map nodes and titles, notes and blueprints.
+    Rows of one float32 matrix, updated in place by the write routes; deleted rows are
+    zeroed and reused. Per-bucket document frequencies give the query IDF weights.
+    Snapshotted to disk in the background; on start the snapshot is brought up to date
+    with the database (or the index rebuilt from it if there is none).
+    """
+
+    def __init__(self, dim: int, path: str):
+        self.dim = dim
+        self.path = path
+        self._lock = threading.Lock()
+        self._matrix = np.zeros((0, dim), dtype=np.float32)
+        self._kinds = np.zeros(0, dtype=np.int8)
+        self._projects = np.zeros(0, dtype=np.int64)  # owning mind map, -1 if none
+        self._keys: List[Optional[str]] = []
+        self._labels: List[str] = []
+        self._text_crc: List[int] = []
+        self._rows: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._df = np.zeros(dim, dtype=np.int64)
+        self._node_keys: Dict[int, set] = {}  # mind map id -> keys of its node rows
+        self._dirty = False
+        self._saved_at: Optional[datetime] = None  # when the loaded snapshot was taken
+        self._snapshot_keys: set = set()  # its keys, until the first sync has checked them
+        self._ready = False
+        self._tasks: List[asyncio.Task] = []
+        self.stats = {"searches": 0, "truncated": 0, "upserts": 0, "skipped": 0, "removals": 0}
+
+    # --- writes ------------------------------------------------------------
+
+    def _grow(self):
+        capacity = max(1024, len(self._keys) * 2)
+        extra = capacity - len(self._keys)
+        self._matrix = np.vstack([self._matrix, np.zeros((extra, self.dim), dtype=np.float32)])
+        self._kinds = np.concatenate([self._kinds, np.full(extra, -1, dtype=np.int8)])
+        self._projects = np.concatenate([self._projects, np.full(extra, -1, dtype=np.int64)])
+        self._free.extend(range(capacity - 1, len(self._keys) - 1, -1))
+        self._keys.extend([None] * extra)
+        self._labels.extend([""] * extra)
+        self._text_crc.extend([0] * extra)
+
+    def _upsert(self, key: str, kind: str, project_id: Optional[int], label: str, text: str):
+        crc = zlib.crc32(text.encode("utf-8"))
+        row = self._rows.get(key)
+        if row is not None and self._text_crc[row] == crc:
+            self._labels[row] = label[:120]
+            self._projects[row] = project_id if project_id is not None else -1
+            self.stats["skipped"] += 1
+            return
+        vector = embed(text, self.dim)
+        if row is None:
+            if not self._free:
+                self._grow()
+            row = self._free.pop()
+            self._rows[key] = row
+        else:
+            self._df -= self._matrix[row] != 0
+        self._matrix[row] = vector
+        self._df += vector != 0
+        self._kinds[row] = KIND_CODES[kind]
+        self._projects[row] = project_id if project_id is not None else -1
+        self._keys[row] = key
+        self._labels[row] = label[:120]
+        self._text_crc[row] = crc
+        self._dirty = True
+        self.stats["upserts"] += 1
+
+    def _remove(self, key: str):
+        row = self._rows.pop(key, None)
+        if row is None:
+            return
+        self._df -= self._matrix[row] != 0
+        self._matrix[row] = 0
+        self._kinds[row] = -1
+        self._projects[row] = -1
+        self._keys[row] = None
+        self._labels[row] = ""
+        self._text_crc[row] = 0
+        self._free.append(row)
+        self._dirty = True
+        self.stats["removals"] += 1
+
+    def index_mindmap(self, mindmap_id: int, title: Optional[str] = None, nodes: Optional[List[Dict]] = None):
+        """Index a map's title and/or nodes; nodes no longer present are dropped"""
+        with self._lock:
+            if title is not None:
+                self._upsert(f"project:{mindmap_id}", "project", mindmap_id, title, title)
+            if nodes is None:
+                return
+            keep = set()
+            for index, node in enumerate(nodes):
+                label, text = _node_text(node)
+                if not text:
+                    continue
+                key = f"node:{mindmap_id}:{node.get('id', f'#{index}')}"
+                keep.add(key)
+                self._upsert(key, "node", mindmap_id, label or text, text)
+            for key in self._node_keys.get(mindmap_id, set()) - keep:
+                self._remove(key)
+            self._node_keys[mindmap_id] = keep
+
+    def index_nodes(self, mindmap_id: int, nodes: Dict[str, Optional[Dict]]):
+        """Re-index only these nodes of a map, by row key; None drops the node"""
+        with self._lock:
+            keys = self._node_keys.setdefault(mindmap_id, set())
+            for node_key, node in nodes.items():
+                key = f"node:{mindmap_id}:{node_key}"
+                label, text = _node_text(node) if node is not None else ("", "")
+                if text:
+                    keys.add(key)
+                    self._upsert(key, "node", mindmap_id, label or text, text)
+                else:
+                    keys.discard(key)
+                    self._remove(key)
+
+    def remove_mindmap(self, mindmap_id: int):
+        with self._lock:
+            self._remove(f"project:{mindmap_id}")
+            for key in self._node_keys.pop(mindmap_id, set()):
+                self._remove(key)
+
+    def index_note(self, note: Note):
+        text = f"{note.title} {note.tags} {note.content_md[:TEXT_LIMIT]}"
+        with self._lock:
+            self._upsert(f"note:{note.id}", "note", note.mindmap_id, note.title, text)
+
+    def remove_note(self, note_id: int):
+        with self._lock:
+            self._remove(f"note:{note_id}")
+
+    def index_blueprint(self, bp: Blueprint):
+        with self._lock:
+            self._upsert(f"blueprint:{bp.id}", "blueprint", None, bp.title, f"{bp.title} {bp.spec_text[:TEXT_LIMIT]}")
+
+    def remove_blueprint(self, blueprint_id: int):
+        with self._lock:
+            self._remove(f"blueprint:{blueprint_id}")
+
+    # --- reads -------------------------------------------------------------
+
+    def search(
+        self,
+        text: str,
+        k: int = 10,
+        kinds: Optional[Iterable[str]] = None,
+        exclude_project: Optional[int] = None,
+        budget_ms: float = AI_VECTOR_BUDGET_MS,
+    ) -> List[Dict]:
+        """
+        Top-k rows most similar to text. Rows are scored in chunks from the end of the
+        matrix; when the time budget runs out the best matches among the rows scored so
+        far are returned. Rows are reused after deletes, so that is no recency order.
+        """
+        query = embed(text, self.dim)
+        if not query.any():
+            return []
+        deadline = time.perf_counter() + budget_ms / 1000
+        with self._lock:
+            self.stats["searches"] += 1
+            total = max(1, len(self._rows))
+            query = query * (np.log((total + 1) / (self._df + 1)) + 1).astype(np.float32)
+            query /= np.linalg.norm(query)
+            size = len(self._keys)
+            scores = np.full(size, -np.inf, dtype=np.float32)
+            allowed = self._kinds >= 0
+            if kinds is not None:
+                allowed &= np.isin(self._kinds, [KIND_CODES[kind] for kind in kinds])
+            if exclude_project is not None:
+                allowed &= self._projects != exclude_project
+            for end in range(size, 0, -SCAN_CHUNK):
+                start = max(0, end - SCAN_CHUNK)
+                part = self._matrix[start:end] @ query
+                scores[start:end] = np.where(allowed[start:end], part, -np.inf)
+                if time.perf_counter() > deadline and start > 0:
+                    self.stats["truncated"] += 1
+                    break
+            k = min(k, size)
+            if k <= 0:
+                return []
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [
+                {
+                    "kind": KIND_NAMES[int(self._kinds[row])],
+                    "key": self._keys[row],
+                    "label": self._labels[row],
+                    "project_id": int(self._projects[row]) if self._projects[row] >= 0 else None,
+                    "score": round(float(scores[row]), 4),
+                }
+                for row in top
+                if scores[row] >= AI_VECTOR_MIN_SCORE
+            ]
+
+    # --- persistence -------------------------------------------------------
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            used = [row for row, key in enumerate(self._keys) if key is not None]
+            meta = {
+                "version": FORMAT_VERSION,
+                "dim": self.dim,
+                "saved_at": datetime.utcnow().isoformat(),
+                "keys": [self._keys[r] for r in used],
+                "labels": [self._labels[r] for r in used],
+                "text_crc": [self._text_crc[r] for r in used],
+            }
+            arrays = {
+                "matrix": self._matrix[used],
+                "kinds": self._kinds[used],
+                "projects": self._projects[used],
+                "meta": np.frombuffer(json.dumps(meta).encode("utf-8"), dtype=np.uint8),
+            }
+            self._dirty = False
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(buffer.getvalue())
+        os.replace(tmp, self.path)
+
+    def load(self) -> bool:
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                meta = json.loads(data["meta"].tobytes().decode("utf-8"))
+                if meta.get("version") != FORMAT_VERSION or meta.get("dim") != self.dim:
+                    return False
+                matrix, kinds, projects = data["matrix"], data["kinds"], data["projects"]
+        except Exception as e:
+            print(f"Error loading vector index {self.path}: {e}")
+            return False
+        with self._lock:
+            self._matrix = np.array(matrix, dtype=np.float32).reshape(-1, self.dim)
+            self._kinds = np.array(kinds, dtype=np.int8)
+            self._projects = np.array(projects, dtype=np.int64)
+            self._keys = list(meta["keys"])
+            self._labels = list(meta["labels"])
+            self._text_crc = list(meta["text_crc"])
+            self._rows = {key: row for row, key in enumerate(self._keys)}
+            self._free = []
+            self._df = (self._matrix != 0).sum(axis=0).astype(np.int64)
+            self._node_keys = {}
+            for key in self._keys:
+                if key.startswith("node:"):
+                    self._node_keys.setdefault(int(key.split(":", 2)[1]), set()).add(key)
+            self._saved_at = datetime.fromisoformat(meta["saved_at"])
+            self._snapshot_keys = set(self._keys)
+        return True
+
+    def index_rows(self, rows: Dict):
+        """
+        Index what _changed_rows() read: its maps, notes and blueprints, and with "ids"
+        drop snapshot entries the database no longer has. CPU-bound, so it runs in a
+        worker thread.
+        """
+        nodes: Dict[int, List[Dict]] = {}
+        for mindmap_id, data_json in rows["nodes"]:
+            nodes.setdefault(mindmap_id, []).append(json.loads(data_json))
+        for mindmap_id, title, nodes_json in rows["mindmaps"]:
+            self.index_mindmap(mindmap_id, title, json.loads(nodes_json) if nodes_json is not None else nodes.get(mindmap_id, []))
+        for note in rows["notes"]:
+            self.index_note(note)
+        for bp in rows["blueprints"]:
+            self.index_blueprint(bp)
+        if "ids" in rows:
+            self._drop_deleted(rows["ids"])
+
+    def _drop_deleted(self, ids: Dict[str, set]):
+        """
+        Drop snapshot entries whose map, note or blueprint was deleted after the snapshot
+        was taken. Only snapshot keys are checked: anything indexed since came from a
+        write the database already has.
+        """
+        mindmaps = set()
+        for key in self._snapshot_keys:
+            kind, item_id = key.split(":")[:2]
+            kind = "project" if kind == "node" else kind
+            if int(item_id) in ids[kind]:
+                continue
+            if kind == "project":
+                mindmaps.add(int(item_id))
+            else:
+                getattr(self, f"remove_{kind}")(int(item_id))
+        for mindmap_id in mindmaps:
+            self.remove_mindmap(mindmap_id)
+        self._snapshot_keys = set()
+
+    async def start(self):
+        """Load the snapshot and sync it with the database in the background, or rebuild"""
+        loaded = await asyncio.to_thread(self.load)
+        self._tasks.append(asyncio.create_task(self._sync(self._saved_at - SYNC_SLACK if loaded else None)))
+        if self.path and AI_VECTOR_SAVE_INTERVAL > 0:
+            self._tasks.append(asyncio.create_task(self._save_periodically()))
+
+    async def _sync(self, since: Optional[datetime]):
+        """
+        Index everything updated since the snapshot (everything without one). Rows are
+        read on the async engine and vectorised in a thread; a second, short pass picks
+        up writes whose index update may have been overtaken by the first one.
+        """
+        try:
+            started = datetime.utcnow()
+            rows = await run_db(_changed_rows, since, since is not None)
+            await asyncio.to_thread(self.index_rows, rows)
+            rows = await run_db(_changed_rows, started - SYNC_SLACK)
+            await asyncio.to_thread(self.index_rows, rows)
+            self._ready = True
+            await asyncio.to_thread(self.save)
+        except Exception as e:
+            print(f"Error syncing vector index: {e}")
+
+    async def _save_periodically(self):
+        while True:
+            await asyncio.sleep(AI_VECTOR_SAVE_INTERVAL)
+            try:
+                await asyncio.to_thread(self.save)
+            except Exception as e:
+                print(f"Error saving vector index: {e}")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.save()
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            counts = np.bincount(self._kinds[self._kinds >= 0], minlength=len(KIND_CODES))
+            return {
+                "ready": self._ready,
+                "dim": self.dim,
+                "documents": len(self._rows),
+                "by_kind": {KIND_NAMES[code]: int(n) for code, n in enumerate(counts)},
+                "capacity": len(self._keys),
+                "path": self.path,
+                "dirty": self._dirty,
+                **self.stats,
+            }
+
+def _changed_rows(session: Session, since: Optional[datetime], ids: bool = False) -> Dict:
+    """
+    Maps (with their node rows), notes and blueprints updated since a time, or all of
+    them. With ids, also every id that still exists, so deletions can be dropped.
+    """
+    def changed(model, *columns):
+        query = select(*columns) if columns else select(model)
+        return query.where(model.updated_at >= since) if since is not None else query
+
+    nodes = select(MindMapNode.mindmap_id, MindMapNode.data_json).order_by(MindMapNode.mindmap_id, MindMapNode.position)
+    if since is not None:
+        nodes = nodes.join(MindMap, MindMap.id == MindMapNode.mindmap_id).where(MindMap.updated_at >= since)
+    rows = {
+        "mindmaps": session.exec(changed(MindMap, MindMap.id, MindMap.title, MindMap.nodes_json)).all(),
+        "nodes": session.exec(nodes).all(),
+        "notes": session.exec(changed(Note)).all(),
+        "blueprints": session.exec(changed(Blueprint)).all(),
+    }
+    if ids:
+        rows["ids"] = {
+            kind: set(session.exec(select(model.id)).all())
+            for kind, model in (("project", MindMap), ("note", Note), ("blueprint", Blueprint))
+        }
+    return rows
+
+vector_index = VectorIndex(AI_VECTOR_DIM, AI_VECTOR_INDEX_PATH)
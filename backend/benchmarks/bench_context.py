@@ -0,0 +1,38 @@
+"""
+Benchmark the mind map context renderers on synthetic maps.
+
+    python -m benchmarks.bench_context [--sizes 10,100,1000,2000] [--repeat 5]
+
+For each size it reports the cold render time (index build + render) per flavor
+and the memoized (unchanged map) time, which includes hashing the map.
+"""
+import argparse, time
+from app import context as ctx
+from .synthetic import make_context
+
+def _best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,100,1000,2000,5000")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'nodes':>7} {'edges':>7} {'flavor':>11} {'cold ms':>9} {'memo ms':>9} {'hash ms':>9}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        context = make_context(size)
+        hash_ms = _best_of(lambda: ctx.content_hash(context), args.repeat)
+        for flavor, render_fn in (("chat", ctx._render_chat), ("suggestion", ctx._render_suggestion), ("evaluation", ctx._render_evaluation)):
+            cold = _best_of(lambda: render_fn(ctx.MindMapIndex(context)), args.repeat)
+            ctx.render(flavor, context)  # prime the memo
+            memo = _best_of(lambda: ctx.render(flavor, context), args.repeat)
+            print(f"{size:>7} {len(context['edges']):>7} {flavor:>11} {cold:>9.2f} {memo:>9.2f} {hash_ms:>9.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Stand-in LLM server speaking Ollama's /api/chat and OpenAI's /v1/chat/completions,
+streamed or not, with a fixed time to first token and a fixed token rate.
+
+    python -m benchmarks.fake_llm [--port 11435] [--latency 0.3] [--tokens-per-s 80]
+
+Replies are shaped by the system prompt, so the app's parsers see what they expect:
+suggestion JSON for /suggestions, scored text for /evaluate, prose otherwise.
+"""
+import argparse, asyncio, json, time
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+SUGGESTION_REPLY = json.dumps({
+    "message": "Based on your notes, a few components are missing. Shall I add them to your mind map?",
+    "suggestions": [
+        {"type": "add_node", "nodeType": "feature", "label": "User Authentication",
+         "description": "Email/password login with JWT tokens, signup, logout and session management.",
+         "category": "Core Features", "rationale": "Every SaaS app needs to identify its users"},
+        {"type": "add_node", "nodeType": "datamodel", "label": "User Entity",
+         "description": "Fields: id, email, password_hash, created_at, last_login",
+         "category": "Data Models", "rationale": "Stores the credentials the login flow checks"},
+        {"type": "add_node", "nodeType": "technical", "label": "Session Store",
+         "description": "Redis-backed sessions with a 30 day sliding expiry.",
+         "category": "Infrastructure", "rationale": "Keeps logins across deploys"},
+    ],
+    "impact": "moderate",
+    "needsApproval": True,
+}, indent=2)
+
+EVALUATION_REPLY = """**Completeness Score: 62**
+**Success Probability: 71**
+
+**Key Missing Elements**
+- Billing and subscription handling
+- Error monitoring and alerting
+
+**Quality Assessment**
+Most feature nodes are well described; data models lack field types.
+
+**Recommendations**
+1. Add a billing feature with its data model
+2. Describe the deployment pipeline
+3. Split the largest feature into user stories"""
+
+CHAT_REPLY = (
+    "That sounds like a solid start. I'd define the core entities first, then the API surface "
+    "around them, and leave the dashboard for the second milestone. Which of the features "
+    "do you want to ship in the MVP?"
+)
+
+def _reply_for(messages) -> str:
+    system = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+    if "suggestions" in system and "JSON" in system:
+        return SUGGESTION_REPLY
+    if "Completeness Score" in system:
+        return EVALUATION_REPLY
+    return CHAT_REPLY
+
+def _tokens(text: str):
+    """Split a reply into word-sized tokens that join back to the exact text"""
+    tokens, start = [], 0
+    for i in range(1, len(text)):
+        if text[i] in " \n" and text[i - 1] not in " \n":
+            tokens.append(text[start:i])
+            start = i
+    tokens.append(text[start:])
+    return tokens
+
+def create_app(latency: float = 0.3, tokens_per_s: float = 80.0) -> FastAPI:
+    app = FastAPI(title="Fake LLM")
+    stats = {"requests": 0, "active": 0, "max_active": 0}
+
+    async def _generate(messages):
+        """Yield (token, is_last) at the configured pace; the first after `latency`"""
+        stats["requests"] += 1
+        stats["active"] += 1
+        stats["max_active"] = max(stats["max_active"], stats["active"])
+        try:
+            await asyncio.sleep(latency)
+            tokens = _tokens(_reply_for(messages))
+            delay = 1 / tokens_per_s if tokens_per_s > 0 else 0
+            for i, token in enumerate(tokens):
+                if i and delay:
+                    await asyncio.sleep(delay)
+                yield token, i == len(tokens) - 1
+        finally:
+            stats["active"] -= 1
+
+    def _prompt_tokens(messages) -> int:
+        return sum(len(m.get("content", "")) for m in messages) // 4
+
+    @app.get("/stats")
+    def get_stats():
+        return stats
+
+    @app.post("/api/chat")
+    async def ollama_chat(request: Request):
+        body = await request.json()
+        messages = body.get("messages", [])
+        if not messages:
+            return {"model": body.get("model"), "done": True, "done_reason": "load"}
+        started = time.perf_counter_ns()
+        if body.get("stream", True):
+            async def lines():
+                count = 0
+                async for token, last in _generate(messages):
+                    count += 1
+                    yield json.dumps({"message": {"role": "assistant", "content": token}, "done": False}) + "\n"
+                yield json.dumps({
+                    "message": {"role": "assistant", "content": ""}, "done": True,
+                    "total_duration": time.perf_counter_ns() - started, "load_duration": 1_000_000,
+                    "prompt_eval_count": _prompt_tokens(messages), "eval_count": count,
+                }) + "\n"
+            return StreamingResponse(lines(), media_type="application/x-ndjson")
+        tokens = [token async for token, _ in _generate(messages)]
+        return {
+            "message": {"role": "assistant", "content": "".join(tokens)}, "done": True,
+            "total_duration": time.perf_counter_ns() - started, "load_duration": 1_000_000,
+            "prompt_eval_count": _prompt_tokens(messages), "eval_count": len(tokens),
+        }
+
+    @app.post("/v1/chat/completions")
+    async def openai_chat(request: Request):
+        body = await request.json()
+        messages = body.get("messages", [])
+        usage = {"prompt_tokens": _prompt_tokens(messages)}
+        if body.get("stream"):
+            async def events():
+                count = 0
+                async for token, _ in _generate(messages):
+                    count += 1
+                    yield f"data: {json.dumps({'choices': [{'index': 0, 'delta': {'content': token}}]})}\n\n"
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    final = {"choices": [], "usage": {**usage, "completion_tokens": count}}
+                    yield f"data: {json.dumps(final)}\n\n"
+                yield "data: [DONE]\n\n"
+            return StreamingResponse(events(), media_type="text/event-stream")
+        tokens = [token async for token, _ in _generate(messages)]
+        return {
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop"}],
+            "usage": {**usage, "completion_tokens": len(tokens)},
+        }
+
+    return app
+
+def main():
+    import uvicorn
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds before the first token")
+    parser.add_argument("--tokens-per-s", type=float, default=80.0, help="0 sends the whole reply at once")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency, args.tokens_per_s), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""
+Load test: the app on a temporary SQLite database, talking to the fake LLM server
+(benchmarks.fake_llm), under a concurrent mix of the requests the frontend makes.
+
+    python -m benchmarks.load [--duration 30] [--concurrency 16] [--sizes 10,100,1000,10000]
+                              [--mix autosave=40,list=20,get=15,chat=10,analyze=10,evaluate=5]
+                              [--provider ollama|openai] [--latency 0.3] [--tokens-per-s 80]
+                              [--stream] [--json out.json] [--compare baseline.json]
+
+Both servers run as subprocesses on free ports, so the numbers include real HTTP
+and JSON handling. Traffic is drawn from a seeded RNG, so two runs with the same
+arguments send the same requests. Chat and analyze carry each map's conversation
+so far, so history compaction and background summaries run as they would for a
+real user. Reports p50/p95/p99 latency per operation and map
+size, plus throughput. --json saves the report (with the git commit), and --compare
+prints the change against a saved one.
+"""
+import argparse, asyncio, json, os, random, socket, subprocess, sys, tempfile, time
+from datetime import datetime
+from typing import Dict, List, Optional
+import httpx
+from .synthetic import make_edges, make_nodes
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MIX = "autosave=40,list=20,get=15,chat=10,analyze=10,evaluate=5"
+MESSAGES = [
+    "What should the MVP include?",
+    "How should I structure authentication?",
+    "Which data models am I missing?",
+    "Suggest the next features to build",
+]
+HISTORY_LIMIT = 40  # messages a map's conversation grows to before the oldest are dropped
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+    except Exception:
+        return None
+
+def _percentile(ordered: List[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+def _spawn(args: List[str], env: Dict[str, str]) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, *args], cwd=BACKEND_DIR, env={**os.environ, **env})
+
+async def _wait_ready(url: str, process: subprocess.Popen, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"{url} exited with code {process.returncode}")
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+class Recorder:
+    """Latencies per operation label, kept in full so percentiles are exact"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def add(self, labels: List[str], seconds: float, ok: bool):
+        for label in labels:
+            self.latencies.setdefault(label, []).append(seconds)
+            if not ok:
+                self.errors[label] = self.errors.get(label, 0) + 1
+
+    def report(self, elapsed: float) -> Dict[str, Dict]:
+        rows = {}
+        for label in sorted(self.latencies, key=lambda l: (l.split("@")[0], int(l.split("@")[1]) if "@" in l else -1)):
+            ordered = sorted(self.latencies[label])
+            rows[label] = {
+                "count": len(ordered),
+                "errors": self.errors.get(label, 0),
+                "rps": round(len(ordered) / elapsed, 2),
+                "p50_ms": round(_percentile(ordered, 0.50) * 1000, 1),
+                "p95_ms": round(_percentile(ordered, 0.95) * 1000, 1),
+                "p99_ms": round(_percentile(ordered, 0.99) * 1000, 1),
+                "max_ms": round(ordered[-1] * 1000, 1),
+            }
+        return rows
+
+class Traffic:
+    """The frontend's requests against the seeded maps"""
+
+    def __init__(self, client: httpx.AsyncClient, maps: List[Dict], stream: bool, recorder: Recorder):
+        self.client, self.maps, self.stream, self.recorder = client, maps, stream, recorder
+
+    async def _timed(self, op: str, size: Optional[int], request):
+        labels = [op] if size is None else [op, f"{op}@{size}"]
+        started = time.perf_counter()
+        try:
+            ok = await request()
+        except httpx.HTTPError as e:
+            print(f"{op}: {type(e).__name__}: {e}")
+            ok = False
+        self.recorder.add(labels, time.perf_counter() - started, ok)
+
+    async def _stream(self, path: str, body: Dict, op: str, size: int) -> bool:
+        # Time to the first event is what the user waits for before anything shows
+        started = time.perf_counter()
+        first = None
+        async with self.client.stream("POST", path, json=body) as r:
+            async for line in r.aiter_lines():
+                if first is None and line.startswith("data:"):
+                    first = time.perf_counter() - started
+                    self.recorder.add([f"{op}_first", f"{op}_first@{size}"], first, True)
+            return r.status_code < 400
+
+    async def autosave(self, rng: random.Random, m: Dict):
+        # The editor PUTs the whole map after a drag or an edit
+        node = rng.choice(m["nodes"])
+        node["position"] = {"x": rng.randint(0, 5000), "y": rng.randint(0, 5000)}
+        if rng.random() < 0.3:
+            node["data"]["label"] = f"{node['data']['label'].split(' #')[0]} #{rng.randint(1, 99)}"
+        body = {"title": m["title"], "nodes": m["nodes"], "edges": m["edges"]}
+        async def request():
+            r = await self.client.put(f"/mindmaps/{m['id']}", json=body)
+            return r.status_code < 400
+        await self._timed("autosave", m["size"], request)
+
+    async def list(self, rng: random.Random, m: Dict):
+        async def request():
+            r = await self.client.get("/mindmaps/", params={"limit": 50})
+            return r.status_code < 400
+        await self._timed("list", None, request)
+
+    async def get(self, rng: random.Random, m: Dict):
+        async def request():
+            r = await self.client.get(f"/mindmaps/{m['id']}")
+            return r.status_code < 400
+        await self._timed("get", m["size"], request)
+
+    def _remember(self, m: Dict, message: str, reply: Optional[str]):
+        # The frontend sends the whole conversation back with every message
+        m["history"] += [{"role": "user", "content": message},
+                         {"role": "assistant", "content": reply or "(streamed reply)"}]
+        del m["history"][:-HISTORY_LIMIT]
+
+    async def chat(self, rng: random.Random, m: Dict):
+        message = rng.choice(MESSAGES)
+        body = {"message": message, "project_id": m["id"], "history": list(m["history"]), "no_cache": True}
+        async def request():
+            if self.stream:
+                ok = await self._stream("/chat/stream", body, "chat", m["size"])
+                self._remember(m, message, None)
+                return ok
+            r = await self.client.post("/chat/", json=body)
+            data = r.json() if r.status_code < 400 else {}
+            self._remember(m, message, data.get("message"))
+            return r.status_code < 400 and "error" not in data
+        await self._timed("chat", m["size"], request)
+
+    async def analyze(self, rng: random.Random, m: Dict):
+        message = rng.choice(MESSAGES)
+        body = {"message": message, "project_id": m["id"], "project_title": m["title"], "history": list(m["history"]), "no_cache": True}
+        async def request():
+            if self.stream:
+                ok = await self._stream("/suggestions/analyze/stream", body, "analyze", m["size"])
+                self._remember(m, message, None)
+                return ok
+            r = await self.client.post("/suggestions/analyze", json=body)
+            data = r.json() if r.status_code < 400 else {}
+            self._remember(m, message, data.get("message"))
+            return r.status_code < 400 and "error" not in data
+        await self._timed("analyze", m["size"], request)
+
+    async def evaluate(self, rng: random.Random, m: Dict):
+        body = {"project_id": m["id"], "no_cache": True}
+        async def request():
+            r = await self.client.post("/evaluate/", json=body)
+            return r.status_code < 400 and "error" not in r.json()
+        await self._timed("evaluate", m["size"], request)
+
+async def _seed(client: httpx.AsyncClient, sizes: List[int], per_size: int) -> List[Dict]:
+    maps = []
+    for size in sizes:
+        for i in range(per_size):
+            seed = size * 100 + i
+            nodes = make_nodes(size, seed)
+            edges = make_edges(nodes, seed=seed)
+            title = f"Bench {size} nodes #{i}"
+            r = await client.post("/mindmaps/", json={"title": title, "template_id": "saas-app", "nodes": nodes, "edges": edges})
+            r.raise_for_status()
+            maps.append({"id": r.json()["id"], "title": title, "size": size, "nodes": nodes, "edges": edges, "history": []})
+    return maps
+
+async def _run(args) -> Dict:
+    mix = {}
+    for part in args.mix.split(","):
+        op, weight = part.split("=")
+        mix[op.strip()] = float(weight)
+    sizes = [int(s) for s in args.sizes.split(",")]
+
+    workdir = tempfile.mkdtemp(prefix="aiwhisper-bench-")
+    llm_port, app_port = _free_port(), _free_port()
+    llm_url, app_url = f"http://127.0.0.1:{llm_port}", f"http://127.0.0.1:{app_port}"
+    llm = _spawn(["-m", "benchmarks.fake_llm", "--port", str(llm_port),
+                  "--latency", str(args.latency), "--tokens-per-s", str(args.tokens_per_s)], {})
+    app = _spawn(["-m", "uvicorn", "app.main:app", "--port", str(app_port), "--log-level", "warning"], {
+        "DB_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "AI_PROVIDER": args.provider,
+        "OLLAMA_BASE_URL": llm_url,
+        "OPENAI_BASE_URL": llm_url,
+        "OPENAI_API_KEY": "bench",
+        "AI_VECTOR_INDEX_PATH": os.path.join(workdir, "vector_index.npz"),
+        "AI_PROFILE_DIR": os.path.join(workdir, "profiles"),
+        "AI_CACHE_DB": "",
+    })
+    try:
+        await _wait_ready(f"{llm_url}/stats", llm)
+        await _wait_ready(f"{app_url}/healthz", app)
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=app_url, timeout=300, limits=limits) as client:
+            started = time.perf_counter()
+            maps = await _seed(client, sizes, args.maps_per_size)
+            print(f"Seeded {len(maps)} maps ({args.sizes} nodes) in {time.perf_counter() - started:.1f}s")
+
+            recorder = Recorder()
+            traffic = Traffic(client, maps, args.stream, recorder)
+            ops, weights = list(mix), list(mix.values())
+            deadline = time.perf_counter() + args.duration
+
+            async def worker(n: int):
+                rng = random.Random(args.seed * 1000 + n)
+                while time.perf_counter() < deadline:
+                    op = rng.choices(ops, weights)[0]
+                    await getattr(traffic, op)(rng, rng.choice(maps))
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker(n) for n in range(args.concurrency)))
+            elapsed = time.perf_counter() - started
+            llm_stats = (await client.get(f"{llm_url}/stats")).json()
+            queue = (await client.get("/healthz/ai-queue")).json().get(args.provider, {})
+    finally:
+        for process in (app, llm):
+            process.terminate()
+        for process in (app, llm):
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    rows = recorder.report(elapsed)
+    total = sum(row["count"] for label, row in rows.items() if "@" not in label and not label.endswith("_first"))
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "date": datetime.utcnow().isoformat(timespec="seconds"),
+            "args": vars(args),
+            "elapsed_s": round(elapsed, 2),
+            "requests": total,
+            "throughput_rps": round(total / elapsed, 2),
+            "llm_requests": llm_stats.get("requests"),
+            "llm_max_concurrent": llm_stats.get("max_active"),
+            "llm_rejected": queue.get("rejected"),
+        },
+        "results": rows,
+    }
+
+def _print(report: Dict, baseline: Optional[Dict]):
+    meta = report["meta"]
+    print(f"\ncommit {meta['commit']}  {meta['requests']} requests in {meta['elapsed_s']}s  "
+          f"{meta['throughput_rps']} req/s  (LLM: {meta['llm_requests']} calls, "
+          f"max {meta['llm_max_concurrent']} at once, {meta['llm_rejected']} rejected)")
+    header = f"{'operation':<22} {'count':>6} {'err':>4} {'req/s':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}"
+    if baseline:
+        header += f" {'p50 Δ':>8} {'p95 Δ':>8}"
+    print(header)
+    old = (baseline or {}).get("results", {})
+    for label, row in report["results"].items():
+        line = (f"{label:<22} {row['count']:>6} {row['errors']:>4} {row['rps']:>7} "
+                f"{row['p50_ms']:>9} {row['p95_ms']:>9} {row['p99_ms']:>9} {row['max_ms']:>9}")
+        if baseline:
+            for key in ("p50_ms", "p95_ms"):
+                before = old.get(label, {}).get(key)
+                line += f" {(row[key] - before) / before * 100:>+7.0f}%" if before else f" {'':>8}"
+        print(line)
+    if baseline:
+        before = baseline["meta"]["throughput_rps"]
+        change = (meta["throughput_rps"] - before) / before * 100 if before else 0
+        print(f"throughput vs {baseline['meta'].get('commit')}: {before} -> {meta['throughput_rps']} req/s ({change:+.0f}%)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=30, help="seconds of traffic after seeding")
+    parser.add_argument("--concurrency", type=int, default=16, help="simultaneous clients")
+    parser.add_argument("--sizes", default="10,100,1000,10000", help="node counts of the seeded maps")
+    parser.add_argument("--maps-per-size", type=int, default=3)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="operation=weight pairs")
+    parser.add_argument("--provider", choices=["ollama", "openai"], default="ollama")
+    parser.add_argument("--latency", type=float, default=0.3, help="fake LLM seconds to first token")
+    parser.add_argument("--tokens-per-s", type=float, default=80.0, help="fake LLM token rate")
+    parser.add_argument("--stream", action="store_true", help="use the streaming chat/analyze routes")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write the report here")
+    parser.add_argument("--compare", help="a report saved with --json to compare against")
+    args = parser.parse_args()
+
+    report = asyncio.run(_run(args))
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    _print(report, baseline)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved {args.json}")
+
+if __name__ == "__main__":
+    main()
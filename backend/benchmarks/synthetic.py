@@ -0,0 +1,62 @@
+"""Synthetic mind maps for benchmarks: realistic node types, labels, descriptions and edges."""
+import random
+
+NODE_TYPES = ["feature", "technical", "datamodel", "userstory", "todo", "notes"]
+WORDS = (
+    "auth user session token cache queue search billing invoice report dashboard export "
+    "import sync webhook api gateway storage upload image notification email schedule "
+    "audit role permission tenant project task comment tag folder history metrics"
+).split()
+
+def _phrase(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+def make_nodes(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    nodes = []
+    for i in range(count):
+        node_type = NODE_TYPES[i % len(NODE_TYPES)]
+        data = {
+            "label": _phrase(rng, 3).title(),
+            "description": _phrase(rng, rng.randint(0, 40)),
+            "category": rng.choice(["Core Features", "Infrastructure", "Data Models", ""]),
+        }
+        if node_type == "technical":
+            data["technology"] = rng.choice(["FastAPI", "Postgres", "Redis", "Next.js", ""])
+        if node_type == "datamodel":
+            data["fields"] = [rng.choice(WORDS) for _ in range(rng.randint(1, 8))]
+        if node_type == "todo":
+            data["todos"] = [{"text": _phrase(rng, 4), "completed": rng.random() < 0.3} for _ in range(rng.randint(1, 5))]
+        nodes.append({
+            "id": f"node-{i}",
+            "type": node_type,
+            "position": {"x": rng.randint(0, 5000), "y": rng.randint(0, 5000)},
+            "data": data,
+        })
+    return nodes
+
+def make_edges(nodes, per_node: float = 1.5, seed: int = 0):
+    rng = random.Random(seed + 1)
+    edges = []
+    if len(nodes) < 2:
+        return edges
+    for i in range(int(len(nodes) * per_node)):
+        source, target = rng.sample(nodes, 2)
+        edges.append({
+            "id": f"edge-{i}",
+            "source": source["id"],
+            "target": target["id"],
+            "label": rng.choice(["requires", "uses", "reads/writes", ""]),
+        })
+    return edges
+
+def make_context(node_count: int, seed: int = 0):
+    """A mind map context as the frontend sends it to /chat/, /suggestions/analyze and /evaluate/"""
+    nodes = make_nodes(node_count, seed)
+    return {
+        "template_id": "saas-app",
+        "template_name": "SaaS Application",
+        "nodes": nodes,
+        "edges": make_edges(nodes, seed=seed),
+        "progress": {"completeness": 42, "successProbability": 55, "missingItems": ["Billing", "Auth"]},
+    }
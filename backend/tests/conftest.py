@@ -0,0 +1,10 @@
+import os, tempfile
+
+# The app reads its configuration at import time: a throwaway database, no vector
+# snapshot and no model warm-up
+_data = tempfile.mkdtemp(prefix="ai-whisper-tests-")
+os.environ.setdefault("DB_URL", f"sqlite:///{_data}/test.db")
+os.environ.setdefault("AI_VECTOR_INDEX_PATH", "")
+os.environ.setdefault("AI_CACHE_DB", "")
+os.environ.setdefault("AI_PROVIDER", "ollama")
+os.environ.setdefault("OLLAMA_WARMUP", "0")
@@ -0,0 +1,49 @@
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+from app import ai, history
+from app.db import engine
+from app.main import app
+from app.models import ChatSummary
+
+REPLY = '{"message": "Noted.", "suggestions": []}'
+
+@pytest.fixture
+def client(monkeypatch):
+    async def fake_provider(messages, usage, mode):
+        yield REPLY
+    monkeypatch.setattr(ai, "_stream_provider", fake_provider)
+    with TestClient(app) as client:
+        yield client
+
+def _history(count: int):
+    return [{"role": "user" if i % 2 == 0 else "assistant", "content": f"message {i}"} for i in range(count)]
+
+def _wait_for_summaries(client: TestClient):
+    async def drain():
+        while history._tasks:
+            await asyncio.gather(*history._tasks)
+    client.portal.call(drain)
+
+@pytest.mark.parametrize("path", ["/chat/", "/chat/stream", "/suggestions/analyze", "/suggestions/analyze/stream"])
+def test_long_history_is_summarized_through_the_threaded_path(client, path):
+    """Messages are built in a worker thread; the summary task must still start on the loop"""
+    mindmap_id = client.post("/mindmaps/", json={"title": "History"}).json()["id"]
+    payload = {"message": "next", "project_id": mindmap_id, "history": _history(10), "no_cache": True}
+
+    response = client.post(path, json=payload)
+    assert response.status_code == 200
+    _wait_for_summaries(client)
+
+    assert mindmap_id not in history._summarizing
+    with Session(engine) as session:
+        summary = session.get(ChatSummary, mindmap_id)
+    assert summary is not None
+    assert summary.summarized_count == 10 - history.AI_HISTORY_KEEP_MESSAGES
+
+def test_compact_history_leaves_scheduling_to_the_caller():
+    messages, pending = history.compact_history(_history(10), 1, None, keep=6)
+    assert [m["content"] for m in messages] == [f"message {i}" for i in range(4, 10)]
+    assert pending == history.PendingSummary(1, history._clean(_history(10)), 4)
+    assert history.compact_history(_history(10)) == (history._clean(_history(10)), None)
@@ -7,6 +7,7 @@ import HomeContent from "@/components/HomeContent";
 import Settings from "@/components/Settings";
 import { Template, TEMPLATES } from "@/lib/templates";
 import { calculateProgress } from "@/lib/progress";
+import { parseJsonField } from "@/lib/json";
 import { Node, Edge } from "reactflow";
 import { AiNetworkIcon, Settings02Icon, Home01Icon, FloppyDiskIcon, Menu01Icon, Cancel01Icon, MessageMultiple01Icon, HierarchyIcon, SidebarRight01Icon } from "@hugeicons/react";
 
@@ -16,8 +17,8 @@ type MindMapData = {
   id?: number;
   title: string;
   template_id: string;
-  nodes_json: string;
-  edges_json: string;
+  nodes_json: string | Node[];
+  edges_json: string | Edge[];
 };
 
 type Folder = {
@@ -33,6 +34,8 @@ type RecentChat = {
   template_id: string;
   updated_at: string;
   folder_id?: number;
+  node_count: number;
+  edge_count: number;
 };
 
 export default function Home() {
@@ -163,8 +166,8 @@ export default function Home() {
 
   const handleSelectProject = (mindmap: MindMapData) => {
     setCurrentMindMap(mindmap);
-    setNodes(JSON.parse(mindmap.nodes_json));
-    setEdges(JSON.parse(mindmap.edges_json));
+    setNodes(parseJsonField<Node[]>(mindmap.nodes_json));
+    setEdges(parseJsonField<Edge[]>(mindmap.edges_json));
     
     // Find and set the template
     const template = TEMPLATES.find(t => t.id === mindmap.template_id);
@@ -287,7 +290,7 @@ export default function Home() {
   // Handler for project selection from home screen
   const handleHomeProjectSelect = async (projectId: number, mode: 'chat' | 'mindmap' = 'chat') => {
     try {
-      const response = await fetch(`http://localhost:8000/mindmaps/${projectId}`);
+      const response = await fetch(`http://localhost:8000/mindmaps/${projectId}?blobs=raw`);
       if (!response.ok) throw new Error("Failed to load mind map");
 
       const mindMapData = await response.json();
@@ -296,19 +299,17 @@ export default function Home() {
       const template = TEMPLATES.find(t => t.id === mindMapData.template_id);
       setSelectedTemplate(template || null);
 
-      const loadedNodes = JSON.parse(mindMapData.nodes_json || "[]");
-      const loadedEdges = JSON.parse(mindMapData.edges_json || "[]");
+      const loadedNodes = parseJsonField<Node[]>(mindMapData.nodes_json);
+      const loadedEdges = parseJsonField<Edge[]>(mindMapData.edges_json);
       setNodes(loadedNodes);
       setEdges(loadedEdges);
 
-      // Parse chat history and store it
-      const chatHistory = JSON.parse(mindMapData.chat_history || "[]");
-      console.log("Loading project with chat history:", chatHistory);
-      setCurrentChatHistory(chatHistory); // Store chat history for view switching
+      // The chat itself is loaded a page at a time by ChatPanel when resuming
+      setCurrentChatHistory([]);
       
       // Determine if we should enter chat mode
       const hasMindMapContent = loadedNodes.length > 0 || loadedEdges.length > 0;
-      const hasChatHistory = chatHistory.length > 0;
+      const hasChatHistory = (mindMapData.message_count || 0) > 0;
       
       // Always go to editor view
       setViewMode("editor");
@@ -474,13 +475,8 @@ export default function Home() {
           currentProjectTitle={currentMindMap?.title}
           onProjectRename={handleUpdateTitle}
           onChatHistoryUpdate={(history) => {
-            if (currentMindMap?.id) {
-              fetch(`http://localhost:8000/mindmaps/${currentMindMap.id}`, {
-                method: "PUT",
-                headers: { "Content-Type": "application/json" },
-                body: JSON.stringify({ chat_history: history }),
-              }).catch(err => console.error("Failed to save chat history:", err));
-            }
+            // ChatPanel stores new messages itself; keep a copy for view switching
+            setCurrentChatHistory(history);
           }}
         />
         </div>
@@ -524,16 +520,8 @@ export default function Home() {
             currentProjectTitle={currentMindMap?.title}
             onProjectRename={handleUpdateTitle}
             onChatHistoryUpdate={(history) => {
-              // Store chat history locally for view switching
+              // Store chat history locally for view switching; ChatPanel stores new messages itself
               setCurrentChatHistory(history);
-              // Also save to backend
-              if (currentMindMap?.id) {
-                fetch(`http://localhost:8000/mindmaps/${currentMindMap.id}`, {
-                  method: "PUT",
-                  headers: { "Content-Type": "application/json" },
-                  body: JSON.stringify({ chat_history: history }),
-                }).catch(err => console.error("Failed to save chat history:", err));
-              }
             }}
             onNodesChange={(newNodes) => {
               setNodes(newNodes);
@@ -588,13 +576,8 @@ export default function Home() {
           currentProjectTitle={currentMindMap?.title}
           onProjectRename={handleUpdateTitle}
           onChatHistoryUpdate={(history) => {
-            if (currentMindMap?.id) {
-              fetch(`http://localhost:8000/mindmaps/${currentMindMap.id}`, {
-                method: "PUT",
-                headers: { "Content-Type": "application/json" },
-                body: JSON.stringify({ chat_history: history }),
-              }).catch(err => console.error("Failed to save chat history:", err));
-            }
+            // ChatPanel stores new messages itself; keep a copy for view switching
+            setCurrentChatHistory(history);
           }}
         />
       </div>
@@ -3,6 +3,8 @@ import { useState, useRef, useEffect } from "react";
 import { Node, Edge } from "reactflow";
 import { Template } from "@/lib/templates";
 import { ProgressMetrics } from "@/lib/progress";
+import { partialStringField } from "@/lib/json";
+import { readEvents } from "@/lib/sse";
 import SuggestionCard from "./SuggestionCard";
 import ThinkingLogo from "./ThinkingLogo";
 import {
@@ -21,6 +23,11 @@ import {
 } from "@hugeicons/react";
 
 const API = process.env.NEXT_PUBLIC_API_BASE || "http://localhost:8000";
+const HISTORY_PAGE_SIZE = 50;
+
+// Messages already stored on the server (loaded or appended). Kept at module level so
+// history restored after a view switch is not appended a second time.
+const persistedMessages = new WeakSet<object>();
 
 type Message = {
   role: "user" | "assistant";
@@ -108,6 +115,7 @@ export default function ChatPanel({
 
   const [messages, setMessages] = useState<Message[]>(getInitialMessages());
   const [isLoadingHistory, setIsLoadingHistory] = useState(false);
+  const [olderCursor, setOlderCursor] = useState<number | null>(null);  // before= cursor of the next older page
   const [input, setInput] = useState("");
   const [isLoading, setIsLoading] = useState(false);
   const [hoveredMessageId, setHoveredMessageId] = useState<string | null>(null);
@@ -137,12 +145,15 @@ export default function ChatPanel({
           }
           
           console.log("Loading chat history for mindmap:", mindmapId);
-          const response = await fetch(`${API}/mindmaps/${mindmapId}`);
+          // Only the latest page; older messages load on demand
+          const response = await fetch(`${API}/mindmaps/${mindmapId}/messages?limit=${HISTORY_PAGE_SIZE}`);
           if (!response.ok) throw new Error("Failed to load chat history");
           
           const data = await response.json();
-          const history = JSON.parse(data.chat_history || "[]");
-          console.log("Loaded chat history:", history);
+          const history: Message[] = data.messages || [];
+          history.forEach(m => persistedMessages.add(m));
+          setOlderCursor(data.next_cursor ?? null);
+          console.log("Loaded chat history:", history.length, "messages", data.has_more ? "(more available)" : "");
           
           if (history.length > 0) {
             setMessages(history);
@@ -150,8 +161,7 @@ export default function ChatPanel({
             // Smart greeting logic:
             // - If chat history is very long (30+ messages), offer a summary prompt
             // - Otherwise, just let the user continue where they left off (no greeting)
-            const messageCount = history.length;
-            if (messageCount >= 30) {
+            if (data.has_more || history.length >= 30) {
               // Offer summary for long conversations
               setTimeout(() => {
                 setMessages(prev => [...prev, {
@@ -226,10 +236,41 @@ export default function ChatPanel({
     messagesEndRef.current?.scrollIntoView({ behavior: "auto" });
   }, []);
 
-  // Save chat history when messages change
+  // Load the page of messages before the oldest one shown
+  const loadOlderMessages = async () => {
+    if (!currentMindMapId || olderCursor === null) return;
+    try {
+      const response = await fetch(`${API}/mindmaps/${currentMindMapId}/messages?limit=${HISTORY_PAGE_SIZE}&before=${olderCursor}`);
+      if (!response.ok) throw new Error("Failed to load older messages");
+      const data = await response.json();
+      const older: Message[] = data.messages || [];
+      older.forEach(m => persistedMessages.add(m));
+      setMessages(prev => [...older, ...prev]);
+      setOlderCursor(data.next_cursor ?? null);
+    } catch (error) {
+      console.error("Error loading older messages:", error);
+    }
+  };
+
+  // Store new messages: only the ones the server doesn't have yet are appended
+  useEffect(() => {
+    if (isLoadingHistory || !currentMindMapId) return;  // Only once a session exists
+    const unsaved = messages.filter(m => !persistedMessages.has(m));
+    if (unsaved.length === 0) return;
+    unsaved.forEach(m => persistedMessages.add(m));
+    fetch(`${API}/mindmaps/${currentMindMapId}/messages`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ messages: unsaved }),
+    }).catch(err => {
+      console.error("Failed to save chat messages:", err);
+      unsaved.forEach(m => persistedMessages.delete(m));  // Retried with the next message
+    });
+  }, [messages, isLoadingHistory, currentMindMapId]);
+
+  // Keep the parent's copy for view switching
   useEffect(() => {
     if (messages.length > 0 && onChatHistoryUpdate && !isLoadingHistory && currentMindMapId) {
-      // Only save if we have a mind map ID (session exists)
       onChatHistoryUpdate(messages);
     }
   }, [messages, onChatHistoryUpdate, isLoadingHistory, currentMindMapId]);
@@ -253,11 +294,8 @@ export default function ChatPanel({
       // Create session if this is the first real message and no session exists
       const isFirstMessage = messages.filter(m => m.role === "user").length === 0;
       if (!currentMindMapId && onSessionCreate && isFirstMessage) {
-        const session = await onSessionCreate(messageText);
-        // Save the initial message immediately after session creation
-        if (session && onChatHistoryUpdate) {
-          onChatHistoryUpdate(newMessages);
-        }
+        // The messages so far are stored once the new session's id arrives
+        await onSessionCreate(messageText);
       }
 
       // Build context from current mind map
@@ -277,8 +315,8 @@ export default function ChatPanel({
         progress: progressMetrics,
       };
 
-      // Send to AI suggestions endpoint
-      const response = await fetch(`${API}/suggestions/analyze`, {
+      // Stream from the AI suggestions endpoint: the reply's message renders as it is written
+      const response = await fetch(`${API}/suggestions/analyze/stream`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({
@@ -292,24 +330,32 @@ export default function ChatPanel({
 
       if (!response.ok) throw new Error("Failed to get AI response");
 
-      const data = await response.json();
+      // The model writes a JSON object; show its "message" so far on every token.
+      // The first visible text hides the thinking indicator.
+      let reply = "";
+      let data: any = null;
+      await readEvents(response, (event, payload) => {
+        if (event === "token") {
+          reply += payload.content;
+          const partial = partialStringField(reply, "message");
+          if (partial) {
+            setIsStreaming(true);
+            setStreamingMessage(partial);
+          }
+        } else if (event === "message") {
+          setIsStreaming(true);
+          setStreamingMessage(payload.content);
+        } else if (event === "result") {
+          data = payload;
+        }
+      });
+      if (!data) throw new Error("AI response ended early");
+
       const aiResponse = data.message;
       const suggestions = data.suggestions || [];
       const impact = data.impact || "minor";
       const needsApproval = data.needsApproval !== false; // Default to true
 
-      // Now start streaming - this hides the thinking indicator
-      setIsStreaming(true);
-      
-      // Simulate streaming by typing out character by character
-      let currentText = "";
-      for (let i = 0; i < aiResponse.length; i++) {
-        currentText += aiResponse[i];
-        setStreamingMessage(currentText);
-        // Faster streaming speed for better UX
-        await new Promise(resolve => setTimeout(resolve, aiResponse[i] === ' ' ? 5 : 15));
-      }
-
       // Add final AI response
       setIsStreaming(false);
       setStreamingMessage("");
@@ -323,11 +369,6 @@ export default function ChatPanel({
         needsApproval
       }];
       setMessages(updatedMessages);
-      
-      // Explicitly save after AI response
-      if (currentMindMapId && onChatHistoryUpdate) {
-        onChatHistoryUpdate(updatedMessages);
-      }
 
       // Handle suggestions - ALWAYS require user approval for transparency
       if (suggestions.length > 0) {
@@ -593,6 +634,16 @@ export default function ChatPanel({
         className={`flex-1 overflow-y-auto ${isFocusMode ? 'px-4 pb-4' : 'px-3 pb-3'} relative`}
       >
         <div className={`${isFocusMode ? 'max-w-3xl mx-auto' : ''} space-y-4 ${isFocusMode ? 'py-4' : 'py-2'}`}>
+          {olderCursor !== null && (
+            <div className="flex justify-center">
+              <button
+                onClick={loadOlderMessages}
+                className="text-xs text-gray-400 hover:text-white px-3 py-1 rounded-lg hover:bg-zinc-800 transition-colors"
+              >
+                Load earlier messages
+              </button>
+            </div>
+          )}
           {messages.map((msg, idx) => (
             <div
               key={msg.id || idx}
@@ -33,8 +33,7 @@ type HomeContentProps = {
     id: number; 
     title: string; 
     updated_at: string;
-    nodes_json?: string;
-    chat_history?: string;
+    node_count?: number;
   }>;
 };
 
@@ -303,7 +302,7 @@ export default function HomeContent({
                   <div className="space-y-2">
                     {recentChats.map((chat) => {
                       const isChatOnly = chat.title.startsWith("Chat -") || 
-                                        (!chat.nodes_json || chat.nodes_json === "[]");
+                                        !chat.node_count;
                       
                       return (
                         <div
@@ -369,7 +368,7 @@ export default function HomeContent({
               <div className="grid grid-cols-1 sm:grid-cols-3 gap-3">
                 {recentChats.slice(0, 3).map((chat) => {
                   const isChatOnly = chat.title.startsWith("Chat -") || 
-                                    (!chat.nodes_json || chat.nodes_json === "[]");
+                                    !chat.node_count;
                   
                   return (
                     <div
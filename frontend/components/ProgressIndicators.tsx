@@ -11,9 +11,10 @@ type ProgressIndicatorsProps = {
   nodes: Node[];
   edges: Edge[];
   template: Template | null;
+  projectId?: number | null;  // Stored map, so the evaluation is saved with it
 };
 
-export default function ProgressIndicators({ metrics, nodes, edges, template }: ProgressIndicatorsProps) {
+export default function ProgressIndicators({ metrics, nodes, edges, template, projectId }: ProgressIndicatorsProps) {
   const [showTooltip, setShowTooltip] = useState<'completeness' | 'probability' | 'ai' | null>(null);
   const [aiEvaluation, setAiEvaluation] = useState<string | null>(null);
   const [isEvaluating, setIsEvaluating] = useState(false);
@@ -42,7 +43,7 @@ export default function ProgressIndicators({ metrics, nodes, edges, template }:
       const response = await fetch(`${API}/evaluate/`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ context }),
+        body: JSON.stringify({ context, project_id: projectId }),
       });
       
       if (!response.ok) throw new Error("Failed to evaluate");
@@ -6,8 +6,8 @@ type MindMap = {
   id: number;
   title: string;
   template_id: string;
-  nodes_json: string;
-  edges_json: string;
+  node_count: number;
+  edge_count: number;
   created_at: string;
   updated_at: string;
 };
@@ -144,8 +144,8 @@ export default function ProjectList({
           <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-6">
             {mindmaps.map((mindmap) => {
               const template = getTemplateInfo(mindmap.template_id);
-              const nodesCount = JSON.parse(mindmap.nodes_json).length;
-              const edgesCount = JSON.parse(mindmap.edges_json).length;
+              const nodesCount = mindmap.node_count;
+              const edgesCount = mindmap.edge_count;
 
               return (
                 <div
@@ -32,8 +32,7 @@ type RecentChat = {
   template_id: string;
   updated_at: string;
   folder_id?: number;
-  nodes_json?: string;
-  chat_history?: string;
+  node_count?: number;
 };
 
 type SidebarProps = {
@@ -249,7 +248,7 @@ export default function Sidebar({
               recentChats.slice(0, 10).map((chat) => {
                 // Check if this is a chat-only session or has mind map content
                 const isChatOnly = chat.title.startsWith("Chat -") || 
-                                  (!chat.nodes_json || chat.nodes_json === "[]");
+                                  !chat.node_count;
                 
                 // Shorten title intelligently to 3-4 words
                 const getShortenedTitle = (title: string) => {
@@ -0,0 +1,42 @@
+/**
+ * Read a mind map JSON field (nodes_json, edges_json, chat_history). The API sends
+ * them as JSON strings, or already as arrays when asked for ?blobs=raw.
+ */
+export function parseJsonField<T = any[]>(value: unknown, fallback: T = [] as unknown as T): T {
+  if (typeof value === 'string') {
+    return value ? JSON.parse(value) : fallback;
+  }
+  return (value ?? fallback) as T;
+}
+
+const ESCAPES: Record<string, string> = { n: "\n", t: "\t", r: "\r", b: "\b", f: "\f" };
+
+/**
+ * The value of a string member of a JSON object that is still arriving (a streamed
+ * model reply), decoded as far as it has got, or null if the member hasn't started.
+ */
+export function partialStringField(text: string, key: string): string | null {
+  const start = new RegExp(`"${key}"\\s*:\\s*"`).exec(text);
+  if (!start) return null;
+  let value = "";
+  for (let i = start.index + start[0].length; i < text.length; i++) {
+    const c = text[i];
+    if (c === '"') break;
+    if (c !== "\\") {
+      value += c;
+      continue;
+    }
+    const next = text[i + 1];
+    if (next === undefined) break;  // Escape cut off by the chunk boundary
+    if (next === "u") {
+      const hex = text.slice(i + 2, i + 6);
+      if (hex.length < 4) break;
+      value += String.fromCharCode(parseInt(hex, 16));
+      i += 5;
+    } else {
+      value += ESCAPES[next] ?? next;
+      i += 1;
+    }
+  }
+  return value;
+}
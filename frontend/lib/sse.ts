@@ -0,0 +1,28 @@
+/**
+ * Read a Server-Sent Events response (the backend's /stream endpoints) as it
+ * arrives, calling onEvent with each event's name and parsed JSON payload.
+ * fetch + reader rather than EventSource, since the endpoints take a POST body.
+ */
+export async function readEvents(response: Response, onEvent: (event: string, data: any) => void) {
+  if (!response.body) throw new Error("Response has no body to stream");
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true }).replace(/\r\n/g, "\n");
+    let boundary;
+    while ((boundary = buffer.indexOf("\n\n")) >= 0) {
+      const block = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      let event = "message";
+      const data: string[] = [];
+      for (const line of block.split("\n")) {
+        if (line.startsWith("event:")) event = line.slice(6).trim();
+        else if (line.startsWith("data:")) data.push(line.slice(5).replace(/^ /, ""));
+      }
+      if (data.length > 0) onEvent(event, JSON.parse(data.join("\n")));
+    }
+  }
+}